@@ -2,25 +2,169 @@
 Bark Text-to-Speech API con capacidades musicales
 """
 
-def start_server(host="0.0.0.0", port=8000, reload=True):
-    """Iniciar el servidor de la API Bark"""
-    import uvicorn
+import os
+import re
+from bisect import bisect_right
+from collections import Counter
+from typing import Dict, Any, List, Set
+
+def start_server(host="0.0.0.0", port=8000, reload=False, workers=1):
+    """
+    Iniciar el servidor de la API Bark
+    
+    Con reload=True (desarrollo) uvicorn reinicia el servidor al cambiar el código;
+    con workers > 1 se usa el servidor de producción (app.serve), que carga los
+    modelos una vez y los comparte entre procesos.
+    """
     print("🚀 Iniciando Bark Text-to-Speech API...")
     print(f"📡 Servidor disponible en: http://{host}:{port}")
     print("📚 Documentación en: http://localhost:8000/docs")
     print("🎵 Ejemplos de música en: http://localhost:8000/music-examples")
+    if workers > 1 and not reload:
+        from .serve import serve
+        serve(host=host, port=port, workers=workers)
+        return
+    import uvicorn
     uvicorn.run("app.main:app", host=host, port=port, reload=reload)
 
 def start():
-    """Comando simplificado para iniciar el servidor"""
-    start_server()
+    """Comando simplificado para iniciar el servidor (BARK_RELOAD=1 para desarrollo)"""
+    from .config import WORKERS
+    start_server(reload=os.getenv("BARK_RELOAD", "0") == "1", workers=WORKERS)
 
 # Para uso directo: python -m app
 if __name__ == "__main__":
     start()
 
-import re
-from typing import Dict, Any
+# Tablas de palabras clave del clasificador (se buscan como subcadenas del texto en minúsculas)
+KEYWORD_TABLES: Dict[str, List[str]] = {
+    "poetic_words": [
+        'corazón', 'alma', 'amor', 'vida', 'cielo', 'sol', 'luna', 'estrella',
+        'sueño', 'esperanza', 'milagro', 'anhelo', 'verdad', 'eternidad',
+        'jardín', 'florece', 'paz', 'tierna', 'suave', 'sublime'
+    ],
+    "strong_music_words": [
+        'la la la', 'tra la la', 'na na na', 'canción', 'cantar', 'cantando',
+        'rock', 'pop', 'rap', 'beat', 'bailar', 'dance'
+    ],
+    "direct_music_words": [
+        'la la la', 'tra la la', 'na na na', 'canción', 'cantar', 'cantando',
+        'rock', 'pop', 'rap', 'beat', 'guitar', 'piano', 'dance', 'swing',
+        'blues', 'jazz', 'reggae', 'salsa', 'tango', 'banda', 'concierto'
+    ],
+    "musical_interjections": [
+        'oh', 'ah', 'eh', 'hey', 'yeah', 'sí', 'no', 'wow', 'uoh', 'mmm',
+        'lalala', 'nanana', 'dadada', 'bababa', 'yay', 'woah', 'whoa'
+    ],
+    "exclusive_music_words": [
+        'bailar', 'fiesta', 'ritmo', 'melodía', 'coro', 'estribillo',
+        'verso', 'compás', 'acorde', 'escenario'
+    ],
+    "song_narrative_indicators": [
+        'había una vez', 'érase una vez', 'en un lugar', 'entonces',
+        'después', 'finalmente', 'al principio', 'historia', 'cuento',
+        'reino', 'viajero', 'llegó', 'conocido por'
+    ],
+    "narrative_indicators": [
+        'había una vez', 'érase una vez', 'en un lugar', 'entonces',
+        'después', 'finalmente', 'al principio', 'historia', 'cuento'
+    ],
+    # Pueden aparecer en narrativas: solo cuentan si ya hay otros indicadores
+    "ambiguous_music_words": ['música', 'cantar', 'cantaban'],
+}
+
+class KeywordMatcher:
+    """
+    Todas las tablas de palabras clave compiladas en un solo patrón
+
+    El patrón prueba en cada posición del texto la palabra clave más larga que
+    empieza ahí; las demás que empiezan en la misma posición son prefijos suyos
+    y se deducen de ella. Así un único recorrido (en C, dentro de re) encuentra
+    todas las apariciones, solapadas o no, con la misma semántica de subcadena
+    que `palabra in texto`.
+    """
+
+    def __init__(self, tables: Dict[str, List[str]]):
+        self.tables = tables
+        keywords = sorted({word for words in tables.values() for word in words}, key=len, reverse=True)
+        self._pattern = re.compile("(?=(" + "|".join(re.escape(word) for word in keywords) + "))")
+        # palabra más larga en una posición -> [(tabla, palabra)] de todas las que empiezan ahí
+        self._hits = {
+            longest: [(name, word) for name, words in tables.items() for word in words if longest.startswith(word)]
+            for longest in keywords
+        }
+
+    def scan(self, text_lower: str) -> Dict[str, Any]:
+        """
+        Buscar todas las tablas en un texto ya en minúsculas
+
+        Returns:
+            dict: {"words": {tabla: palabras encontradas}, "lines": {tabla: índices de línea con alguna}}
+        """
+        words: Dict[str, Set[str]] = {name: set() for name in self.tables}
+        lines: Dict[str, Set[int]] = {name: set() for name in self.tables}
+        newlines = [index for index, char in enumerate(text_lower) if char == '\n'] if '\n' in text_lower else []
+        for match in self._pattern.finditer(text_lower):
+            line = bisect_right(newlines, match.start())
+            for name, word in self._hits[match.group(1)]:
+                words[name].add(word)
+                lines[name].add(line)
+        return {"words": words, "lines": lines}
+
+_keyword_matcher = KeywordMatcher(KEYWORD_TABLES)
+
+def keyword_features(text: str) -> Dict[str, Any]:
+    """Palabras clave de cada tabla presentes en el texto, en una sola pasada (ver KeywordMatcher)"""
+    return _keyword_matcher.scan(text.lower())
+
+def _line_ending(line: str) -> str:
+    """Última palabra de una línea en minúsculas y sin puntuación"""
+    words = line.split()
+    return re.sub(r'[^\w]', '', words[-1].lower()) if words else ""
+
+def line_features(lines: list) -> Dict[str, Any]:
+    """
+    Características de repetición y rima de las líneas, en una sola pasada
+
+    Cuenta con diccionarios (hash) las líneas normalizadas y las terminaciones,
+    así que rimas, estribillos y distancias entre repeticiones cuestan O(n)
+    en vez de comparar cada par de líneas.
+
+    Returns:
+        dict: repeated_lines, rhyme_pairs, strong_rhyme_pairs y chorus_gap
+    """
+    line_counts = Counter()
+    endings = Counter()
+    strong_endings = Counter()
+    last_position = {}
+    chorus_gap = False
+
+    for i, line in enumerate(lines):
+        clean_line = line.strip().lower()
+        if len(clean_line) > 3:  # Ignorar líneas muy cortas
+            line_counts[clean_line] += 1
+        if len(clean_line) > 5:
+            # Estribillos: la misma línea de nuevo a 3-8 líneas de la anterior
+            previous = last_position.get(clean_line)
+            if previous is not None and 3 <= i - previous <= 8:
+                chorus_gap = True
+            last_position[clean_line] = i
+
+        # Terminaciones de 2-3 letras (rima) y de 3 letras (rima fuerte)
+        last_word = _line_ending(line)
+        if len(last_word) >= 3:
+            endings[last_word[-3:]] += 1
+            strong_endings[last_word[-3:]] += 1
+        elif len(last_word) >= 2:
+            endings[last_word[-2:]] += 1
+
+    return {
+        "repeated_lines": sum(1 for count in line_counts.values() if count > 1),
+        # Pares de líneas con la misma terminación
+        "rhyme_pairs": sum(count * (count - 1) // 2 for count in endings.values()),
+        "strong_rhyme_pairs": sum(count * (count - 1) // 2 for count in strong_endings.values()),
+        "chorus_gap": chorus_gap,
+    }
 
 def detect_text_type(text: str) -> Dict[str, Any]:
     """
@@ -44,8 +188,13 @@ def detect_text_type(text: str) -> Dict[str, Any]:
         "processing_notes": []
     }
     
+    # Palabras clave y características de las líneas en una sola pasada,
+    # compartidas por los detectores
+    keywords = keyword_features(text)
+    features = line_features(lines)
+    
     # Detectar si es una canción PRIMERO (más específico)
-    if _is_song(text, lines):
+    if _is_song(text, lines, keywords, features):
         analysis["type"] = "song"
         analysis["is_song"] = True
         analysis["suggested_voice"] = "v2/es_speaker_1"
@@ -53,7 +202,7 @@ def detect_text_type(text: str) -> Dict[str, Any]:
         analysis["processing_notes"].append("Detectado como canción - se recomienda melodía")
     
     # Detectar si es un poema (después de descartar canciones)
-    elif _is_poem(text, lines):
+    elif _is_poem(text, lines, keywords, features):
         analysis["type"] = "poem"
         analysis["is_poem"] = True
         analysis["suggested_voice"] = "v2/es_speaker_2"  # Voz más expresiva
@@ -61,7 +210,7 @@ def detect_text_type(text: str) -> Dict[str, Any]:
         analysis["processing_notes"].append("Detectado como poema - se recomienda música de fondo")
     
     # Detectar narrativa
-    elif _is_narrative(text, lines):
+    elif _is_narrative(text, lines, keywords):
         analysis["type"] = "narrative"
         analysis["is_narrative"] = True
         analysis["suggested_voice"] = "v2/es_speaker_0"
@@ -73,18 +222,21 @@ def detect_text_type(text: str) -> Dict[str, Any]:
         analysis["processing_notes"].append("Texto general - configuración estándar")
     
     # Detectar patrones de rima
-    analysis["has_rhyme_pattern"] = _detect_rhyme_pattern(lines)
+    analysis["has_rhyme_pattern"] = _detect_rhyme_pattern(lines, features)
     
     return analysis
 
-def _is_poem(text: str, lines: list) -> bool:
+def _is_poem(text: str, lines: list, keywords: Dict[str, Any] = None, features: Dict[str, Any] = None) -> bool:
     """Detectar si el texto es un poema"""
     if len(lines) < 2:
         return False
     
     # Características de poemas
     poem_indicators = 0
-    text_lower = text.lower()
+    if keywords is None:
+        keywords = keyword_features(text)
+    if features is None:
+        features = line_features(lines)
     
     # 1. Líneas de longitud similar
     line_lengths = [len(line) for line in lines]
@@ -94,16 +246,11 @@ def _is_poem(text: str, lines: list) -> bool:
         poem_indicators += 1
     
     # 2. Posibles rimas (terminaciones similares)
-    if _detect_rhyme_pattern(lines):
+    if _detect_rhyme_pattern(lines, features):
         poem_indicators += 2
     
     # 3. Palabras emotivas/poéticas (no musicales)
-    poetic_words = [
-        'corazón', 'alma', 'amor', 'vida', 'cielo', 'sol', 'luna', 'estrella',
-        'sueño', 'esperanza', 'milagro', 'anhelo', 'verdad', 'eternidad',
-        'jardín', 'florece', 'paz', 'tierna', 'suave', 'sublime'
-    ]
-    poetic_count = sum(1 for word in poetic_words if word in text_lower)
+    poetic_count = len(keywords["words"]["poetic_words"])
     if poetic_count >= 2:
         poem_indicators += 1
     
@@ -117,20 +264,10 @@ def _is_poem(text: str, lines: list) -> bool:
         poem_indicators += 1
     
     # 6. NO tiene indicadores fuertes de canción
-    strong_music_words = [
-        'la la la', 'tra la la', 'na na na', 'canción', 'cantar', 'cantando',
-        'rock', 'pop', 'rap', 'beat', 'bailar', 'dance'
-    ]
-    has_music_words = any(word in text_lower for word in strong_music_words)
+    has_music_words = bool(keywords["words"]["strong_music_words"])
     
     # Verificar repetición de líneas (típico de canciones)
-    line_counts = {}
-    for line in lines:
-        clean_line = line.strip().lower()
-        if len(clean_line) > 3:
-            line_counts[clean_line] = line_counts.get(clean_line, 0) + 1
-    
-    has_repeated_lines = any(count > 1 for count in line_counts.values())
+    has_repeated_lines = features["repeated_lines"] > 0
     
     # Si tiene indicadores fuertes de canción, no es poema
     if has_music_words or has_repeated_lines:
@@ -152,49 +289,38 @@ def _is_poem(text: str, lines: list) -> bool:
     
     return poem_indicators >= 2
 
-def _is_song(text: str, lines: list) -> bool:
+def _is_song(text: str, lines: list, keywords: Dict[str, Any] = None, features: Dict[str, Any] = None) -> bool:
     """Detectar si el texto es una canción con análisis avanzado"""
     if len(lines) < 2:
         return False
     
     song_indicators = 0
-    text_lower = text.lower()
+    if keywords is None:
+        keywords = keyword_features(text)
+    if features is None:
+        features = line_features(lines)
     
     # 1. Palabras explícitamente musicales DIRECTAS (peso muy alto)
-    direct_music_words = [
-        'la la la', 'tra la la', 'na na na', 'canción', 'cantar', 'cantando',
-        'rock', 'pop', 'rap', 'beat', 'guitar', 'piano', 'dance', 'swing',
-        'blues', 'jazz', 'reggae', 'salsa', 'tango', 'banda', 'concierto'
-    ]
-    direct_music_count = sum(1 for word in direct_music_words if word in text_lower)
+    direct_music_count = len(keywords["words"]["direct_music_words"])
     if direct_music_count >= 1:
         song_indicators += 5  # Muy fuerte indicador
     
     # 2. Interjecciones musicales múltiples
-    musical_interjections = [
-        'oh', 'ah', 'eh', 'hey', 'yeah', 'sí', 'no', 'wow', 'uoh', 'mmm',
-        'lalala', 'nanana', 'dadada', 'bababa', 'yay', 'woah', 'whoa'
-    ]
-    interjection_lines = sum(1 for line in lines 
-                           if any(interj in line.lower() for interj in musical_interjections))
+    interjection_lines = len(keywords["lines"]["musical_interjections"])
     if interjection_lines >= 2:
         song_indicators += 3
     
     # 3. Repetición exacta de líneas completas (estribillos) - MUY IMPORTANTE
-    repeated_lines = _count_repeated_lines(lines)
+    repeated_lines = _count_repeated_lines(lines, features)
     if repeated_lines >= 1:
         song_indicators += 4  # Fuerte indicador de canción
     
     # 4. Estructura verso-estribillo detectada
-    if _detect_verse_chorus_structure(lines):
+    if _detect_verse_chorus_structure(lines, features):
         song_indicators += 3
     
     # 5. Palabras exclusivamente musicales (no narrativas)
-    exclusive_music_words = [
-        'bailar', 'fiesta', 'ritmo', 'melodía', 'coro', 'estribillo',
-        'verso', 'compás', 'acorde', 'escenario'
-    ]
-    exclusive_count = sum(1 for word in exclusive_music_words if word in text_lower)
+    exclusive_count = len(keywords["words"]["exclusive_music_words"])
     if exclusive_count >= 1:
         song_indicators += 2
     
@@ -204,61 +330,31 @@ def _is_song(text: str, lines: list) -> bool:
         song_indicators += 1
     
     # 7. Detectar si NO es narrativa (evitar falsos positivos)
-    narrative_indicators = [
-        'había una vez', 'érase una vez', 'en un lugar', 'entonces',
-        'después', 'finalmente', 'al principio', 'historia', 'cuento',
-        'reino', 'viajero', 'llegó', 'conocido por'
-    ]
-    
-    narrative_count = sum(1 for indicator in narrative_indicators if indicator in text_lower)
+    narrative_count = len(keywords["words"]["song_narrative_indicators"])
     if narrative_count >= 2:
         song_indicators -= 3  # Penalizar si parece narrativa
     
     # 8. Palabras que podrían ser ambiguas - solo contar si hay otros indicadores
-    ambiguous_music_words = ['música', 'cantar', 'cantaban']  # Pueden aparecer en narrativas
     if song_indicators >= 2:  # Solo si ya hay otros indicadores fuertes
-        ambiguous_count = sum(1 for word in ambiguous_music_words if word in text_lower)
+        ambiguous_count = len(keywords["words"]["ambiguous_music_words"])
         song_indicators += min(ambiguous_count, 1)  # Máximo 1 punto por ambiguas
     
     # Umbral más estricto para evitar falsos positivos
     return song_indicators >= 5
 
-def _is_narrative(text: str, lines: list) -> bool:
+def _is_narrative(text: str, lines: list, keywords: Dict[str, Any] = None) -> bool:
     """Detectar si el texto es narrativo"""
-    narrative_indicators = [
-        'había una vez', 'érase una vez', 'en un lugar', 'entonces',
-        'después', 'finalmente', 'al principio', 'historia', 'cuento'
-    ]
-    
-    text_lower = text.lower()
-    return any(indicator in text_lower for indicator in narrative_indicators)
+    if keywords is None:
+        keywords = keyword_features(text)
+    return bool(keywords["words"]["narrative_indicators"])
 
-def _detect_rhyme_pattern(lines: list) -> bool:
-    """Detectar posibles patrones de rima"""
+def _detect_rhyme_pattern(lines: list, features: Dict[str, Any] = None) -> bool:
+    """Detectar posibles patrones de rima (dos líneas con la misma terminación de 2-3 letras)"""
     if len(lines) < 2:
         return False
-    
-    # Obtener las últimas 2-3 sílabas de cada línea
-    endings = []
-    for line in lines:
-        words = line.split()
-        if words:
-            last_word = words[-1].lower()
-            # Quitar puntuación
-            last_word = re.sub(r'[^\w]', '', last_word)
-            if len(last_word) >= 3:
-                endings.append(last_word[-3:])
-            elif len(last_word) >= 2:
-                endings.append(last_word[-2:])
-    
-    # Buscar similitudes en las terminaciones
-    similar_endings = 0
-    for i in range(len(endings)):
-        for j in range(i + 1, len(endings)):
-            if endings[i] == endings[j]:
-                similar_endings += 1
-    
-    return similar_endings >= 1
+    if features is None:
+        features = line_features(lines)
+    return features["rhyme_pairs"] >= 1
 
 def smart_text_processing(text: str) -> Dict[str, Any]:
     """
@@ -302,26 +398,28 @@ def _get_split_strategy(analysis: Dict) -> str:
     else:
         return "keep_together"
 
-def _process_text_for_audio(text: str, analysis: Dict) -> str:
+def _process_text_for_audio(text: str, analysis: Dict, line_counts: Dict = None) -> str:
     """Procesar el texto para mejor síntesis de audio"""
     lines = [line.strip() for line in text.split('\n') if line.strip()]
     
     if analysis["is_song"]:
-        return _process_song_text(lines, text)
+        return _process_song_text(lines, text, line_counts)
     elif analysis["is_poem"]:
         return _process_poem_text(lines, text)
     else:
         # Para texto general, flujo natural
         return " ".join(lines)
 
-def _process_song_text(lines: list, original_text: str) -> str:
+def _process_song_text(lines: list, original_text: str, line_counts: Dict = None) -> str:
     """Procesamiento especializado para canciones"""
-    # Identificar líneas repetidas (estribillos)
-    line_counts = {}
-    for line in lines:
-        clean_line = line.strip()
-        if clean_line:
-            line_counts[clean_line] = line_counts.get(clean_line, 0) + 1
+    # Identificar líneas repetidas (estribillos), salvo que ya vengan contadas
+    # sobre la canción completa (al procesar un fragmento)
+    if line_counts is None:
+        line_counts = {}
+        for line in lines:
+            clean_line = line.strip()
+            if clean_line:
+                line_counts[clean_line] = line_counts.get(clean_line, 0) + 1
     
     processed_lines = []
     
@@ -365,6 +463,7 @@ def _process_song_text(lines: list, original_text: str) -> str:
 def _process_poem_text(lines: list, original_text: str) -> str:
     """Procesamiento especializado para poemas"""
     processed_lines = []
+    has_stanzas = '\n\n' in original_text
     
     for i, line in enumerate(lines):
         if not line.strip():
@@ -375,7 +474,7 @@ def _process_poem_text(lines: list, original_text: str) -> str:
         # Pausas contemplativas entre versos
         if i < len(lines) - 1:
             # Pausa larga entre estrofas (detectar por líneas vacías o cada 4 líneas)
-            if '\n\n' in original_text or (i + 1) % 4 == 0:
+            if has_stanzas or (i + 1) % 4 == 0:
                 processed_lines.append("...")  # Pausa contemplativa larga
             else:
                 processed_lines.append(",")    # Pausa suave entre líneas
@@ -417,16 +516,11 @@ def text_from_any_format(input_data: Any) -> str:
     else:
         return str(input_data).strip()
 
-def _count_repeated_lines(lines: list) -> int:
+def _count_repeated_lines(lines: list, features: Dict[str, Any] = None) -> int:
     """Contar líneas que se repiten exactamente (estribillos)"""
-    line_counts = {}
-    for line in lines:
-        clean_line = line.strip().lower()
-        if len(clean_line) > 3:  # Ignorar líneas muy cortas
-            line_counts[clean_line] = line_counts.get(clean_line, 0) + 1
-    
-    # Contar cuántas líneas aparecen más de una vez
-    return sum(1 for count in line_counts.values() if count > 1)
+    if features is None:
+        features = line_features(lines)
+    return features["repeated_lines"]
 
 def _detect_song_structure(lines: list) -> bool:
     """Detectar estructura repetitiva típica de canciones (ABAB, AABA, etc.)"""
@@ -465,58 +559,18 @@ def _analyze_word_repetition(text_lower: str) -> int:
     # Contar palabras que aparecen 3 o más veces
     return sum(1 for count in word_counts.values() if count >= 3)
 
-def _detect_strong_rhyme_pattern(lines: list) -> bool:
-    """Detectar patrones de rima más fuertes"""
+def _detect_strong_rhyme_pattern(lines: list, features: Dict[str, Any] = None) -> bool:
+    """Detectar patrones de rima más fuertes (ABAB, AABB...: al menos dos pares con terminación de 3 letras)"""
     if len(lines) < 2:
         return False
-    
-    endings = []
-    for line in lines:
-        words = line.split()
-        if words:
-            last_word = words[-1].lower()
-            # Quitar puntuación
-            last_word = re.sub(r'[^\w]', '', last_word)
-            if len(last_word) >= 3:
-                # Tomar las últimas 2-3 letras
-                endings.append(last_word[-3:])
-    
-    if len(endings) < 2:
-        return False
-    
-    # Buscar patrones de rima más complejos
-    rhyme_patterns = 0
-    
-    # Verificar rimas ABAB, AABB, etc.
-    for i in range(len(endings)):
-        for j in range(i + 1, len(endings)):
-            if endings[i] == endings[j]:
-                rhyme_patterns += 1
-    
-    # Más de 2 rimas sugiere patrón fuerte
-    return rhyme_patterns >= 2
+    if features is None:
+        features = line_features(lines)
+    return features["strong_rhyme_pairs"] >= 2
 
-def _detect_verse_chorus_structure(lines: list) -> bool:
-    """Detectar estructura verso-estribillo"""
+def _detect_verse_chorus_structure(lines: list, features: Dict[str, Any] = None) -> bool:
+    """Detectar estructura verso-estribillo (una línea repetida cada 3-8 líneas)"""
     if len(lines) < 6:
         return False
-    
-    # Buscar bloques de líneas repetidas que podrían ser estribillos
-    line_positions = {}
-    for i, line in enumerate(lines):
-        clean_line = line.strip().lower()
-        if len(clean_line) > 5:  # Ignorar líneas muy cortas
-            if clean_line not in line_positions:
-                line_positions[clean_line] = []
-            line_positions[clean_line].append(i)
-    
-    # Buscar líneas que aparecen en posiciones que sugieren estructura verso-estribillo
-    for line, positions in line_positions.items():
-        if len(positions) >= 2:
-            # Si hay líneas repetidas separadas por algunas líneas, podría ser estribillo
-            gaps = [positions[i+1] - positions[i] for i in range(len(positions)-1)]
-            # Estribillos suelen repetirse cada 4-8 líneas
-            if any(3 <= gap <= 8 for gap in gaps):
-                return True
-    
-    return False
\ No newline at end of file
+    if features is None:
+        features = line_features(lines)
+    return features["chorus_gap"]
\ No newline at end of file
@@ -0,0 +1,294 @@
+"""
+Cache de resultados de audio direccionado por contenido
+
+La clave es un hash de los textos finales (ya procesados y normalizados), la voz y los
+parámetros de generación. Los WAV se guardan en disco y un índice en memoria
+mantiene el orden LRU para expulsar entradas por número o por tamaño total.
+
+El cache de frases hace lo mismo para el audio de cada segmento por separado:
+un estribillo que se repite (en la misma canción o en otra petición) con la
+misma voz y parámetros se sintetiza una sola vez.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from . import normalize_text_input
+from .config import (
+    PHRASE_CACHE_DIR, PHRASE_CACHE_MAX_ENTRIES, PHRASE_CACHE_MAX_MB, PHRASE_CACHE_MEMORY_MB,
+    RESULT_CACHE_DIR, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_MB,
+)
+
+# Cambiar si cambia la forma de generar audio para invalidar entradas viejas
+CACHE_VERSION = 2
+
+def cache_key(segments: List[str], voice: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Calcular la clave de cache de una generación
+
+    Args:
+        segments: Textos finales que se envían a Bark (uno por segmento)
+        voice: Preset de voz
+        params: Parámetros de generación (temperaturas, semilla...)
+
+    Returns:
+        str: Hash sha256 en hexadecimal
+    """
+    payload = {
+        "version": CACHE_VERSION,
+        "segments": [normalize_text_input(segment) for segment in segments],
+        "voice": voice,
+        "params": params or {},
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def phrase_key(segment: str, voice: str, params: Dict[str, Any]) -> str:
+    """Clave del cache de frases: un segmento con una voz y unos parámetros (nivel, semilla...)"""
+    return cache_key([segment], voice, params)
+
+def _link_or_copy(src: str, dst: str):
+    """Enlazar (hardlink) un archivo o copiarlo si el sistema de archivos no lo permite"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+class AudioResultCache:
+    """Cache LRU de archivos WAV generados, con índice en memoria y almacén en disco"""
+
+    SUFFIX = ".wav"
+
+    def __init__(self, directory: str, max_entries: int, max_bytes: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.SUFFIX}")
+
+    def _load_index(self):
+        """Reconstruir el índice desde disco (el último acceso es el mtime)"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append((stat.st_mtime, name[:-len(self.SUFFIX)], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+
+        with self._lock:
+            self._evict()
+
+    def fetch(self, key: str, output_file: str) -> bool:
+        """
+        Copiar el audio cacheado a output_file si existe
+
+        Returns:
+            bool: True si fue un acierto de cache
+        """
+        if not self.enabled:
+            return False
+
+        with self._lock:
+            path = self._path(key)
+            if key not in self._index:
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    self.misses += 1
+                    return False
+                # Guardado por otro proceso (app.serve con varios workers): adoptarlo
+                self._index[key] = size
+                self._total_bytes += size
+
+            try:
+                _link_or_copy(path, output_file)
+                os.utime(path)
+            except OSError:
+                # La entrada desapareció del disco: olvidarla
+                self._total_bytes -= self._index.pop(key)
+                self.misses += 1
+                return False
+
+            self._index.move_to_end(key)
+            self.hits += 1
+            return True
+
+    def store(self, key: str, audio_file: str):
+        """Guardar un WAV recién generado en el cache"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+                return
+
+            path = self._path(key)
+            try:
+                _link_or_copy(audio_file, path)
+            except OSError as e:
+                print(f"⚠️ No se pudo guardar en cache: {e}")
+                return
+
+            size = os.path.getsize(path)
+            self._index[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        """Expulsar las entradas menos usadas (llamar con _lock tomado)"""
+        while self._index and (len(self._index) > self.max_entries or self._total_bytes > self.max_bytes):
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas de uso del cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+class PhraseCache(AudioResultCache):
+    """
+    Audio de frases sueltas (float32 sin normalizar, en .npy) con una capa LRU en memoria
+
+    Las frases más usadas se sirven desde memoria; el disco las conserva entre
+    reinicios y las comparte entre procesos worker.
+    """
+
+    SUFFIX = ".npy"
+
+    def __init__(self, directory: str, max_entries: int, max_bytes: int, memory_bytes: int):
+        self.memory_bytes = memory_bytes
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memory_total = 0
+        super().__init__(directory, max_entries, max_bytes)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Audio de una frase (de solo lectura) o None si no está en el cache"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                if key in self._index:
+                    self._index.move_to_end(key)
+                self.hits += 1
+                return audio
+
+            path = self._path(key)
+            try:
+                audio = np.load(path)
+                os.utime(path)
+            except (OSError, ValueError):
+                if key in self._index:
+                    self._total_bytes -= self._index.pop(key)
+                self.misses += 1
+                return None
+
+            if key not in self._index:
+                # Guardada por otro proceso: adoptarla
+                self._index[key] = os.path.getsize(path)
+                self._total_bytes += self._index[key]
+            self._index.move_to_end(key)
+            self.hits += 1
+            return self._remember(key, audio)
+
+    def put(self, key: str, audio: np.ndarray):
+        """Guardar el audio de una frase recién sintetizada"""
+        if not self.enabled:
+            return
+
+        audio = np.asarray(audio, dtype=np.float32)
+        with self._lock:
+            self._remember(key, audio)
+            if key in self._index:
+                self._index.move_to_end(key)
+                return
+
+            path = self._path(key)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(temp_path, "wb") as f:
+                    np.save(f, audio)
+                os.replace(temp_path, path)
+            except OSError as e:
+                print(f"⚠️ No se pudo guardar la frase en cache: {e}")
+                return
+
+            self._index[key] = os.path.getsize(path)
+            self._total_bytes += self._index[key]
+            self._evict()
+
+    def _remember(self, key: str, audio: np.ndarray) -> np.ndarray:
+        """Añadir una frase a la capa en memoria (llamar con _lock tomado)"""
+        # Compartida entre jobs: nadie debe modificarla
+        audio.flags.writeable = False
+        if key not in self._memory:
+            self._memory[key] = audio
+            self._memory_total += audio.nbytes
+        self._memory.move_to_end(key)
+        while self._memory and self._memory_total > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_total -= evicted.nbytes
+        return audio
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self._lock:
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_total
+            stats["max_memory_bytes"] = self.memory_bytes
+        return stats
+
+# Cache compartido por todos los endpoints de generación
+result_cache = AudioResultCache(
+    RESULT_CACHE_DIR,
+    max_entries=RESULT_CACHE_MAX_ENTRIES,
+    max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024,
+)
+
+# Frases sintetizadas, compartidas por todas las peticiones
+phrase_cache = PhraseCache(
+    PHRASE_CACHE_DIR,
+    max_entries=PHRASE_CACHE_MAX_ENTRIES,
+    max_bytes=PHRASE_CACHE_MAX_MB * 1024 * 1024,
+    memory_bytes=PHRASE_CACHE_MEMORY_MB * 1024 * 1024,
+)
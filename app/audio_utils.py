@@ -0,0 +1,136 @@
+"""
+Utilidades de post-procesado de audio (solo NumPy/SciPy, sin modelos)
+"""
+
+import struct
+import wave
+from typing import List, Optional
+
+import numpy as np
+from scipy.io.wavfile import write as write_wav
+
+from .config import SEGMENT_CROSSFADE_MS, SEGMENT_GAP_MS
+
+# Frecuencia de muestreo de Bark (EnCodec 24 kHz)
+SAMPLE_RATE = 24_000
+
+def normalize_audio(audio_array) -> np.ndarray:
+    """Normalizar al pico máximo para evitar clipping (float32 en [-1, 1])"""
+    audio_array = np.asarray(audio_array, dtype=np.float32)
+    peak = np.max(np.abs(audio_array)) if audio_array.size else 0.0
+    if peak > 0:
+        audio_array = audio_array / peak
+    return audio_array
+
+def to_int16(audio_array) -> np.ndarray:
+    """Convertir audio float en [-1, 1] a PCM de 16 bits"""
+    return (np.asarray(audio_array) * 32767).astype(np.int16)
+
+def write_wav_file(audio_array, output_file: str, sample_rate: int = SAMPLE_RATE) -> float:
+    """
+    Normalizar el audio y guardarlo como WAV de 16 bits
+
+    Returns:
+        float: Duración del audio en segundos
+    """
+    pcm = to_int16(normalize_audio(audio_array))
+    write_wav(output_file, sample_rate, pcm)
+    return len(pcm) / sample_rate
+
+def wav_duration(path: str) -> float:
+    """Duración en segundos de un WAV PCM leyendo solo su cabecera"""
+    with wave.open(path, "rb") as wav:
+        return wav.getnframes() / wav.getframerate()
+
+def wav_header(sample_rate: int = SAMPLE_RATE, num_samples: Optional[int] = None) -> bytes:
+    """
+    Cabecera WAV (PCM 16 bits, mono)
+
+    Sin num_samples los tamaños se marcan como desconocidos (0xFFFFFFFF), como
+    hacen los servidores de streaming; los reproductores leen hasta el final.
+    """
+    if num_samples is None:
+        data_size = riff_size = 0xFFFFFFFF
+    else:
+        data_size = num_samples * 2
+        riff_size = 36 + data_size
+    return (
+        struct.pack("<4sI4s", b"RIFF", riff_size, b"WAVE")
+        + struct.pack("<4sIHHIIHH", b"fmt ", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+        + struct.pack("<4sI", b"data", data_size)
+    )
+
+def _ramp(length: int) -> np.ndarray:
+    return np.linspace(0.0, 1.0, length, dtype=np.float32)
+
+class SegmentJoiner:
+    """
+    Unir segmentos de audio de forma incremental
+
+    Cada segmento se normaliza por separado y se une al anterior con un fundido
+    (crossfade_ms) y un silencio (gap_ms); con gap_ms=0 los fundidos se solapan
+    (crossfade real). El final de cada segmento se retiene hasta conocer el
+    siguiente, así que el resultado puede emitirse a medida que llegan.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE,
+                 gap_ms: int = SEGMENT_GAP_MS, crossfade_ms: int = SEGMENT_CROSSFADE_MS):
+        self.fade_length = int(sample_rate * crossfade_ms / 1000)
+        self.gap = np.zeros(int(sample_rate * gap_ms / 1000), dtype=np.float32)
+        self._tail = None
+
+    def add(self, segment) -> List[np.ndarray]:
+        """Añadir el siguiente segmento y devolver los trozos de audio ya definitivos"""
+        segment = normalize_audio(segment)
+        n = min(self.fade_length, len(segment) // 2)
+        ramp = _ramp(n)
+        body_end = len(segment) - n
+
+        if self._tail is None:
+            # Primer segmento: sin fundido de entrada
+            parts = [segment[:body_end]]
+        else:
+            tail = self._tail
+            head = segment[:n] * ramp
+            if len(self.gap):
+                parts = [tail, self.gap, head]
+            else:
+                overlap = min(len(tail), len(head))
+                parts = [
+                    tail[:len(tail) - overlap],
+                    tail[len(tail) - overlap:] + head[:overlap],
+                    head[overlap:],
+                ]
+            parts.append(segment[n:body_end])
+
+        self._tail = segment[body_end:] * ramp[::-1]
+        return parts
+
+    def finish(self) -> List[np.ndarray]:
+        """Devolver el final retenido del último segmento"""
+        tail, self._tail = self._tail, None
+        return [tail] if tail is not None else []
+
+def iter_joined_segments(segments, sample_rate: int = SAMPLE_RATE,
+                         gap_ms: int = SEGMENT_GAP_MS, crossfade_ms: int = SEGMENT_CROSSFADE_MS):
+    """
+    Unir segmentos de audio de forma incremental (ver SegmentJoiner)
+
+    Args:
+        segments: Iterable de arrays de audio (float)
+
+    Yields:
+        np.ndarray: Trozos consecutivos del audio final (float32)
+    """
+    joiner = SegmentJoiner(sample_rate, gap_ms, crossfade_ms)
+    for segment in segments:
+        yield from joiner.add(segment)
+    yield from joiner.finish()
+
+def join_segments(segments, sample_rate: int = SAMPLE_RATE,
+                  gap_ms: int = SEGMENT_GAP_MS, crossfade_ms: int = SEGMENT_CROSSFADE_MS) -> np.ndarray:
+    """Unir segmentos de audio en un solo array (ver iter_joined_segments)"""
+    parts = list(iter_joined_segments(segments, sample_rate, gap_ms, crossfade_ms))
+    if not parts:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(parts)
@@ -0,0 +1,157 @@
+"""
+Backends de síntesis: de (texto, voz, parámetros) a audio PCM float32
+
+El worker de inferencia, la carga de modelos y el servidor de producción no
+usan Bark directamente sino el backend configurado en BARK_BACKEND:
+
+- "bark": los modelos reales (ver bark_utils); torch y Bark se importan solo
+  cuando hace falta cargar un modelo o sintetizar.
+- "fake": audio determinista (mismo texto, voz y parámetros → mismas muestras)
+  con una latencia que imita a Bark (RTF, coste fijo por llamada y coste
+  marginal de cada fila de un batch). No necesita torch ni los modelos, así que
+  sirve para medir el rendimiento de la API (colas, caches, batching, E/S) en
+  cualquier máquina.
+"""
+
+import hashlib
+import time
+from typing import Any, Dict, List, Optional, Protocol
+
+import numpy as np
+
+from .audio_utils import SAMPLE_RATE
+from .config import FAKE_BATCH_ROW_COST, FAKE_OVERHEAD_MS, FAKE_RTF, SYNTHESIS_BACKEND
+from .tiers import CHARS_PER_AUDIO_SECOND
+
+class SynthesisBackend(Protocol):
+    """Lo que el worker de inferencia necesita de un backend"""
+
+    name: str
+
+    def load_stage(self, stage: str):
+        """Cargar el modelo de una etapa (ver model_loader.STAGES y SMALL_STAGES)"""
+
+    def synthesize(self, text: str, voice: str, text_temp: float = 0.7, waveform_temp: float = 0.7,
+                   seed: Optional[int] = None, profile: Optional[str] = None,
+                   small_models: bool = False, use_kv_caching: bool = True) -> np.ndarray:
+        """Audio (float32 a SAMPLE_RATE, sin normalizar) de un texto"""
+
+    def synthesize_batch(self, items: List[Dict[str, Any]]) -> List[np.ndarray]:
+        """Audio de varios textos con los mismos modelos (mismas claves que synthesize), en orden"""
+
+    def freeze(self):
+        """Preparar los pesos para compartirlos entre procesos tras fork (app.serve)"""
+
+    def set_num_threads(self, threads: int):
+        """Hilos de cómputo de este proceso"""
+
+class BarkBackend:
+    """Los modelos de Bark (bark_utils)"""
+
+    name = "bark"
+
+    def load_stage(self, stage: str):
+        from . import bark_utils  # Importa torch y Bark: solo cuando hace falta un modelo
+        bark_utils.load_stage(stage)
+
+    def synthesize(self, text: str, voice: str, **params) -> np.ndarray:
+        from .bark_utils import synthesize
+        return synthesize(text, voice, **params)
+
+    def synthesize_batch(self, items: List[Dict[str, Any]]) -> List[np.ndarray]:
+        from .bark_utils import synthesize_batch
+        return synthesize_batch(items)
+
+    def freeze(self):
+        """Modelos en modo evaluación y sin gradientes: nadie escribe en sus tensores"""
+        from bark import generation as bark_generation
+
+        from .bark_utils import _small_models
+
+        for container in list(bark_generation.models.values()) + list(_small_models.values()):
+            model = container["model"] if isinstance(container, dict) else container
+            model.eval()
+            for parameter in model.parameters():
+                parameter.requires_grad_(False)
+
+    def set_num_threads(self, threads: int):
+        import torch
+        torch.set_num_threads(threads)
+
+class FakeBackend:
+    """
+    Audio determinista con la latencia aproximada de Bark, sin modelos
+
+    La duración del audio sigue la velocidad del habla de Bark
+    (CHARS_PER_AUDIO_SECOND). Una llamada tarda
+    overhead + rtf * (audio más largo + row_cost * resto del audio del batch),
+    con un rtf menor para los modelos pequeños y mayor sin KV cache.
+    """
+
+    name = "fake"
+
+    # Factor sobre el RTF según los modelos y el KV cache
+    SMALL_MODELS_SPEEDUP = 0.4
+    NO_KV_CACHE_SLOWDOWN = 1.5
+
+    def __init__(self, rtf: float = FAKE_RTF, overhead_ms: float = FAKE_OVERHEAD_MS,
+                 batch_row_cost: float = FAKE_BATCH_ROW_COST):
+        self.rtf = rtf
+        self.overhead_ms = overhead_ms
+        self.batch_row_cost = batch_row_cost
+
+    def load_stage(self, stage: str):
+        pass
+
+    def synthesize(self, text: str, voice: str, **params) -> np.ndarray:
+        return self.synthesize_batch([{"text": text, "voice": voice, **params}])[0]
+
+    def synthesize_batch(self, items: List[Dict[str, Any]]) -> List[np.ndarray]:
+        started_at = time.perf_counter()
+        audio = [self._render(item) for item in items]
+        durations = sorted((len(array) / SAMPLE_RATE for array in audio), reverse=True)
+        rtf = self.rtf
+        if items[0].get("small_models"):
+            rtf *= self.SMALL_MODELS_SPEEDUP
+        if not items[0].get("use_kv_caching", True):
+            rtf *= self.NO_KV_CACHE_SLOWDOWN
+        seconds = self.overhead_ms / 1000 + rtf * (durations[0] + self.batch_row_cost * sum(durations[1:]))
+        remaining = seconds - (time.perf_counter() - started_at)
+        if remaining > 0:
+            time.sleep(remaining)
+        return audio
+
+    def _render(self, item: Dict[str, Any]) -> np.ndarray:
+        """Sílabas sintéticas (tono con armónicos y envolvente) a partir de un hash de la entrada"""
+        identity = "|".join(str(item.get(key)) for key in (
+            "text", "voice", "text_temp", "waveform_temp", "seed", "small_models"
+        ))
+        rng = np.random.default_rng(int.from_bytes(hashlib.sha256(identity.encode("utf-8")).digest()[:8], "little"))
+
+        seconds = max(0.5, len(item["text"].strip()) / CHARS_PER_AUDIO_SECOND)
+        samples = int(seconds * SAMPLE_RATE)
+        syllable = int(0.2 * SAMPLE_RATE)
+        count = -(-samples // syllable)
+        pitches = rng.uniform(110.0, 260.0, count).astype(np.float32)
+        t = np.arange(syllable, dtype=np.float32) / SAMPLE_RATE
+        envelope = np.sin(np.pi * np.arange(syllable, dtype=np.float32) / syllable) ** 2
+        phase = 2 * np.pi * pitches[:, None] * t[None, :]
+        tones = (np.sin(phase) + 0.5 * np.sin(2 * phase) + 0.25 * np.sin(3 * phase)) * envelope
+        audio = 0.2 * tones.reshape(-1)[:samples] + 0.005 * rng.standard_normal(samples).astype(np.float32)
+        return audio.astype(np.float32)
+
+    def freeze(self):
+        pass
+
+    def set_num_threads(self, threads: int):
+        pass
+
+_BACKENDS = {"bark": BarkBackend, "fake": FakeBackend}
+_backend: Optional[SynthesisBackend] = None
+
+def get_backend() -> SynthesisBackend:
+    """El backend configurado (BARK_BACKEND), creado en el primer uso"""
+    global _backend
+    if _backend is None:
+        _backend = _BACKENDS[SYNTHESIS_BACKEND]()
+    return _backend
@@ -1,6 +1,26 @@
+"""
+Funciones de Bark + parche PyTorch
+
+Este módulo importa torch y Bark, así que solo se importa cuando hace falta un
+modelo (ver model_loader); los modelos se cargan por etapas con load_stage.
+
+Perfiles de inferencia (INFERENCE_PROFILES), elegidos al iniciar
+(BARK_INFERENCE_PROFILE) o por petición:
+
+- fp32: los modelos tal cual (referencia)
+- int8: cuantización dinámica int8 de las capas lineales de los GPT de Bark
+  (text, coarse y fine); el codec sigue en fp32
+- bf16: autocast a bfloat16 si la CPU lo soporta (AVX512-BF16/AMX), si no fp32
+
+Además cada generación puede usar los checkpoints grandes o los pequeños de
+Bark (ver tiers.py).
+"""
+
 import os
+import threading
 import numpy as np
 import torch
+from contextlib import contextmanager
 from pathlib import Path
 from functools import wraps
 
@@ -38,9 +58,6 @@ def patch_torch_load():
 # Aplicar parche inmediatamente
 patch_torch_load()
 
-from bark import SAMPLE_RATE, generate_audio as bark_generate_audio, preload_models
-from scipy.io.wavfile import write as write_wav
-
 # Configurar cache local de modelos antes de cargar Bark
 def setup_model_cache():
     """Configurar cache local para modelos de Bark"""
@@ -61,24 +78,130 @@ def setup_model_cache():
     print(f"📁 Cache de modelos configurado en: {models_dir}")
     return models_dir
 
-# Configurar cache antes de importar/cargar modelos
+# Configurar cache antes de importar Bark (lee las variables de entorno al importarse)
 setup_model_cache()
 
-# Precargar modelos automáticamente al iniciar la aplicación
-print("🚀 Precargando modelos de Bark al iniciar la API...")
-print("⏳ Si es la primera vez, esto descargará ~6.6GB de modelos...")
-preload_models()
-print("✅ Modelos cargados correctamente y listos para usar!")
+from bark import SAMPLE_RATE
+from bark import generation as bark_generation
+from bark.generation import codec_decode, generate_coarse, generate_fine, generate_text_semantic
 
-# Variable global para saber si los modelos ya están cargados
-_models_loaded = True
+from . import metrics, model_loader
+from .audio_utils import write_wav_file
+from .config import DEFAULT_GENERATION_PARAMS, INFERENCE_PROFILES
+from .voices import voice_registry
+
+# Etapas GPT de Bark: tienen variante pequeña y se cuantizan en el perfil int8
+GPT_STAGES = ("text", "coarse", "fine")
+
+# Modelos pequeños (Bark solo guarda una variante por etapa): {etapa: contenedor}
+_small_models = {}
+# Variantes cuantizadas: {(etapa, pequeño): modelo}
+_quantized_models = {}
+# Las variantes se activan sustituyendo los modelos globales de Bark: una generación a la vez
+_models_lock = threading.RLock()
+
+def stage_name(stage: str, small: bool = False) -> str:
+    """Nombre de una etapa para model_loader ("text" o "text_small"...)"""
+    return f"{stage}_small" if small else stage
+
+def load_stage(stage: str):
+    """Cargar en memoria el modelo de una etapa ("text", "coarse", "fine", "codec" o "<etapa>_small")"""
+    with _models_lock:
+        if stage == "codec":
+            bark_generation.load_codec_model(use_gpu=True)
+        elif stage.endswith("_small"):
+            model_type = stage[:-len("_small")]
+            _small_models[model_type] = bark_generation._load_model(
+                bark_generation._get_ckpt_path(model_type, use_small=True),
+                bark_generation._grab_best_device(use_gpu=True),
+                use_small=True, model_type=model_type,
+            )
+        else:
+            bark_generation.load_model(model_type=stage, use_gpu=True, use_small=False)
 
 def ensure_models_loaded():
-    """Los modelos ya están cargados al iniciar la aplicación"""
-    # Los modelos se precargan automáticamente al importar este módulo
-    pass
+    """Asegurar que todas las etapas están cargadas (bloquea la primera vez)"""
+    model_loader.ensure_all_stages()
+
+def bf16_supported() -> bool:
+    """True si la CPU tiene instrucciones bfloat16 nativas (si no, bf16 sería más lento que fp32)"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
 
-def generate_audio(text: str, voice: str = "v2/en_speaker_6", output_file: str = "output.wav"):
+def prepare_profile(profile: str, small: bool = False):
+    """Preparar por adelantado lo que necesita un perfil (p. ej. antes del fork en app.serve)"""
+    if profile == "int8":
+        for stage in GPT_STAGES:
+            _quantized_model(stage, small)
+
+def _container(stage: str, small: bool):
+    """Modelo de una etapa tal como lo guarda Bark (un dict con el tokenizer para "text")"""
+    return _small_models[stage] if small else bark_generation.models[stage]
+
+def _model_of(container, stage: str):
+    return container["model"] if stage == "text" else container
+
+def _with_model(container, stage: str, model):
+    return {**container, "model": model} if stage == "text" else model
+
+def _quantized_model(stage: str, small: bool = False):
+    """Variante int8 (cuantización dinámica de nn.Linear) de una etapa, creada una sola vez"""
+    with _models_lock:
+        if (stage, small) not in _quantized_models:
+            model_loader.ensure_stage(stage_name(stage, small))
+            print(f"⚙️ Cuantizando a int8 el modelo {stage_name(stage, small)}...")
+            _quantized_models[(stage, small)] = torch.ao.quantization.quantize_dynamic(
+                _model_of(_container(stage, small), stage), {torch.nn.Linear}, dtype=torch.qint8
+            )
+        return _quantized_models[(stage, small)]
+
+@contextmanager
+def model_variant(profile: str = None, small: bool = False):
+    """
+    Ejecutar las etapas de Bark con un perfil de inferencia y modelos grandes o pequeños
+
+    Carga antes lo que haga falta (cada etapa la primera vez que se usa). Bark
+    lee sus modelos de un diccionario global, así que los modelos pequeños y
+    las variantes int8 se colocan en él durante la generación y después se
+    restauran los originales; por eso todas las generaciones toman _models_lock.
+    """
+    profile = profile or DEFAULT_GENERATION_PARAMS["profile"]
+    if profile not in INFERENCE_PROFILES:
+        raise ValueError(f"Perfil de inferencia desconocido: {profile}")
+
+    with _models_lock:
+        for stage in GPT_STAGES:
+            model_loader.ensure_stage(stage_name(stage, small))
+        model_loader.ensure_stage("codec")
+
+        swaps = {}
+        for stage in GPT_STAGES:
+            container = _container(stage, small)
+            if profile == "int8":
+                container = _with_model(container, stage, _quantized_model(stage, small))
+            if container is not bark_generation.models.get(stage):
+                swaps[stage] = container
+        originals = {stage: bark_generation.models.get(stage) for stage in swaps}
+        bark_generation.models.update(swaps)
+        try:
+            if profile == "bf16" and bf16_supported():
+                with torch.autocast("cpu", dtype=torch.bfloat16):
+                    yield
+            else:
+                if profile == "bf16":
+                    print("⚠️ La CPU no soporta bfloat16 nativo: se usa fp32")
+                yield
+        finally:
+            for stage, original in originals.items():
+                if original is None:
+                    bark_generation.models.pop(stage, None)
+                else:
+                    bark_generation.models[stage] = original
+
+def generate_audio(text: str, voice: str = "v2/en_speaker_6", output_file: str = "output.wav",
+                   text_temp: float = 0.7, waveform_temp: float = 0.7, seed: int = None):
     """
     Genera audio usando Bark
     
@@ -86,34 +209,409 @@ def generate_audio(text: str, voice: str = "v2/en_speaker_6", output_file: str =
         text: Texto a convertir en audio
         voice: Preset de voz (ej: "v2/en_speaker_6", "v2/es_speaker_0", etc.)
         output_file: Nombre del archivo de salida
+        text_temp: Temperatura de la etapa semántica
+        waveform_temp: Temperatura de las etapas coarse/fine
+        seed: Semilla para resultados reproducibles (opcional)
     
     Returns:
         str: Ruta del archivo generado
     """
     try:
-        # Asegurar que los modelos están cargados (solo una vez)
-        ensure_models_loaded()
-        
-        print(f"🎵 Generando audio para: '{text[:50]}...' con voz: {voice}")
+        audio_array = synthesize(text, voice, text_temp, waveform_temp, seed)
         
-        # Generar audio con Bark (los modelos ya están en memoria)
-        audio_array = bark_generate_audio(text, history_prompt=voice)
-        
-        # Asegurarse de que el audio esté en el formato correcto
-        audio_array = np.array(audio_array)
-        
-        # Normalizar audio para evitar clipping
-        audio_array = audio_array / np.max(np.abs(audio_array))
-        
-        # Convertir a int16 para WAV
-        audio_array = (audio_array * 32767).astype(np.int16)
-        
-        # Guardar archivo WAV
-        write_wav(output_file, SAMPLE_RATE, audio_array)
+        save_audio(audio_array, output_file)
         
         print(f"Audio guardado en: {output_file}")
         return output_file
         
     except Exception as e:
         print(f"Error generando audio: {str(e)}")
-        raise e
\ No newline at end of file
+        raise e
+
+def synthesize(text: str, voice: str = "v2/en_speaker_6", text_temp: float = 0.7,
+               waveform_temp: float = 0.7, seed: int = None, profile: str = None,
+               small_models: bool = False, use_kv_caching: bool = True) -> np.ndarray:
+    """
+    Sintetizar un texto con Bark y devolver el audio (float, sin normalizar)
+    
+    Args:
+        profile: Perfil de inferencia ("fp32", "int8" o "bf16"; por defecto el configurado)
+        small_models: Usar los checkpoints pequeños de Bark (más rápidos, menos calidad)
+        use_kv_caching: Reutilizar el KV cache entre pasos de los GPT
+    
+    Returns:
+        np.ndarray: Audio a SAMPLE_RATE
+    """
+    with model_variant(profile, small_models):
+        return _synthesize(text, voice, text_temp, waveform_temp, seed, use_kv_caching)
+
+def _synthesize(text: str, voice: str, text_temp: float, waveform_temp: float, seed: int,
+                use_kv_caching: bool = True) -> np.ndarray:
+    print(f"🎵 Generando audio para: '{text[:50]}...' con voz: {voice}")
+    
+    if seed is not None:
+        torch.manual_seed(seed)
+        np.random.seed(seed % 2**32)
+    
+    # History prompt ya cargado en memoria (Bark no vuelve a leer el .npz)
+    history_prompt = voice_registry.get(voice)
+    
+    # Generar audio con Bark por etapas (equivalente a bark.generate_audio)
+    with metrics.stage("semantic"):
+        semantic_tokens = generate_text_semantic(
+            text, history_prompt=history_prompt, temp=text_temp, silent=True, use_kv_caching=use_kv_caching
+        )
+    return _semantic_to_audio(semantic_tokens, history_prompt, waveform_temp, use_kv_caching)
+
+def synthesize_batch(items: list) -> list:
+    """
+    Sintetizar varios textos a la vez aprovechando el batching de Bark
+    
+    Las etapas semántica, coarse y fine y la decodificación del codec se
+    ejecutan sobre batches con padding; cada fila se recorta a su longitud real
+    (EOS en la semántica, número de pasos en coarse y fine).
+    
+    Args:
+        items: Lista de dicts con "text", "voice", "text_temp" y "waveform_temp"
+            (y opcionalmente "profile", "small_models" y "use_kv_caching", iguales para todos)
+    
+    Returns:
+        list: Audio de cada elemento (float, sin normalizar), en el mismo orden
+    """
+    with model_variant(items[0].get("profile"), items[0].get("small_models", False)):
+        return _synthesize_batch(items, items[0].get("use_kv_caching", True))
+
+def _synthesize_batch(items: list, use_kv_caching: bool = True) -> list:
+    print(f"📦 Generando batch de {len(items)} segmentos")
+    
+    history_prompts = [voice_registry.get(item["voice"]) for item in items]
+    with metrics.stage("semantic"):
+        semantic_batch = _generate_semantic_batch(
+            [item["text"] for item in items],
+            history_prompts,
+            [item.get("text_temp", 0.7) for item in items],
+            use_kv_caching=use_kv_caching,
+        )
+    
+    with metrics.stage("coarse"):
+        coarse_batch = _generate_coarse_batch(
+            semantic_batch,
+            history_prompts,
+            [item.get("waveform_temp", 0.7) for item in items],
+            use_kv_caching=use_kv_caching,
+        )
+    with metrics.stage("fine"):
+        fine_batch = _generate_fine_batch(coarse_batch, history_prompts, temp=0.5)
+    
+    # El codec siempre en fp32 (también con el perfil bf16)
+    with torch.autocast("cpu", enabled=False), metrics.stage("codec"):
+        return _codec_decode_batch(fine_batch)
+
+def save_audio(audio_array, output_file: str) -> float:
+    """
+    Normalizar el audio y guardarlo como WAV de 16 bits
+    
+    Returns:
+        float: Duración del audio en segundos
+    """
+    with metrics.postprocess("wav_write"):
+        return write_wav_file(audio_array, output_file, SAMPLE_RATE)
+
+def _semantic_to_audio(semantic_tokens, history_prompt, waveform_temp: float = 0.7,
+                       use_kv_caching: bool = True):
+    """Etapas coarse, fine y codec de Bark (equivalente a bark.semantic_to_waveform)"""
+    with metrics.stage("coarse"):
+        coarse_tokens = generate_coarse(
+            semantic_tokens, history_prompt=history_prompt, temp=waveform_temp, silent=True,
+            use_kv_caching=use_kv_caching
+        )
+    with metrics.stage("fine"):
+        fine_tokens = generate_fine(coarse_tokens, history_prompt=history_prompt, temp=0.5)
+    # El codec siempre en fp32 (también con el perfil bf16)
+    with torch.autocast("cpu", enabled=False), metrics.stage("codec"):
+        return codec_decode(fine_tokens)
+
+def _generate_semantic_batch(texts: list, history_prompts: list, temps: list,
+                             min_eos_p: float = 0.2, use_kv_caching: bool = True) -> list:
+    """
+    Versión batch de bark.generation.generate_text_semantic
+    
+    El prompt de Bark tiene forma fija (256 tokens de texto + 256 de historia +
+    token de inferencia), así que todas las filas avanzan juntas; las filas que
+    ya emitieron EOS siguen recibiendo padding y se recortan al final.
+    """
+    model_container = bark_generation.models["text"]
+    model = model_container["model"]
+    tokenizer = model_container["tokenizer"]
+    device = next(model.parameters()).device
+    
+    rows = []
+    for text, history_prompt in zip(texts, history_prompts):
+        text = bark_generation._normalize_whitespace(text)
+        encoded_text = np.array(bark_generation._tokenize(tokenizer, text)) + bark_generation.TEXT_ENCODING_OFFSET
+        if len(encoded_text) > 256:
+            print(f"⚠️ Texto demasiado largo para Bark, se recorta: '{text[:30]}...'")
+            encoded_text = encoded_text[:256]
+        encoded_text = np.pad(
+            encoded_text, (0, 256 - len(encoded_text)),
+            constant_values=bark_generation.TEXT_PAD_TOKEN, mode="constant"
+        )
+        if history_prompt is not None:
+            semantic_history = history_prompt["semantic_prompt"]
+            semantic_history = semantic_history.astype(np.int64)[-256:]
+            semantic_history = np.pad(
+                semantic_history, (0, 256 - len(semantic_history)),
+                constant_values=bark_generation.SEMANTIC_PAD_TOKEN, mode="constant"
+            )
+        else:
+            semantic_history = np.array([bark_generation.SEMANTIC_PAD_TOKEN] * 256)
+        rows.append(np.hstack([
+            encoded_text, semantic_history, np.array([bark_generation.SEMANTIC_INFER_TOKEN])
+        ]).astype(np.int64))
+    
+    vocab_size = bark_generation.SEMANTIC_VOCAB_SIZE
+    pad_token = bark_generation.SEMANTIC_PAD_TOKEN
+    n_tot_steps = 768
+    lengths = [n_tot_steps] * len(rows)
+    
+    with bark_generation._inference_mode():
+        x = torch.from_numpy(np.stack(rows)).to(device)
+        temperatures = torch.tensor(temps, dtype=torch.float32, device=device)[:, None]
+        finished = torch.zeros(len(rows), dtype=torch.bool, device=device)
+        kv_cache = None
+        for n in range(n_tot_steps):
+            if use_kv_caching and kv_cache is not None:
+                x_input = x[:, [-1]]
+            else:
+                x_input = x
+            logits, kv_cache = model(
+                x_input, merge_context=True, use_cache=use_kv_caching, past_kv=kv_cache
+            )
+            # Logits semánticos + logit de EOS (igual que generate_text_semantic)
+            relevant_logits = torch.cat(
+                (logits[:, 0, :vocab_size], logits[:, 0, [pad_token]]), dim=1
+            ).float()
+            probs = torch.softmax(relevant_logits / temperatures, dim=-1)
+            item_next = torch.multinomial(probs, num_samples=1)
+            
+            eos = (item_next[:, 0] == vocab_size) | (probs[:, -1] >= min_eos_p)
+            for i in torch.nonzero(eos & ~finished).flatten().tolist():
+                lengths[i] = n
+            finished |= eos
+            if bool(finished.all()):
+                break
+            
+            # Las filas terminadas solo avanzan con padding
+            item_next = item_next.masked_fill(finished[:, None], pad_token)
+            x = torch.cat((x, item_next), dim=1)
+        
+        out = x.detach().cpu().numpy()[:, 256 + 256 + 1:]
+    
+    return [out[i, :lengths[i]] for i in range(len(rows))]
+
+def _coarse_histories(history_prompt, max_semantic_history: int, semantic_to_coarse_ratio: float):
+    """Historias semántica y coarse (aplanada) de una voz, recortadas como en generate_coarse"""
+    if history_prompt is None:
+        return np.array([], dtype=np.int32), np.array([], dtype=np.int32)
+    
+    x_semantic_history = history_prompt["semantic_prompt"]
+    x_coarse_history = bark_generation._flatten_codebooks(history_prompt["coarse_prompt"]) + bark_generation.SEMANTIC_VOCAB_SIZE
+    n_semantic_hist_provided = min(
+        max_semantic_history,
+        len(x_semantic_history) - len(x_semantic_history) % 2,
+        int(np.floor(len(x_coarse_history) / semantic_to_coarse_ratio)),
+    )
+    n_coarse_hist_provided = int(round(n_semantic_hist_provided * semantic_to_coarse_ratio))
+    x_semantic_history = x_semantic_history[-n_semantic_hist_provided:].astype(np.int32)
+    # Los dos últimos tokens se descartan para alinear en el tiempo (igual que Bark)
+    x_coarse_history = x_coarse_history[-n_coarse_hist_provided:].astype(np.int32)[:-2]
+    return x_semantic_history, x_coarse_history
+
+def _generate_coarse_batch(semantic_list: list, history_prompts: list, temps: list,
+                           max_coarse_history: int = 630, sliding_window_len: int = 60,
+                           use_kv_caching: bool = True) -> list:
+    """
+    Versión batch de bark.generation.generate_coarse
+    
+    Las filas se agrupan por longitud de historia (con las voces de Bark casi
+    siempre la misma, recortada a max_coarse_history), así que dentro de un
+    grupo todas avanzan juntas por las mismas ventanas. La semántica se rellena
+    por la derecha con el mismo token de padding que usa Bark en cada ventana;
+    las filas con menos pasos siguen generando hasta que acaba la más larga y
+    se recortan al final.
+    """
+    semantic_to_coarse_ratio = (
+        bark_generation.COARSE_RATE_HZ / bark_generation.SEMANTIC_RATE_HZ * bark_generation.N_COARSE_CODEBOOKS
+    )
+    max_semantic_history = int(np.floor(max_coarse_history / semantic_to_coarse_ratio))
+    
+    groups = {}
+    for index, history_prompt in enumerate(history_prompts):
+        histories = _coarse_histories(history_prompt, max_semantic_history, semantic_to_coarse_ratio)
+        groups.setdefault(len(histories[0]), []).append((index, histories))
+    
+    results = [None] * len(semantic_list)
+    for rows in groups.values():
+        coarse_tokens = _generate_coarse_group(
+            [semantic_list[index] for index, _ in rows],
+            [histories for _, histories in rows],
+            [temps[index] for index, _ in rows],
+            max_semantic_history, semantic_to_coarse_ratio,
+            max_coarse_history, sliding_window_len, use_kv_caching,
+        )
+        for (index, _), tokens in zip(rows, coarse_tokens):
+            results[index] = tokens
+    return results
+
+def _generate_coarse_group(semantic_list: list, histories: list, temps: list,
+                           max_semantic_history: int, semantic_to_coarse_ratio: float,
+                           max_coarse_history: int, sliding_window_len: int,
+                           use_kv_caching: bool) -> list:
+    """Ventanas deslizantes de generate_coarse para filas con historias de la misma longitud"""
+    n_codebooks = bark_generation.N_COARSE_CODEBOOKS
+    codebook_size = bark_generation.CODEBOOK_SIZE
+    semantic_pad_token = bark_generation.COARSE_SEMANTIC_PAD_TOKEN
+    model = bark_generation.models["coarse"]
+    device = next(model.parameters()).device
+    
+    n_steps = [
+        int(round(np.floor(len(semantic) * semantic_to_coarse_ratio / n_codebooks) * n_codebooks))
+        for semantic in semantic_list
+    ]
+    if min(n_steps) <= 0:
+        raise ValueError("Secuencia semántica demasiado corta para generar audio")
+    total_steps = max(n_steps)
+    base_semantic_idx = len(histories[0][0])
+    n_coarse_history = len(histories[0][1])
+    
+    x_semantic = [np.hstack([semantic_history, semantic]).astype(np.int32)
+                  for semantic, (semantic_history, _) in zip(semantic_list, histories)]
+    max_semantic_len = max(len(row) for row in x_semantic)
+    x_semantic = np.stack([
+        np.pad(row, (0, max_semantic_len - len(row)), constant_values=semantic_pad_token, mode="constant")
+        for row in x_semantic
+    ])
+    x_coarse = np.stack([coarse_history for _, coarse_history in histories]).astype(np.int32)
+    
+    with bark_generation._inference_mode():
+        x_semantic_in = torch.from_numpy(x_semantic).to(device)
+        x_coarse_in = torch.from_numpy(x_coarse).to(device)
+        temperatures = torch.tensor(temps, dtype=torch.float32, device=device)[:, None]
+        infer_tokens = torch.full((len(semantic_list), 1), bark_generation.COARSE_INFER_TOKEN,
+                                  dtype=x_semantic_in.dtype, device=device)
+        n_step = 0
+        for _ in range(int(np.ceil(total_steps / sliding_window_len))):
+            semantic_idx = base_semantic_idx + int(round(n_step / semantic_to_coarse_ratio))
+            x_in = x_semantic_in[:, max(0, semantic_idx - max_semantic_history):][:, :256]
+            x_in = torch.nn.functional.pad(x_in, (0, 256 - x_in.shape[-1]), "constant", semantic_pad_token)
+            x_in = torch.hstack([x_in, infer_tokens, x_coarse_in[:, -max_coarse_history:]])
+            kv_cache = None
+            for _ in range(sliding_window_len):
+                if n_step >= total_steps:
+                    break
+                is_major_step = n_step % n_codebooks == 0
+                if use_kv_caching and kv_cache is not None:
+                    x_input = x_in[:, [-1]]
+                else:
+                    x_input = x_in
+                logits, kv_cache = model(x_input, use_cache=use_kv_caching, past_kv=kv_cache)
+                logit_start_idx = bark_generation.SEMANTIC_VOCAB_SIZE + (1 - int(is_major_step)) * codebook_size
+                relevant_logits = logits[:, 0, logit_start_idx:logit_start_idx + codebook_size].float()
+                probs = torch.softmax(relevant_logits / temperatures, dim=-1)
+                item_next = (torch.multinomial(probs, num_samples=1) + logit_start_idx).to(x_coarse_in.dtype)
+                x_coarse_in = torch.cat((x_coarse_in, item_next), dim=1)
+                x_in = torch.cat((x_in, item_next), dim=1)
+                n_step += 1
+        
+        generated = x_coarse_in.detach().cpu().numpy()[:, n_coarse_history:]
+    
+    results = []
+    for row, steps in zip(generated, n_steps):
+        coarse_tokens = row[:steps].reshape(-1, n_codebooks).T - bark_generation.SEMANTIC_VOCAB_SIZE
+        for n in range(1, n_codebooks):
+            coarse_tokens[n, :] -= n * codebook_size
+        results.append(coarse_tokens)
+    return results
+
+def _generate_fine_batch(coarse_list: list, history_prompts: list, temp: float = 0.5) -> list:
+    """
+    Versión batch de bark.generation.generate_fine
+    
+    El modelo fine no es causal y trabaja en ventanas de 1024 pasos que avanzan
+    de 512 en 512. Todas las filas usan la misma historia de longitud (la más
+    corta del batch, como mucho 512) y se rellenan por la derecha con el token
+    de padding, igual que Bark rellena las entradas de menos de 1024 pasos; cada
+    fila se recorta después a su longitud.
+    """
+    n_fine_codebooks = bark_generation.N_FINE_CODEBOOKS
+    codebook_size = bark_generation.CODEBOOK_SIZE
+    model = bark_generation.models["fine"]
+    device = next(model.parameters()).device
+    
+    n_coarse = coarse_list[0].shape[0]
+    histories = [
+        history_prompt["fine_prompt"].astype(np.int32)[:, -512:] if history_prompt is not None else None
+        for history_prompt in history_prompts
+    ]
+    n_history = 0 if any(history is None for history in histories) else min(history.shape[1] for history in histories)
+    lengths = [coarse_tokens.shape[1] for coarse_tokens in coarse_list]
+    total_len = max(1024, n_history + max(lengths))
+    
+    in_arr = np.full((len(coarse_list), n_fine_codebooks, total_len), codebook_size, dtype=np.int32)
+    for i, (coarse_tokens, history) in enumerate(zip(coarse_list, histories)):
+        if n_history:
+            in_arr[i, :, :n_history] = history[:, -n_history:]
+        in_arr[i, :n_coarse, n_history:n_history + lengths[i]] = coarse_tokens
+    n_loops = max(0, int(np.ceil((max(lengths) - (1024 - n_history)) / 512))) + 1
+    
+    with bark_generation._inference_mode():
+        in_arr = torch.from_numpy(in_arr).transpose(1, 2).contiguous().to(device)
+        for n in range(n_loops):
+            start_idx = min(n * 512, total_len - 1024)
+            start_fill_idx = min(n_history + n * 512, total_len - 512)
+            rel_start_fill_idx = start_fill_idx - start_idx
+            in_buffer = in_arr[:, start_idx:start_idx + 1024, :].clone()
+            for nn in range(n_coarse, n_fine_codebooks):
+                logits = model(nn, in_buffer)
+                relevant_logits = logits[:, rel_start_fill_idx:, :codebook_size].float()
+                if temp is None:
+                    codebook_preds = torch.argmax(relevant_logits, -1)
+                else:
+                    probs = torch.softmax(relevant_logits / temp, dim=-1)
+                    codebook_preds = torch.multinomial(
+                        probs.reshape(-1, codebook_size), num_samples=1
+                    ).reshape(probs.shape[:2])
+                in_buffer[:, rel_start_fill_idx:, nn] = codebook_preds.to(in_buffer.dtype)
+            in_arr[:, start_fill_idx:start_fill_idx + (1024 - rel_start_fill_idx), n_coarse:] = (
+                in_buffer[:, rel_start_fill_idx:, n_coarse:]
+            )
+        
+        out = in_arr.detach().cpu().numpy().transpose(0, 2, 1)
+    
+    return [out[i, :, n_history:n_history + length] for i, length in enumerate(lengths)]
+
+def _codec_decode_batch(fine_tokens_list: list) -> list:
+    """
+    Versión batch de bark.generation.codec_decode
+    
+    Los tokens se rellenan hasta la longitud máxima; como el decoder de EnCodec
+    es causal, el padding final no altera las muestras de cada audio, que se
+    recortan a su longitud real.
+    """
+    model = bark_generation.models["codec"]
+    device = next(model.parameters()).device
+    
+    n_codebooks = fine_tokens_list[0].shape[0]
+    max_frames = max(tokens.shape[1] for tokens in fine_tokens_list)
+    padded = np.zeros((len(fine_tokens_list), n_codebooks, max_frames), dtype=np.int64)
+    for i, tokens in enumerate(fine_tokens_list):
+        padded[i, :, :tokens.shape[1]] = tokens
+    
+    with bark_generation._inference_mode():
+        arr = torch.from_numpy(padded).to(device).transpose(0, 1)
+        emb = model.quantizer.decode(arr)
+        out = model.decoder(emb)
+        audio = out.detach().cpu().numpy()[:, 0, :]
+    
+    hop_length = audio.shape[1] // max_frames
+    return [audio[i, :tokens.shape[1] * hop_length] for i, tokens in enumerate(fine_tokens_list)]
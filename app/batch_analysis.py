@@ -0,0 +1,197 @@
+"""
+Análisis de textos en lote (POST /analyze-text/batch)
+
+Los textos se reparten en trozos entre procesos de un pool (arrancados con
+"spawn": no heredan los modelos de Bark del proceso del servidor, solo importan
+el paquete `app`, que no carga nada pesado). Los resultados se devuelven en
+el orden de entrada en cuanto está listo cada trozo, con unos pocos trozos en
+vuelo por proceso para que todos los núcleos trabajen sin acumular memoria.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from . import metrics, smart_text_processing
+from .config import ANALYSIS_CHUNK_SIZE, ANALYSIS_WORKERS
+from .text_analysis import analysis_memo, normalize_for_analysis
+
+# Trozos en vuelo por proceso del pool
+INFLIGHT_PER_WORKER = 2
+
+_executor: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+def parse_texts(body: bytes, content_type: Optional[str] = None) -> List[Any]:
+    """
+    Extraer los textos de un lote en JSON o NDJSON
+
+    Acepta un array JSON (de textos o de objetos con "text"), un objeto
+    {"texts": [...]} o NDJSON con un texto u objeto por línea. Los elementos
+    que no son texto se devuelven tal cual y se informan como error.
+
+    Raises:
+        ValueError: Si el cuerpo no es JSON/NDJSON válido
+    """
+    try:
+        raw = body.decode("utf-8")
+    except UnicodeDecodeError:
+        raise ValueError("El cuerpo debe estar en UTF-8")
+
+    is_ndjson = content_type is not None and any(
+        kind in content_type for kind in ("ndjson", "jsonl", "json-seq")
+    )
+    if not is_ndjson and raw.lstrip()[:1] in ("[", "{"):
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            # Varios objetos JSON seguidos: NDJSON sin la cabecera adecuada
+            data = None
+        if isinstance(data, dict) and isinstance(data.get("texts"), list):
+            data = data["texts"]
+        if isinstance(data, list):
+            return [_item_text(item) for item in data]
+        if data is not None and not isinstance(data, dict):
+            raise ValueError("Se esperaba un array JSON de textos")
+
+    items = []
+    for number, line in enumerate(raw.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            items.append(_item_text(json.loads(line)))
+        except json.JSONDecodeError:
+            raise ValueError(f"Línea {number}: JSON no válido")
+    return items
+
+def _item_text(item: Any) -> Any:
+    if isinstance(item, dict) and "text" in item:
+        return item["text"]
+    return item
+
+def _analyze_chunk(texts: List[Any]) -> List[Dict[str, Any]]:
+    """Analizar un trozo de textos (se ejecuta en un proceso del pool)"""
+    return [_analyze_item(text, smart_text_processing) for text in texts]
+
+def _analyze_memoized(texts: List[Any]) -> List[Dict[str, Any]]:
+    """Analizar un trozo en el proceso del servidor, con el memo de análisis"""
+    return [_analyze_item(text, partial(analysis_memo.analyze, source="batch")) for text in texts]
+
+def _analyze_item(text: Any, analyze) -> Dict[str, Any]:
+    if not isinstance(text, str):
+        return {"error": "Cada elemento debe ser un texto o un objeto con \"text\""}
+    text = normalize_for_analysis(text)
+    if not text:
+        return {"error": "El texto no puede estar vacío"}
+    result = analyze(text)
+    return {
+        "analysis": result["analysis"],
+        "recommendations": result["recommendations"],
+        "processed_text": result["processed_text"],
+    }
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=max(1, ANALYSIS_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+def _reset_executor(broken: ProcessPoolExecutor):
+    """Descartar un pool roto (p. ej. un proceso murió) para que el siguiente lote cree otro"""
+    global _executor
+    with _lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def shutdown():
+    """Parar los procesos del pool (al apagar el servidor)"""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+async def stream_analysis(texts: List[Any], chunk_size: int = ANALYSIS_CHUNK_SIZE) -> AsyncIterator[str]:
+    """
+    Analizar un lote y emitir una línea NDJSON por texto, en orden, y un resumen al final
+
+    Un lote de un solo trozo se analiza en un hilo del servidor (con el memo de
+    análisis); los demás, en el pool de procesos.
+    """
+    started_at = time.time()
+    chunk_size = max(1, chunk_size)
+    chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+    loop = asyncio.get_running_loop()
+    executor = _get_executor() if len(chunks) > 1 else None
+    max_inflight = max(1, ANALYSIS_WORKERS) * INFLIGHT_PER_WORKER
+    pending = deque()  # (future, textos del trozo) en orden de entrada
+    next_chunk = 0
+
+    def submit_more():
+        nonlocal next_chunk
+        while next_chunk < len(chunks) and len(pending) < max_inflight:
+            chunk = chunks[next_chunk]
+            if executor is None:
+                future = loop.run_in_executor(None, _analyze_memoized, chunk)
+            else:
+                future = loop.run_in_executor(executor, _analyze_chunk, chunk)
+            pending.append((future, len(chunk)))
+            next_chunk += 1
+
+    types = Counter()
+    errors = 0
+    index = 0
+    submit_more()
+    try:
+        while pending:
+            future, size = pending.popleft()
+            try:
+                results = await future
+            except BrokenProcessPool as e:
+                _reset_executor(executor)
+                print(f"⚠️ El pool de análisis se rompió: {str(e)}")
+                results = [{"error": "Error interno: el proceso de análisis terminó inesperadamente"}] * size
+            except Exception as e:
+                print(f"⚠️ Error analizando un trozo del lote: {str(e)}")
+                results = [{"error": f"Error interno: {str(e)}"}] * size
+            submit_more()
+
+            lines = []
+            for result in results:
+                if "error" in result:
+                    errors += 1
+                else:
+                    types[result["analysis"]["type"]] += 1
+                    if executor is not None:
+                        # Los trozos analizados en el proceso del servidor se cuentan en el memo
+                        metrics.record_text(len(result["analysis"]["text"]), result["analysis"]["type"], "batch")
+                lines.append(json.dumps({"index": index, **result}, ensure_ascii=False))
+                index += 1
+            yield "\n".join(lines) + "\n"
+    finally:
+        # Cliente desconectado: no seguir analizando lo que ya nadie leerá
+        for future, _ in pending:
+            future.cancel()
+
+    elapsed = time.time() - started_at
+    summary = {
+        "total": len(texts),
+        "analyzed": len(texts) - errors,
+        "errors": errors,
+        "types": dict(types),
+        "seconds": round(elapsed, 3),
+        "texts_per_second": round(len(texts) / elapsed, 1) if elapsed > 0 else None,
+    }
+    yield json.dumps({"summary": summary}, ensure_ascii=False) + "\n"
@@ -0,0 +1,225 @@
+"""
+Lotes de generación (POST /generate-batch/): un álbum o una lista de poemas
+
+Cada elemento del lote es un job normal del worker de inferencia. Este módulo
+guarda el manifiesto del lote (estado, file_id, duración y tiempos de cada
+elemento) y lo actualiza cada vez que termina un job; igual que el estado de
+los jobs, se guarda en disco para que cualquier proceso worker pueda servirlo.
+También genera el ZIP con todos los resultados en streaming, sin crearlo antes
+en disco ni en memoria.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .config import GENERATION_BATCH_DIR, STORAGE_TTL_HOURS
+from .inference import job_status
+
+# Número máximo de lotes que se recuerdan en memoria (los demás se leen de disco)
+MAX_BATCHES = 200
+
+_batches: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_lock = threading.Lock()
+
+def create_batch(items: List[Dict[str, Any]], options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Registrar un lote cuyos jobs ya se encolaron
+
+    Args:
+        items: Por elemento, en el orden de la petición: "job" (el job encolado),
+            "name", "detected_type", "music_included" y "music_style"
+        options: Opciones comunes del lote (nivel, formato...) para el manifiesto
+
+    Returns:
+        dict: El manifiesto del lote
+    """
+    batch = {
+        "batch_id": str(uuid.uuid4()),
+        "created_at": time.time(),
+        "options": options,
+        "items": [
+            {
+                "index": index,
+                "name": item.get("name"),
+                "detected_type": item["detected_type"],
+                "music_included": item["music_included"],
+                "music_style": item["music_style"],
+                **_item_status(item["job"]),
+            }
+            for index, item in enumerate(items)
+        ],
+    }
+    with _lock:
+        _batches[batch["batch_id"]] = batch
+        while len(_batches) > MAX_BATCHES:
+            _batches.popitem(last=False)
+    _save_batch(batch)
+    _prune_saved_batches()
+
+    # Actualizar el manifiesto al terminar cada job (los aciertos de cache ya terminaron)
+    for index, item in enumerate(items):
+        item["job"]["future"].add_done_callback(
+            lambda _, index=index, job=item["job"]: _item_finished(batch, index, job)
+        )
+    return manifest(batch)
+
+def lookup_batch(batch_id: str) -> Optional[Dict[str, Any]]:
+    """Manifiesto de un lote: el de este proceso o, si lo creó otro worker, el guardado en disco"""
+    with _lock:
+        batch = _batches.get(batch_id)
+        if batch is not None:
+            return manifest(batch)
+    try:
+        with open(_batch_path(batch_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def manifest(batch: Dict[str, Any]) -> Dict[str, Any]:
+    """Representación pública (serializable a JSON) de un lote, con su estado global"""
+    items = [dict(item) for item in batch["items"]]
+    counts = {status: 0 for status in ("queued", "running", "done", "error")}
+    for item in items:
+        counts[item["status"]] = counts.get(item["status"], 0) + 1
+
+    if counts["done"] == len(items):
+        status = "done"
+    elif counts["done"] + counts["error"] < len(items):
+        status = "running" if counts["running"] or counts["done"] or counts["error"] else "queued"
+    else:
+        status = "partial" if counts["done"] else "error"
+
+    finished = [item["finished_at"] for item in items if item["finished_at"] is not None]
+    return {
+        "batch_id": batch["batch_id"],
+        "status": status,
+        "total": len(items),
+        "counts": counts,
+        "created_at": batch["created_at"],
+        "finished_at": max(finished) if status in ("done", "partial", "error") and finished else None,
+        "audio_seconds": sum(item["audio_seconds"] or 0 for item in items),
+        "options": batch["options"],
+        "items": items,
+    }
+
+def _item_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Estado, archivo, duración y tiempos de un elemento a partir de su job"""
+    status = job_status(job)
+    created_at, started_at, finished_at = status["created_at"], status["started_at"], status["finished_at"]
+    return {
+        "job_id": status["job_id"],
+        "status": status["status"],
+        "file_id": status["file_id"],
+        "voice": status["voice"],
+        "tier": status.get("tier"),
+        "segments": status["segments"],
+        "audio_seconds": status["audio_seconds"],
+        "cache_hit": status["cache_hit"],
+        "phrases_reused": status["phrases_reused"],
+        "error": status["error"],
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "timings": {
+            "queued_seconds": started_at - created_at if started_at is not None else None,
+            "compute_seconds": status["compute_seconds"],
+            "total_seconds": finished_at - created_at if finished_at is not None else None,
+        },
+    }
+
+def _item_finished(batch: Dict[str, Any], index: int, job: Dict[str, Any]):
+    with _lock:
+        batch["items"][index].update(_item_status(job))
+    _save_batch(batch)
+
+def _batch_path(batch_id: str) -> str:
+    return os.path.join(GENERATION_BATCH_DIR, f"{batch_id}.json")
+
+def _save_batch(batch: Dict[str, Any]):
+    """Guardar el manifiesto en disco (escritura atómica)"""
+    path = _batch_path(batch["batch_id"])
+    try:
+        os.makedirs(GENERATION_BATCH_DIR, exist_ok=True)
+        with _lock:
+            data = manifest(batch)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar el manifiesto del lote {batch['batch_id']}: {e}")
+
+def _prune_saved_batches():
+    """Borrar los manifiestos más antiguos que el TTL del audio (su audio ya no existe)"""
+    if STORAGE_TTL_HOURS <= 0:
+        return
+    expires_before = time.time() - STORAGE_TTL_HOURS * 3600
+    try:
+        names = os.listdir(GENERATION_BATCH_DIR)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(GENERATION_BATCH_DIR, name)
+        try:
+            if os.path.getmtime(path) < expires_before:
+                os.remove(path)
+        except OSError:
+            pass
+
+def archive_name(item: Dict[str, Any], extension: str) -> str:
+    """Nombre de un elemento dentro del ZIP: posición, nombre (o tipo) y file_id"""
+    label = re.sub(r"[^\w.-]+", "_", item.get("name") or item.get("detected_type") or "audio").strip("._")
+    return f"{item['index'] + 1:03d}_{label[:60] or 'audio'}_{item['file_id'][:8]}.{extension}"
+
+class _ZipStream:
+    """Destino de zipfile que acumula lo escrito para emitirlo por trozos"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+def iter_zip(manifest_data: Dict[str, Any], files: List[Tuple[str, str]],
+             chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+    """
+    Generar un ZIP (sin comprimir: el audio ya no se comprime más) por trozos
+
+    Args:
+        manifest_data: Se incluye como manifest.json
+        files: (nombre dentro del ZIP, ruta) de cada archivo
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as archive:
+        archive.writestr("manifest.json", json.dumps(manifest_data, indent=2, ensure_ascii=False))
+        yield stream.take()
+        for name, path in files:
+            with open(path, "rb") as source, archive.open(name, "w", force_zip64=True) as target:
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    yield stream.take()
+            yield stream.take()
+    yield stream.take()
@@ -0,0 +1,112 @@
+"""
+Configuración de la API (ajustable con variables de entorno)
+"""
+
+import os
+
+# Directorio para archivos generados
+AUDIO_DIR = os.getenv("BARK_AUDIO_DIR", "generated_audio")
+
+# Ciclo de vida del audio generado: índice, caducidad y presupuesto de espacio (0 desactiva)
+STORAGE_DB = os.getenv("BARK_STORAGE_DB", os.path.join(AUDIO_DIR, "storage.sqlite3"))
+STORAGE_TTL_HOURS = float(os.getenv("BARK_STORAGE_TTL_HOURS", "168"))
+STORAGE_MAX_MB = int(os.getenv("BARK_STORAGE_MAX_MB", "10240"))
+STORAGE_SWEEP_INTERVAL_S = float(os.getenv("BARK_STORAGE_SWEEP_INTERVAL_S", "300"))
+
+# Estado de los jobs en disco (compartido entre procesos worker)
+JOB_STATE_DIR = os.getenv("BARK_JOB_STATE_DIR", os.path.join(AUDIO_DIR, "jobs"))
+
+# Métricas de Prometheus con varios workers (app.serve): cada proceso escribe las suyas aquí
+METRICS_DIR = os.getenv("BARK_METRICS_DIR", os.path.join(AUDIO_DIR, "metrics"))
+
+# Perfilado bajo demanda (ver app/profiling.py): cabecera X-Bark-Profile (desactivada por defecto:
+# cualquier cliente podría forzar jobs caros y trazas de cientos de MB), fracción de jobs
+# perfilados al azar (0.01 = 1%) y carpeta de los perfiles y trazas
+PROFILE_HEADER_ENABLED = os.getenv("BARK_PROFILE_HEADER", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("BARK_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("BARK_PROFILE_DIR", os.path.join(AUDIO_DIR, "profiles"))
+
+# Generación en lote (POST /generate-batch/): manifiestos en disco y máximo de elementos por lote
+GENERATION_BATCH_DIR = os.getenv("BARK_GENERATION_BATCH_DIR", os.path.join(AUDIO_DIR, "batches"))
+GENERATION_BATCH_MAX_ITEMS = int(os.getenv("BARK_GENERATION_BATCH_MAX_ITEMS", "100"))
+
+# Cache de resultados: audio ya generado para el mismo texto, voz y parámetros
+RESULT_CACHE_DIR = os.getenv("BARK_RESULT_CACHE_DIR", os.path.join(AUDIO_DIR, "cache"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("BARK_RESULT_CACHE_MAX_ENTRIES", "1000"))
+RESULT_CACHE_MAX_MB = int(os.getenv("BARK_RESULT_CACHE_MAX_MB", "2048"))
+
+# Cache de frases: audio de cada segmento (línea, estribillo...) para no sintetizarlo dos veces
+PHRASE_CACHE_DIR = os.getenv("BARK_PHRASE_CACHE_DIR", os.path.join(AUDIO_DIR, "phrases"))
+PHRASE_CACHE_MAX_ENTRIES = int(os.getenv("BARK_PHRASE_CACHE_MAX_ENTRIES", "10000"))
+PHRASE_CACHE_MAX_MB = int(os.getenv("BARK_PHRASE_CACHE_MAX_MB", "2048"))
+PHRASE_CACHE_MEMORY_MB = int(os.getenv("BARK_PHRASE_CACHE_MEMORY_MB", "256"))
+
+# Memo del análisis de texto: el mismo texto (p. ej. /analyze-text/ y luego /smart-generate/) se analiza una vez
+TEXT_ANALYSIS_CACHE_ENTRIES = int(os.getenv("BARK_TEXT_ANALYSIS_CACHE_ENTRIES", "1024"))
+TEXT_ANALYSIS_CACHE_MAX_CHARS = int(os.getenv("BARK_TEXT_ANALYSIS_CACHE_MAX_CHARS", "20000000"))
+
+# Análisis de textos en lote (POST /analyze-text/batch): procesos del pool, textos por trozo y máximo por petición
+ANALYSIS_WORKERS = int(os.getenv("BARK_ANALYSIS_WORKERS", str(os.cpu_count() or 1)))
+ANALYSIS_CHUNK_SIZE = int(os.getenv("BARK_ANALYSIS_CHUNK_SIZE", "64"))
+ANALYSIS_BATCH_MAX_ITEMS = int(os.getenv("BARK_ANALYSIS_BATCH_MAX_ITEMS", "10000"))
+
+# Control de admisión: máximo de jobs en cola y de segundos de cómputo estimados en cola
+# (según longitud del texto y nivel); más allá se responde 429 con Retry-After (0 = sin límite)
+QUEUE_MAX_JOBS = int(os.getenv("BARK_QUEUE_MAX_JOBS", "64"))
+QUEUE_MAX_SECONDS = float(os.getenv("BARK_QUEUE_MAX_SECONDS", "900"))
+
+# Micro-batching: segmentos que llegan dentro de la ventana se generan juntos (filas por batch)
+BATCH_MAX_SIZE = int(os.getenv("BARK_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = int(os.getenv("BARK_BATCH_MAX_WAIT_MS", "50"))
+
+# Formatos comprimidos (Opus, MP3, FLAC): hilos que codifican las variantes del WAV
+TRANSCODE_WORKERS = int(os.getenv("BARK_TRANSCODE_WORKERS", "2"))
+
+# Síntesis por segmentos: textos largos se dividen en trozos que Bark maneja bien (~13 s)
+SEGMENT_MAX_CHARS = int(os.getenv("BARK_SEGMENT_MAX_CHARS", "220"))
+SEGMENT_GAP_MS = int(os.getenv("BARK_SEGMENT_GAP_MS", "200"))
+SEGMENT_CROSSFADE_MS = int(os.getenv("BARK_SEGMENT_CROSSFADE_MS", "20"))
+
+# Voces: carpeta adicional con presets .npz propios (además de los incluidos en Bark)
+VOICE_PROMPTS_DIR = os.getenv("BARK_VOICE_PROMPTS_DIR", "")
+
+# Backend de síntesis: "bark" (los modelos reales) o "fake" (audio determinista sin modelos,
+# para medir colas, caches, batching y E/S en máquinas sin los 6.6GB de Bark)
+SYNTHESIS_BACKENDS = ("bark", "fake")
+SYNTHESIS_BACKEND = os.getenv("BARK_BACKEND", "bark")
+if SYNTHESIS_BACKEND not in SYNTHESIS_BACKENDS:
+    raise ValueError(f"BARK_BACKEND debe ser uno de {SYNTHESIS_BACKENDS}")
+# Modelo de latencia del backend "fake": segundos de cómputo por segundo de audio, coste fijo
+# por llamada y coste de cada fila extra de un batch (relativo a la más larga)
+FAKE_RTF = float(os.getenv("BARK_FAKE_RTF", "0.5"))
+FAKE_OVERHEAD_MS = float(os.getenv("BARK_FAKE_OVERHEAD_MS", "50"))
+FAKE_BATCH_ROW_COST = float(os.getenv("BARK_FAKE_BATCH_ROW_COST", "0.35"))
+
+# Carga de modelos: en segundo plano tras el arranque (1) o bajo demanda en el primer uso (0)
+PRELOAD_MODELS = os.getenv("BARK_PRELOAD_MODELS", "1") != "0"
+# Inferencia de calentamiento tras cargar los modelos (texto vacío la desactiva)
+WARMUP_TEXT = os.getenv("BARK_WARMUP_TEXT", "Hola.")
+WARMUP_VOICE = os.getenv("BARK_WARMUP_VOICE", "v2/es_speaker_0")
+# Cargar también al arrancar los modelos pequeños del nivel "draft" (si no, en su primer uso)
+PRELOAD_SMALL_MODELS = os.getenv("BARK_PRELOAD_SMALL_MODELS", "0") == "1"
+
+# Perfiles de inferencia en CPU (ver bark_utils): fp32 (referencia), int8 (cuantización dinámica), bf16
+INFERENCE_PROFILES = ("fp32", "int8", "bf16")
+INFERENCE_PROFILE = os.getenv("BARK_INFERENCE_PROFILE", "fp32")
+if INFERENCE_PROFILE not in INFERENCE_PROFILES:
+    raise ValueError(f"BARK_INFERENCE_PROFILE debe ser uno de {INFERENCE_PROFILES}")
+
+# Parámetros de generación por defecto (los mismos que usa Bark)
+DEFAULT_GENERATION_PARAMS = {
+    "text_temp": 0.7,
+    "waveform_temp": 0.7,
+    "seed": None,
+    "profile": INFERENCE_PROFILE,
+    "small_models": False,
+    "use_kv_caching": True,
+}
+
+# Servidor de producción (app.serve): procesos worker y apagado ordenado
+WORKERS = int(os.getenv("BARK_WORKERS", "1"))
+# Segundos que se espera a las peticiones y jobs en curso al apagar
+GRACEFUL_TIMEOUT = int(os.getenv("BARK_GRACEFUL_TIMEOUT", "120"))
@@ -0,0 +1,726 @@
+"""
+Worker de inferencia dedicado para Bark
+
+Una generación con Bark tarda 20-60 segundos y bloquea el hilo que la ejecuta,
+además los modelos de Bark son globales al proceso. Por eso todas las
+generaciones se encolan como "jobs" y se ejecutan en un único hilo de
+inferencia; los endpoints async solo esperan el resultado sin bloquear el
+event loop (o devuelven el id del job inmediatamente).
+
+Cada job se compone de uno o más segmentos de texto. Los jobs que llegan dentro
+de una ventana corta (BATCH_MAX_WAIT_MS) se juntan y sus segmentos se sintetizan
+en batches de hasta BATCH_MAX_SIZE filas para aprovechar mejor la CPU; un texto
+largo dividido en segmentos se sintetiza así en paralelo.
+
+Cada segmento distinto (por voz y parámetros) se sintetiza una sola vez: los
+repetidos dentro de los jobs del batch (estribillos) y los que ya están en el
+cache de frases se reutilizan.
+
+Los jobs en streaming reciben el audio de cada segmento, en orden, en cuanto
+se sintetiza (ver iter_segment_audio).
+
+El estado de cada job se guarda también en disco (JOB_STATE_DIR): con varios
+procesos (app.serve) la consulta puede llegar a un worker distinto del que
+creó el job.
+
+La cola está acotada (control de admisión): cada job tiene un coste estimado
+(segundos de cómputo según la longitud del texto y el RTF de su nivel) y si
+con él la cola supera QUEUE_MAX_JOBS jobs o QUEUE_MAX_SECONDS segundos de
+trabajo pendiente se rechaza con QueueFull, que indica cuándo reintentar.
+"""
+
+import asyncio
+import json
+import math
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from . import metrics, profiling, tiers
+from .backends import get_backend
+from .audio_cache import cache_key, phrase_cache, phrase_key, result_cache
+from .audio_utils import join_segments, wav_duration, write_wav_file
+from .config import (
+    BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, DEFAULT_GENERATION_PARAMS, JOB_STATE_DIR, QUEUE_MAX_JOBS, QUEUE_MAX_SECONDS
+)
+
+# Número máximo de jobs terminados que se recuerdan para consultar su estado
+MAX_FINISHED_JOBS = 1000
+
+_jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_jobs_lock = threading.Lock()
+_job_queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+_worker_thread: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+# Jobs pendientes por clave de cache: peticiones idénticas simultáneas esperan al mismo job
+_inflight: Dict[str, Dict[str, Any]] = {}
+# Control de admisión: coste estimado (segundos) de los jobs en cola, en orden de llegada,
+# y de los que se están ejecutando (con el instante en que empezaron)
+_queued: "OrderedDict[str, float]" = OrderedDict()
+_running: Dict[str, tuple] = {}
+_admission_lock = threading.Lock()
+
+class QueueFull(Exception):
+    """La cola de generación está llena: reintentar pasados retry_after segundos"""
+
+    def __init__(self, retry_after: int, queued_jobs: int, queued_seconds: float):
+        super().__init__(
+            f"Cola de generación llena ({queued_jobs} jobs, ~{queued_seconds:.0f}s de trabajo pendiente); "
+            f"reintenta en {retry_after}s"
+        )
+        self.retry_after = retry_after
+        self.queued_jobs = queued_jobs
+        self.queued_seconds = queued_seconds
+
+def start_worker():
+    """Arrancar el hilo de inferencia si no está corriendo (idempotente)"""
+    global _worker_thread
+    with _worker_lock:
+        if _worker_thread is not None and _worker_thread.is_alive():
+            return
+        _worker_thread = threading.Thread(
+            target=_worker_loop, name="bark-inference", daemon=True
+        )
+        _worker_thread.start()
+        print("🧵 Worker de inferencia iniciado")
+
+def estimate_cost(text: str, tier: Optional[str] = None) -> float:
+    """Segundos de cómputo estimados para generar un texto (longitud y RTF observado del nivel)"""
+    return tiers.predict_latency_ms(text, tier or tiers.DEFAULT_TIER) / 1000
+
+def check_admission(cost: float, jobs: int = 1):
+    """
+    Comprobar, sin reservar sitio, si cabrían `jobs` jobs más con un coste total `cost`
+
+    Sirve para rechazar una petición antes de analizar su texto o un lote entero
+    antes de encolar ninguno de sus elementos.
+
+    Raises:
+        QueueFull: Si no caben
+    """
+    with _admission_lock:
+        _check_admission(cost, jobs)
+
+def queue_stats() -> Dict[str, Any]:
+    """Estado de la cola de generación (jobs y segundos estimados en cola y en curso)"""
+    with _admission_lock:
+        return {
+            "queued_jobs": len(_queued),
+            "queued_seconds": round(sum(_queued.values()), 1),
+            "running_jobs": len(_running),
+            "max_jobs": QUEUE_MAX_JOBS,
+            "max_seconds": QUEUE_MAX_SECONDS,
+        }
+
+def submit_job(segments: List[str], voice: str, output_file: str, file_id: str,
+               metadata: Optional[Dict[str, Any]] = None,
+               params: Optional[Dict[str, Any]] = None,
+               stream: bool = False,
+               profile_mode: Optional[str] = None,
+               admission: bool = True) -> Dict[str, Any]:
+    """
+    Encolar una generación de audio y devolver el job inmediatamente
+
+    Cada segmento se sintetiza por separado (en el mismo batch si caben) y el
+    audio final se une con fundidos y silencios. Si el mismo texto, voz y
+    parámetros ya se generaron antes, el audio sale del cache de resultados y el
+    job se devuelve ya terminado sin pasar por Bark.
+
+    Args:
+        segments: Textos finales (ya procesados) que se enviarán a Bark, en orden
+        voice: Preset de voz
+        output_file: Ruta donde se guardará el WAV
+        file_id: Identificador público del archivo generado
+        metadata: Información adicional para mostrar en el estado del job
+        params: Parámetros de generación (ver DEFAULT_GENERATION_PARAMS)
+        stream: Publicar el audio de cada segmento al terminarlo (llamar desde el
+            event loop; consumir con iter_segment_audio)
+        profile_mode: Perfilar la síntesis ("auto", "torch" o "cprofile"; ver
+            app/profiling.py). El job se sintetiza solo y sin caches.
+        admission: Rechazar el job si la cola está llena (False si ya se
+            comprobó con check_admission, p. ej. para un lote entero)
+
+    Returns:
+        dict: El job encolado (su clave "future" se resuelve al terminar)
+
+    Raises:
+        QueueFull: Si el job tendría que sintetizarse y la cola está llena
+    """
+    generation_params = dict(DEFAULT_GENERATION_PARAMS)
+    generation_params.update({k: v for k, v in (params or {}).items() if v is not None})
+
+    job = {
+        "job_id": str(uuid.uuid4()),
+        "status": "queued",
+        "text": "\n".join(segments),
+        "segments": list(segments),
+        "segment_audio": [None] * len(segments),
+        "audio_seconds": None,
+        "voice": voice,
+        "file_id": file_id,
+        "output_file": output_file,
+        "params": generation_params,
+        "cache_key": cache_key(segments, voice, generation_params),
+        "phrase_keys": [phrase_key(segment, voice, generation_params) for segment in segments],
+        "phrases_reused": 0,
+        "cache_hit": False,
+        "metadata": metadata or {},
+        "error": None,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        # Cómputo atribuible al job (su parte de cada batch en un micro-batch)
+        "compute_seconds": None,
+        "future": Future(),
+        # Streaming: cola asyncio donde el worker publica los segmentos en orden
+        "segment_queue": asyncio.Queue() if stream else None,
+        "segment_loop": asyncio.get_running_loop() if stream else None,
+        "segments_published": 0,
+        "profiling": None,
+        "estimated_seconds": estimate_cost("\n".join(segments), (metadata or {}).get("tier")),
+    }
+    if profile_mode is not None:
+        profiling.validate_mode(profile_mode)
+        job["profiling"] = profiling.job_info(job["job_id"], profile_mode)
+        job["estimated_seconds"] *= profiling.COST_FACTOR
+
+    # Un job perfilado se sintetiza siempre (sin cache de resultados ni deduplicación)
+    cached = job["profiling"] is None and result_cache.fetch(job["cache_key"], output_file)
+    if job["profiling"] is None:
+        metrics.record_cache("result", cached)
+    if cached:
+        job["status"] = "done"
+        job["cache_hit"] = True
+        job["started_at"] = job["finished_at"] = time.time()
+        job["compute_seconds"] = 0.0
+        job["audio_seconds"] = wav_duration(output_file)
+        job["future"].set_result(output_file)
+        print(f"⚡ Audio servido desde cache: {job['cache_key'][:12]}")
+
+    with _jobs_lock:
+        leader = None if job["cache_hit"] or job["profiling"] else _inflight.get(job["cache_key"])
+        if leader is None and not job["cache_hit"]:
+            # Solo ocupan sitio en la cola los jobs que se van a sintetizar
+            with _admission_lock:
+                if admission:
+                    _check_admission(job["estimated_seconds"], 1)
+                _queued[job["job_id"]] = job["estimated_seconds"]
+        _jobs[job["job_id"]] = job
+        _prune_jobs()
+        if leader is None and not job["cache_hit"] and not job["profiling"]:
+            _inflight[job["cache_key"]] = job
+    _save_job_state(job)
+
+    if job["cache_hit"] or leader is not None:
+        # Sin síntesis propia: no habrá segmentos que publicar
+        job["segment_queue"] = None
+
+    if leader is not None:
+        # La misma generación ya está en cola: reutilizar su resultado
+        metrics.generation_jobs.labels("deduplicated").inc()
+        leader["future"].add_done_callback(lambda _: _follow_job(job, leader))
+    elif job["cache_hit"]:
+        metrics.generation_jobs.labels("cache_hit").inc()
+    else:
+        start_worker()
+        metrics.job_queued()
+        _job_queue.put(job)
+    return job
+
+async def wait_for_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Esperar a que termine un job sin bloquear el event loop"""
+    try:
+        await asyncio.wrap_future(job["future"])
+    except Exception:
+        # El error queda registrado en el propio job
+        pass
+    return job
+
+async def iter_segment_audio(job: Dict[str, Any]):
+    """
+    Recibir el audio de cada segmento de un job en streaming, en orden
+
+    Termina cuando el job se completa; si falla, lanza su error. Los jobs sin
+    cola de segmentos (acierto de cache o duplicados) no publican nada: hay que
+    esperar a su archivo final.
+
+    Yields:
+        np.ndarray: Audio (float) de cada segmento
+    """
+    segment_queue = job["segment_queue"]
+    if segment_queue is None:
+        return
+    while True:
+        item = await segment_queue.get()
+        if item is None:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Buscar un job por su id"""
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def lookup_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Estado público de un job: el de este proceso o, si lo creó otro worker, el guardado en disco"""
+    job = get_job(job_id)
+    if job is not None:
+        return job_status(job)
+    try:
+        with open(_job_state_path(job_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def drain(timeout: float) -> bool:
+    """
+    Esperar a que terminen los jobs en cola o en curso (apagado ordenado)
+
+    Returns:
+        bool: True si la cola quedó vacía antes del timeout
+    """
+    deadline = time.monotonic() + timeout
+    pending = _job_queue.unfinished_tasks
+    if pending:
+        print(f"⏳ Esperando a {pending} jobs pendientes antes de apagar...")
+    while _job_queue.unfinished_tasks:
+        if time.monotonic() >= deadline:
+            print(f"⚠️ Apagando con {_job_queue.unfinished_tasks} jobs sin terminar")
+            return False
+        time.sleep(0.1)
+    return True
+
+def job_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Representación pública (serializable a JSON) del estado de un job"""
+    status = {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "file_id": job["file_id"],
+        "voice": job["voice"],
+        "segments": len(job["segments"]),
+        "audio_seconds": job["audio_seconds"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "compute_seconds": job["compute_seconds"],
+        "error": job["error"],
+        "cache_hit": job["cache_hit"],
+        "phrases_reused": job["phrases_reused"],
+    }
+    if job["status"] == "queued":
+        status.update(queue_position(job["job_id"]))
+    if job["profiling"] is not None:
+        status["profiling"] = job["profiling"]
+    status.update(job["metadata"])
+    return status
+
+def queue_position(job_id: str) -> Dict[str, Any]:
+    """
+    Posición de un job en la cola (1 = el siguiente) y espera estimada hasta que empiece
+
+    Vacío si el job ya no está en cola.
+    """
+    with _admission_lock:
+        if job_id not in _queued:
+            return {}
+        wait = _running_remaining()
+        for position, (queued_id, cost) in enumerate(_queued.items(), start=1):
+            if queued_id == job_id:
+                return {"queue_position": position, "estimated_wait_seconds": round(wait, 1)}
+            wait += cost
+    return {}
+
+def _check_admission(cost: float, jobs: int):
+    """
+    Rechazar si `jobs` jobs más con coste total `cost` no caben (llamar con _admission_lock tomado)
+
+    Con la cola vacía siempre se admite: un texto muy largo por sí solo no
+    debe quedar rechazado para siempre.
+    """
+    if not _queued:
+        return
+    queued_seconds = sum(_queued.values())
+    excess_jobs = len(_queued) + jobs - QUEUE_MAX_JOBS if QUEUE_MAX_JOBS > 0 else 0
+    excess_seconds = queued_seconds + cost - QUEUE_MAX_SECONDS if QUEUE_MAX_SECONDS > 0 else 0
+    if excess_jobs <= 0 and excess_seconds <= 0:
+        return
+
+    # Cuándo habrán salido de la cola suficientes jobs (el worker los empieza en orden)
+    wait = _running_remaining()
+    started = drained = 0
+    for queued_cost in _queued.values():
+        if started >= excess_jobs and drained >= excess_seconds:
+            break
+        wait += queued_cost
+        started += 1
+        drained += queued_cost
+    metrics.generation_jobs.labels("rejected").inc(jobs)
+    raise QueueFull(max(1, math.ceil(wait)), len(_queued), queued_seconds)
+
+def _running_remaining() -> float:
+    """Segundos estimados hasta que terminen los jobs en curso (van juntos en el mismo batch)"""
+    now = time.monotonic()
+    return max((max(0.0, cost - (now - started_at)) for cost, started_at in _running.values()), default=0.0)
+
+def _dequeue(job: Dict[str, Any]):
+    """Pasar un job de la cola a los que se están ejecutando (control de admisión)"""
+    with _admission_lock:
+        _queued.pop(job["job_id"], None)
+        _running[job["job_id"]] = (job["estimated_seconds"], time.monotonic())
+
+def _follow_job(job: Dict[str, Any], leader: Dict[str, Any]):
+    """Completar un job duplicado con el resultado del job que sí se generó"""
+    job["started_at"] = leader["started_at"]
+    job["finished_at"] = time.time()
+    job["compute_seconds"] = 0.0
+    job["audio_seconds"] = leader["audio_seconds"]
+    error = None if leader["status"] == "done" else RuntimeError(leader["error"])
+    if error is None:
+        try:
+            if not result_cache.fetch(job["cache_key"], job["output_file"]):
+                # Cache desactivado (o entrada ya expulsada): copiar el WAV del otro job
+                shutil.copyfile(leader["output_file"], job["output_file"])
+        except Exception as e:
+            # Se ejecuta como callback de un future: una excepción aquí se perdería
+            print(f"❌ No se pudo copiar el audio del job {leader['job_id']}: {str(e)}")
+            error = e
+    if error is not None:
+        job["status"] = "error"
+        job["error"] = str(error)
+        _save_job_state(job)
+        job["future"].set_exception(error)
+        return
+    job["status"] = "done"
+    job["cache_hit"] = True
+    _save_job_state(job)
+    job["future"].set_result(job["output_file"])
+
+def _job_state_path(job_id: str) -> str:
+    return os.path.join(JOB_STATE_DIR, f"{job_id}.json")
+
+def _save_job_state(job: Dict[str, Any]):
+    """Guardar el estado público del job en disco (escritura atómica)"""
+    path = _job_state_path(job["job_id"])
+    try:
+        os.makedirs(JOB_STATE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job_status(job), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar el estado del job {job['job_id']}: {e}")
+
+def _worker_loop():
+    """Bucle del hilo de inferencia: junta jobs en micro-batches y los ejecuta"""
+    while True:
+        batch = _collect_batch()
+        try:
+            _run_batch(batch)
+        except Exception as e:
+            # Un error inesperado no puede matar el único hilo de inferencia: los jobs
+            # del batch que sigan abiertos fallan (y sus peticiones reciben el error)
+            print(f"❌ Error inesperado en el worker de inferencia: {str(e)}")
+            for job in batch:
+                if job["status"] == "queued":
+                    job["started_at"] = time.time()
+                    metrics.job_started()
+                    _dequeue(job)
+                if job["status"] in ("queued", "running"):
+                    _finish_job(job, error=e)
+        finally:
+            for _ in batch:
+                _job_queue.task_done()
+
+def _collect_batch() -> List[Dict[str, Any]]:
+    """Esperar el primer job y juntar los que lleguen dentro de la ventana de batching"""
+    batch = [_job_queue.get()]
+    deadline = time.monotonic() + BATCH_MAX_WAIT_MS / 1000
+    while len(batch) < BATCH_MAX_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_job_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+def _batch_key(job: Dict[str, Any]) -> tuple:
+    """Parámetros que deben coincidir para sintetizar segmentos en el mismo batch (mismos modelos)"""
+    params = job["params"]
+    return (params["profile"], params["small_models"], params["use_kv_caching"])
+
+def _run_batch(batch: List[Dict[str, Any]]):
+    """
+    Ejecutar un micro-batch; los jobs con semilla se generan solos para ser
+    reproducibles, y los perfilados para que el perfil sea solo suyo
+    """
+    groups: "OrderedDict[tuple, List[Dict[str, Any]]]" = OrderedDict()
+    solo = []
+    for job in batch:
+        if job["params"]["seed"] is None and job["profiling"] is None:
+            groups.setdefault(_batch_key(job), []).append(job)
+        else:
+            solo.append(job)
+
+    for group in groups.values():
+        _run_job_group(group)
+
+    for job in solo:
+        if job["profiling"] is not None:
+            _run_profiled_job(job)
+        else:
+            _run_job(job)
+
+def _run_job_group(jobs: List[Dict[str, Any]]):
+    """Sintetizar los segmentos de varios jobs en batches de hasta BATCH_MAX_SIZE filas"""
+    # El backend (Bark importa torch) se usa en el worker y no al importar la API
+    backend = get_backend()
+    started_at = time.time()
+    group_started_at = time.perf_counter()
+    for job in jobs:
+        job["status"] = "running"
+        job["started_at"] = started_at
+        job["compute_seconds"] = 0.0
+        metrics.job_started()
+        _dequeue(job)
+        _save_job_state(job)
+
+    # Frases del cache y repetidas: cada clave se sintetiza una vez y se reparte
+    # a todos los (job, segmento) que la esperan
+    waiting: "OrderedDict[str, List[tuple]]" = OrderedDict()
+    for job in jobs:
+        for index, key in enumerate(job["phrase_keys"]):
+            audio_array = phrase_cache.get(key)
+            metrics.record_cache("phrase", audio_array is not None)
+            if audio_array is not None:
+                job["segment_audio"][index] = audio_array
+                job["phrases_reused"] += 1
+            else:
+                waiting.setdefault(key, []).append((job, index))
+        _publish_segments(job)
+        if all(audio is not None for audio in job["segment_audio"]):
+            _complete_job(job)
+
+    pending = 0
+    for chunk in _plan_chunks(jobs, waiting):
+        chunk = [(job, index) for job, index in chunk if job["status"] == "running"]
+        if not chunk:
+            continue
+        pending += len(chunk)
+
+        items = [
+            {
+                "text": job["segments"][index],
+                "voice": job["voice"],
+                "text_temp": job["params"]["text_temp"],
+                "waveform_temp": job["params"]["waveform_temp"],
+                "profile": job["params"]["profile"],
+                "small_models": job["params"]["small_models"],
+                "use_kv_caching": job["params"]["use_kv_caching"],
+            }
+            for job, index in chunk
+        ]
+        synthesis_started_at = time.perf_counter()
+        try:
+            if len(items) > 1:
+                audio_batch = backend.synthesize_batch(items)
+            else:
+                audio_batch = [backend.synthesize(**items[0])]
+            metrics.record_synthesis(backend.name, len(items), time.perf_counter() - synthesis_started_at)
+        except Exception as e:
+            # Si falla el batch, generar cada segmento por separado para aislar el error
+            print(f"⚠️ Batch de {len(items)} segmentos falló ({str(e)}), generando uno a uno")
+            audio_batch = [None] * len(items)
+            for position, item in enumerate(items):
+                job = chunk[position][0]
+                if job["status"] != "running":
+                    continue
+                try:
+                    audio_batch[position] = backend.synthesize(**item)
+                except Exception as segment_error:
+                    _finish_job(job, error=segment_error)
+
+        # Cada fila del batch carga con su parte del tiempo (no con todo el grupo)
+        share = (time.perf_counter() - synthesis_started_at) / len(items)
+        for job, _ in chunk:
+            job["compute_seconds"] += share
+
+        for (job, index), audio_array in zip(chunk, audio_batch):
+            if audio_array is None:
+                continue
+            key = job["phrase_keys"][index]
+            phrase_cache.put(key, audio_array)
+            for waiting_job, waiting_index in waiting.pop(key, []):
+                if waiting_job["status"] != "running":
+                    continue
+                waiting_job["segment_audio"][waiting_index] = audio_array
+                if waiting_job is not job or waiting_index != index:
+                    waiting_job["phrases_reused"] += 1
+                _publish_segments(waiting_job)
+                if all(audio is not None for audio in waiting_job["segment_audio"]):
+                    _complete_job(waiting_job)
+
+    # Jobs cuya frase pendiente la sintetizaba otro job que falló
+    for job in jobs:
+        if job["status"] == "running":
+            _finish_job(job, error=RuntimeError("No se pudo sintetizar un segmento repetido"))
+
+    elapsed = max(time.perf_counter() - group_started_at, 1e-9)
+    audio_seconds = sum(job["audio_seconds"] or 0 for job in jobs)
+    print(f"📦 {len(jobs)} jobs ({pending} segmentos sintetizados): {audio_seconds:.1f}s de audio "
+          f"en {elapsed:.1f}s ({audio_seconds / elapsed:.2f} s audio / s)")
+
+def _plan_chunks(jobs: List[Dict[str, Any]], waiting: Dict[str, List[tuple]]) -> List[List[tuple]]:
+    """
+    Repartir las frases pendientes de varios jobs en batches de hasta BATCH_MAX_SIZE filas
+
+    Cada frase pendiente aparece una vez, representada por el (job, segmento)
+    donde sale antes. Se ordenan por posición (primero los segmentos 0, luego los
+    1...) para que los jobs cortos terminen antes. Si hay algún job en
+    streaming, los primeros segmentos van solos en el primer batch: así el audio
+    empieza a salir tras un segmento y no tras todo el texto.
+    """
+    pending = sorted(
+        (min(occurrences, key=lambda item: item[1]) for occurrences in waiting.values()),
+        key=lambda item: item[1],
+    )
+    chunks = []
+    if any(job["segment_queue"] is not None and len(job["segments"]) > 1 for job in jobs):
+        first = min(BATCH_MAX_SIZE, sum(1 for _, index in pending if index == 0))
+        chunks.append(pending[:first])
+        pending = pending[first:]
+    chunks.extend(pending[start:start + BATCH_MAX_SIZE] for start in range(0, len(pending), BATCH_MAX_SIZE))
+    return chunks
+
+def _run_job(job: Dict[str, Any]):
+    """Ejecutar un job de generación por sí solo (segmentos en orden) y resolver su future"""
+    backend = get_backend()
+    job["status"] = "running"
+    job["started_at"] = time.time()
+    metrics.job_started()
+    _dequeue(job)
+    _save_job_state(job)
+    rendered = {}
+    try:
+        for index, text in enumerate(job["segments"]):
+            key = job["phrase_keys"][index]
+            audio_array = rendered.get(key)
+            if audio_array is None and job["profiling"] is None:
+                audio_array = phrase_cache.get(key)
+                metrics.record_cache("phrase", audio_array is not None)
+            if audio_array is not None:
+                job["phrases_reused"] += 1
+            else:
+                synthesis_started_at = time.perf_counter()
+                with profiling.span("synthesize"):
+                    audio_array = backend.synthesize(
+                        text, job["voice"],
+                        text_temp=job["params"]["text_temp"],
+                        waveform_temp=job["params"]["waveform_temp"],
+                        # Misma semilla en cada segmento: una frase repetida suena igual y se puede reutilizar
+                        seed=job["params"]["seed"],
+                        profile=job["params"]["profile"],
+                        small_models=job["params"]["small_models"],
+                        use_kv_caching=job["params"]["use_kv_caching"],
+                    )
+                metrics.record_synthesis(backend.name, 1, time.perf_counter() - synthesis_started_at)
+                phrase_cache.put(key, audio_array)
+            rendered[key] = audio_array
+            job["segment_audio"][index] = audio_array
+            _publish_segments(job)
+        _complete_job(job)
+    except Exception as e:
+        _finish_job(job, error=e)
+
+def _run_profiled_job(job: Dict[str, Any]):
+    """Ejecutar un job bajo el profiler y guardar en su estado dónde descargar el perfil"""
+    mode = profiling.resolve_mode(job["profiling"]["mode"], get_backend().name)
+    profile = profiling.JobProfile(job["job_id"], mode)
+    with profile:
+        _run_job(job)
+    job["profiling"] = profile.info
+    _save_job_state(job)
+
+def _complete_job(job: Dict[str, Any]):
+    """Unir los segmentos de un job, guardar el WAV y marcarlo como terminado"""
+    try:
+        postprocess_started_at = time.perf_counter()
+        with metrics.postprocess("join"):
+            audio_array = join_segments(job["segment_audio"])
+        with metrics.postprocess("wav_write"):
+            job["audio_seconds"] = write_wav_file(audio_array, job["output_file"])
+        if job["compute_seconds"] is not None:
+            job["compute_seconds"] += time.perf_counter() - postprocess_started_at
+        _finish_job(job)
+    except Exception as e:
+        _finish_job(job, error=e)
+
+def _push_segment_item(job: Dict[str, Any], item: Any):
+    """Entregar un elemento a la cola de streaming del job (desde el hilo del worker)"""
+    try:
+        job["segment_loop"].call_soon_threadsafe(job["segment_queue"].put_nowait, item)
+    except RuntimeError:
+        # El event loop del cliente ya se cerró: nadie está escuchando
+        job["segment_queue"] = None
+
+def _publish_segments(job: Dict[str, Any]):
+    """Publicar, en orden, los segmentos terminados de un job en streaming"""
+    while (job["segment_queue"] is not None
+           and job["segments_published"] < len(job["segments"])
+           and job["segment_audio"][job["segments_published"]] is not None):
+        _push_segment_item(job, job["segment_audio"][job["segments_published"]])
+        job["segments_published"] += 1
+
+def _finish_job(job: Dict[str, Any], error: Optional[Exception] = None):
+    """Marcar un job como terminado (o fallido) y resolver su future"""
+    job["finished_at"] = time.time()
+    if job["compute_seconds"] is None:
+        # Job ejecutado solo: todo el tiempo desde que empezó es suyo
+        job["compute_seconds"] = job["finished_at"] - job["started_at"]
+    # Liberar el audio intermedio de los segmentos
+    job["segment_audio"] = [None] * len(job["segments"])
+    try:
+        if error is None:
+            result_cache.store(job["cache_key"], job["output_file"])
+            tiers.record_job_timing(job["metadata"].get("tier"), job["compute_seconds"], job["audio_seconds"])
+            job["status"] = "done"
+            _save_job_state(job)
+            job["future"].set_result(job["output_file"])
+            print(f"✅ Job {job['job_id']} completado en {job['finished_at'] - job['started_at']:.1f}s")
+        else:
+            job["status"] = "error"
+            job["error"] = str(error)
+            _save_job_state(job)
+            job["future"].set_exception(error)
+            print(f"❌ Job {job['job_id']} falló: {str(error)}")
+    finally:
+        metrics.job_finished(job)
+        with _admission_lock:
+            _running.pop(job["job_id"], None)
+        if job["segment_queue"] is not None:
+            # Cerrar el stream: None al terminar bien, la excepción si falló
+            _push_segment_item(job, error)
+        with _jobs_lock:
+            if _inflight.get(job["cache_key"]) is job:
+                del _inflight[job["cache_key"]]
+
+def _prune_jobs():
+    """Olvidar los jobs terminados más antiguos (llamar con _jobs_lock tomado)"""
+    finished = [job_id for job_id, job in _jobs.items() if job["status"] in ("done", "error")]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        if _jobs[job_id]["profiling"] is not None:
+            profiling.remove(job_id)
+        del _jobs[job_id]
+        try:
+            os.remove(_job_state_path(job_id))
+        except OSError:
+            pass
@@ -1,20 +1,47 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
-from fastapi.responses import FileResponse, JSONResponse
-from pydantic import BaseModel
-from .bark_utils import generate_audio  # Funcionalidad Bark
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from starlette.concurrency import iterate_in_threadpool
+from . import batch_analysis  # Análisis de textos en lote en un pool de procesos
+from . import batches  # Lotes de generación (manifiesto y ZIP)
+from . import inference  # Worker de inferencia Bark (fuera del event loop)
+from . import metrics  # Métricas de Prometheus (GET /metrics)
+from . import model_loader  # Carga de modelos en segundo plano (la importación es instantánea)
+from . import profiling  # Perfilado bajo demanda de jobs (X-Bark-Profile, /admin/profiling)
+from . import transcode  # Variantes Opus/MP3/FLAC del WAV
+from .audio_cache import phrase_cache, result_cache
+from .audio_utils import SAMPLE_RATE, SegmentJoiner, to_int16, wav_header
+from .config import (
+    ANALYSIS_BATCH_MAX_ITEMS, AUDIO_DIR, GENERATION_BATCH_MAX_ITEMS, GRACEFUL_TIMEOUT, INFERENCE_PROFILES
+)
+from .segmentation import segment_for_synthesis, split_text
+from .text_analysis import analysis_memo
+from .storage import storage
+from .tiers import DEFAULT_TIER, TIERS, select_tier, tier_info
+from .voices import voice_registry
+import asyncio
+import hashlib
 import os
 import uuid
-from typing import Optional, Any
+from typing import Dict, List, Optional, Any
 
 app = FastAPI(
     title="Bark Text-to-Speech API", 
     version="1.0.0",
     description="API para generar audio usando el modelo Bark de Suno AI"
 )
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 class AudioRequest(BaseModel):
     text: str
     voice: Optional[str] = "v2/es_speaker_0"  # Voz predeterminada
+    seed: Optional[int] = None  # Semilla para resultados reproducibles
+    profile: Optional[str] = None  # Perfil de inferencia: "fp32", "int8" o "bf16" (por defecto el del servidor)
+    tier: Optional[str] = None  # Nivel de calidad: "draft", "standard" o "high" (por defecto "standard")
+    max_latency_ms: Optional[int] = None  # Plazo: se elige el mejor nivel que quepa en él
+    format: Optional[str] = None  # Formato de salida: "wav" (por defecto), "opus", "mp3" o "flac"
+    sample_rate: Optional[int] = None  # Bajar la frecuencia (p. ej. 8000 para telefonía)
     
     class Config:
         schema_extra = {
@@ -31,12 +58,21 @@ class AudioResponse(BaseModel):
     voice_used: str
     detected_type: Optional[str] = None
     analysis_notes: Optional[list] = None
+    cache_hit: Optional[bool] = None
+    tier: Optional[str] = None
+    download_url: Optional[str] = None  # Incluye ?format= si se pidió otro formato
 
 class MusicRequest(BaseModel):
     text: str
     voice: Optional[str] = "v2/es_speaker_0"
     include_music: Optional[bool] = False
     music_style: Optional[str] = "background"  # "background", "melody", "upbeat", "calm"
+    seed: Optional[int] = None
+    profile: Optional[str] = None
+    tier: Optional[str] = None
+    max_latency_ms: Optional[int] = None
+    format: Optional[str] = None
+    sample_rate: Optional[int] = None
     
     class Config:
         schema_extra = {
@@ -55,11 +91,95 @@ class MusicResponse(BaseModel):
     voice_used: str
     music_included: bool
     music_style: str
+    cache_hit: Optional[bool] = None
+    tier: Optional[str] = None
+    download_url: Optional[str] = None
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    file_id: str
+    voice_used: str
+    detected_type: Optional[str] = None
+    status_url: str
+    result_url: str
+    cache_hit: Optional[bool] = None
+    tier: Optional[str] = None
+    queue_position: Optional[int] = None  # 1 = el siguiente en generarse (None si no está en cola)
+    estimated_wait_seconds: Optional[float] = None
+
+class BatchItem(BaseModel):
+    text: str
+    name: Optional[str] = None  # Nombre del archivo dentro del ZIP (p. ej. el título de la canción)
+    voice: Optional[str] = None  # Por defecto, la recomendada para el tipo de texto
+    include_music: Optional[bool] = None  # Por defecto, se auto-detecta
+    music_style: Optional[str] = None  # "background", "melody", "upbeat", "calm" (por defecto, se auto-detecta)
+    seed: Optional[int] = None
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+    # Opciones comunes a todos los elementos
+    profile: Optional[str] = None
+    tier: Optional[str] = None
+    format: Optional[str] = None
+    sample_rate: Optional[int] = None
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "items": [
+                    {"name": "Canción 1", "text": "La la la, canta conmigo\nEsta es una canción feliz"},
+                    {"name": "Poema", "text": "En tus ojos veo el cielo\nen tu sonrisa la luz", "voice": "v2/es_speaker_2"}
+                ],
+                "format": "mp3"
+            }
+        }
+
+class BatchResponse(BaseModel):
+    batch_id: str
+    status: str
+    total: int
+    manifest_url: str
+    zip_url: str
 
-# Directorio para archivos generados
-AUDIO_DIR = "generated_audio"
+class ProfilingRequest(BaseModel):
+    sample_rate: Optional[float] = None  # Fracción de jobs perfilados al azar (0-1); None no la cambia
+    arm: int = 0  # Perfilar los próximos N jobs de este proceso
+    mode: str = "auto"  # "auto", "torch" o "cprofile"
+
+# Directorio para archivos generados (ver config.AUDIO_DIR)
 os.makedirs(AUDIO_DIR, exist_ok=True)
 
+# El audio de un file_id no cambia nunca: clientes y CDNs pueden guardarlo un año
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# ETags ya calculados: (ruta, tamaño, mtime) -> etag
+_etags: Dict[tuple, str] = {}
+MAX_ETAGS = 10000
+
+@app.on_event("startup")
+async def load_voice_prompts():
+    """Cargar en memoria los prompts de todas las voces antes de aceptar peticiones"""
+    voice_registry.load()
+
+@app.on_event("startup")
+async def load_models_in_background():
+    """Empezar a cargar los modelos de Bark sin retrasar el arranque del servidor"""
+    model_loader.start_background_loading()
+
+@app.on_event("startup")
+async def start_storage_sweeper():
+    """Borrar en segundo plano el audio expirado o que no cabe en el presupuesto de espacio"""
+    storage.start_sweeper()
+
+@app.on_event("shutdown")
+async def drain_inference_jobs():
+    """Al apagar, terminar los jobs ya aceptados (p. ej. de POST /jobs) antes de salir"""
+    await asyncio.to_thread(inference.drain, GRACEFUL_TIMEOUT)
+
+@app.on_event("shutdown")
+async def stop_analysis_pool():
+    batch_analysis.shutdown()
+
 @app.get("/")
 async def root():
     """Endpoint de bienvenida con información sobre la API"""
@@ -75,13 +195,30 @@ async def root():
         "endpoints": {
             "POST /generate/": "🧠 Generar audio con IA (descarga directa)",
             "POST /generate-info/": "🧠 Generar audio con IA (información JSON)",
+            "POST /generate-stream/": "📡 Generar audio con IA en streaming (WAV por segmentos)",
+            "WS /ws/generate-stream": "📡 Igual que /generate-stream/ por WebSocket",
             "POST /generate-music/": "🎵 Generar con música personalizable + IA",
             "POST /smart-generate/": "🤖 Generación con IA COMPLETA (recomendado)",
             "POST /paste-text/": "🍃 Pegar texto plano sin problemas de JSON",
             "POST /analyze-text/": "🔍 Solo analizar texto sin generar audio",
-            "GET /download/{file_id}": "📥 Descargar archivo de audio generado",
+            "POST /analyze-text/batch": "🔍 Analizar miles de textos (JSON o NDJSON) con resultados en NDJSON",
+            "POST /jobs": "⏳ Encolar generación con IA y devolver el id del job",
+            "GET /jobs/{job_id}": "⏳ Estado de un job de generación",
+            "GET /jobs/{job_id}/result": "📥 Descargar el audio de un job terminado",
+            "GET /jobs/{job_id}/profile": "🔬 Perfil de un job perfilado (etapas, operadores, memoria)",
+            "GET /jobs/{job_id}/profile/trace": "🔬 Traza Chrome del job perfilado (chrome://tracing, Perfetto)",
+            "POST /generate-batch/": "📚 Generar un lote (álbum, poemario) y devolver su id",
+            "GET /generate-batch/{batch_id}": "📚 Manifiesto del lote: estado, archivo, duración y tiempos de cada elemento",
+            "GET /generate-batch/{batch_id}/zip": "📦 Descargar todos los audios del lote en un ZIP",
+            "GET /download/{file_id}": "📥 Descargar archivo de audio generado (?format=opus|mp3|flac|wav)",
+            "GET /admin/cache": "⚡ Estadísticas del cache de audio",
+            "GET /admin/storage": "🗂️ Uso del almacenamiento de audio generado",
+            "GET|POST /admin/profiling": "🔬 Muestreo de perfiles y perfilar los próximos jobs",
+            "GET /metrics": "📈 Métricas de Prometheus (latencias, etapas de Bark, RTF, colas)",
             "GET /health": "💚 Estado de salud de la API",
+            "GET /ready": "🚦 Estado de carga de los modelos (200 cuando están listos)",
             "GET /voices": "🗣️ Lista de voces disponibles",
+            "GET /tiers": "🎚️ Niveles de calidad (draft, standard, high)",
             "GET /music-examples": "🎵 Ejemplos de generación de música"
         },
         "tips_for_swagger": {
@@ -94,43 +231,35 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Verificar el estado de la API"""
+    """
+    Liveness: la API responde (no depende de que los modelos estén cargados)
+    
+    Para saber si ya se puede generar audio sin esperar a la carga, usa /ready.
+    """
     return {
         "status": "healthy",
         "service": "bark-api",
-        "message": "API funcionando correctamente"
+        "message": "API funcionando correctamente",
+        "models_ready": model_loader.is_ready(),
+        "generation_queue": inference.queue_stats()
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness: estado de carga de cada etapa de Bark y tiempo de la inferencia de calentamiento
+    
+    Devuelve 200 cuando los modelos están cargados y 503 mientras tanto.
+    """
+    state = model_loader.readiness()
+    return JSONResponse(content=state, status_code=200 if state["ready"] else 503)
+
 @app.get("/voices")
 async def list_voices():
-    """Lista de voces disponibles en Bark"""
-    voices = {
-        "english": [
-            "v2/en_speaker_0", "v2/en_speaker_1", "v2/en_speaker_2", 
-            "v2/en_speaker_3", "v2/en_speaker_4", "v2/en_speaker_5",
-            "v2/en_speaker_6", "v2/en_speaker_7", "v2/en_speaker_8", "v2/en_speaker_9"
-        ],
-        "spanish": [
-            "v2/es_speaker_0", "v2/es_speaker_1", "v2/es_speaker_2",
-            "v2/es_speaker_3", "v2/es_speaker_4", "v2/es_speaker_5",
-            "v2/es_speaker_6", "v2/es_speaker_7", "v2/es_speaker_8", "v2/es_speaker_9"
-        ],
-        "other_languages": [
-            "v2/zh_speaker_0", "v2/zh_speaker_1", "v2/zh_speaker_2",
-            "v2/fr_speaker_0", "v2/fr_speaker_1", "v2/fr_speaker_2",
-            "v2/de_speaker_0", "v2/de_speaker_1", "v2/de_speaker_2",
-            "v2/hi_speaker_0", "v2/hi_speaker_1", "v2/hi_speaker_2",
-            "v2/it_speaker_0", "v2/it_speaker_1", "v2/it_speaker_2",
-            "v2/ja_speaker_0", "v2/ja_speaker_1", "v2/ja_speaker_2",
-            "v2/ko_speaker_0", "v2/ko_speaker_1", "v2/ko_speaker_2",
-            "v2/pl_speaker_0", "v2/pl_speaker_1", "v2/pl_speaker_2",
-            "v2/pt_speaker_0", "v2/pt_speaker_1", "v2/pt_speaker_2",
-            "v2/ru_speaker_0", "v2/ru_speaker_1", "v2/ru_speaker_2",
-            "v2/tr_speaker_0", "v2/tr_speaker_1", "v2/tr_speaker_2"
-        ]
-    }
+    """Lista de voces disponibles en Bark (descubiertas y cargadas en memoria al iniciar)"""
     return {
-        "voices": voices,
+        "voices": voice_registry.grouped(),
+        "total": len(voice_registry.names()),
         "note": "Usa cualquiera de estas voces en el campo 'voice' de tu petición"
     }
 
@@ -145,15 +274,18 @@ async def generate_speech_file(request: AudioRequest):
     🧠 INCLUYE DETECCIÓN AUTOMÁTICA: El sistema detecta si es poema, canción o narrativa
     y optimiza automáticamente el procesamiento para mejor calidad de audio.
     """
-    file_id, audio_path, analysis_info = await _generate_audio_internal(request, use_smart_processing=True)
+    file_id, audio_path, analysis_info, job = await _generate_audio_internal(request, use_smart_processing=True)
+    output_format = request.format or "wav"
+    audio_path = await _audio_variant(file_id, audio_path, output_format, request.sample_rate)
     
     # Añadir información del análisis al nombre del archivo
     text_type = analysis_info["type"] if analysis_info else "text"
     
     return FileResponse(
         audio_path, 
-        media_type="audio/wav",
-        filename=f"bark_{text_type}_{file_id}.wav"
+        media_type=transcode.media_type(output_format),
+        filename=f"bark_{text_type}_{file_id}.{transcode.extension(output_format)}",
+        headers={"X-Cache": "HIT" if job["cache_hit"] else "MISS", "X-Tier": job["metadata"]["tier"]}
     )
 
 @app.post("/generate-info/", response_model=AudioResponse)
@@ -167,7 +299,7 @@ async def generate_speech_info(request: AudioRequest):
     🧠 INCLUYE DETECCIÓN AUTOMÁTICA: Analiza tu texto y aplica la mejor configuración.
     Devuelve información sobre el archivo generado y el análisis realizado.
     """
-    file_id, audio_path, analysis_info = await _generate_audio_internal(request, use_smart_processing=True)
+    file_id, audio_path, analysis_info, job = await _generate_audio_internal(request, use_smart_processing=True)
     
     text_type = analysis_info["type"] if analysis_info else "text"
     analysis_notes = analysis_info["processing_notes"] if analysis_info else []
@@ -175,28 +307,217 @@ async def generate_speech_info(request: AudioRequest):
     return AudioResponse(
         message=f"Audio generado con detección automática - Tipo detectado: {text_type}",
         file_id=file_id,
-        filename=f"bark_{text_type}_{file_id}.wav",
+        filename=f"bark_{text_type}_{file_id}.{transcode.extension(request.format or 'wav')}",
         voice_used=request.voice,
         detected_type=text_type,
-        analysis_notes=analysis_notes
+        analysis_notes=analysis_notes,
+        cache_hit=job["cache_hit"],
+        tier=job["metadata"]["tier"],
+        download_url=_download_url(file_id, request)
     )
 
-@app.get("/download/{file_id}", response_class=FileResponse)
-async def download_audio(file_id: str):
+@app.api_route("/download/{file_id}", methods=["GET", "HEAD"], response_class=FileResponse)
+async def download_audio(file_id: str, request: Request,
+                         output_format: Optional[str] = Query(None, alias="format"),
+                         sample_rate: Optional[int] = None):
     """
     Descargar un archivo de audio generado previamente
+    
+    - **format**: "wav", "opus", "mp3" o "flac" (si no se indica, según la cabecera Accept)
+    - **sample_rate**: Bajar la frecuencia (8000, 12000 o 16000; por defecto 24000)
+    
+    Las variantes comprimidas se codifican la primera vez que se piden y se guardan
+    junto al WAV para las siguientes descargas.
+    
+    📦 Cacheable: ETag fuerte, Cache-Control inmutable, If-None-Match (304),
+    peticiones Range (206) para reproductores que saltan o reanudan, y HEAD.
     """
-    audio_path = os.path.join(AUDIO_DIR, f"{file_id}.wav")
+    # locate actualiza el último acceso en SQLite: fuera del event loop
+    audio_path = await asyncio.to_thread(storage.locate, file_id)
     
-    if not os.path.exists(audio_path):
+    if audio_path is None:
         raise HTTPException(status_code=404, detail="Archivo de audio no encontrado")
     
-    return FileResponse(
+    _validate_output(output_format, sample_rate)
+    output_format = output_format or transcode.negotiate(request.headers.get("accept"))
+    audio_path = await _audio_variant(file_id, audio_path, output_format, sample_rate)
+    
+    return await _immutable_file_response(
+        request,
         audio_path,
-        media_type="audio/wav", 
-        filename=f"bark_audio_{file_id}.wav"
+        media_type=transcode.media_type(output_format), 
+        filename=f"bark_audio_{file_id}.{transcode.extension(output_format)}",
+        headers={"Vary": "Accept"}
+    )
+
+async def _immutable_file_response(request: Request, path: str, media_type: str, filename: str,
+                                   headers: Optional[dict] = None) -> Response:
+    """
+    Responder con un archivo que no cambia: ETag fuerte, cache inmutable y 304
+    
+    FileResponse (Starlette) atiende además Range/If-Range con 206, HEAD sin
+    cuerpo y, si el servidor ASGI ofrece la extensión pathsend, envía el archivo
+    con sendfile sin copiarlo.
+    """
+    stat_result = await asyncio.to_thread(os.stat, path)
+    etag = await asyncio.to_thread(_file_etag, path, stat_result)
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    return FileResponse(path, media_type=media_type, filename=filename, headers=headers, stat_result=stat_result)
+
+def _file_etag(path: str, stat_result: os.stat_result) -> str:
+    """ETag fuerte: hash del contenido (calculado una vez por ruta, tamaño y mtime)"""
+    key = (path, stat_result.st_size, stat_result.st_mtime_ns)
+    etag = _etags.get(key)
+    if etag is None:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        etag = f'"{digest.hexdigest()[:32]}"'
+        if len(_etags) >= MAX_ETAGS:
+            _etags.clear()
+        _etags[key] = etag
+    return etag
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparar If-None-Match con un ETag (comparación débil, como pide la RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+@app.post("/generate-stream/")
+async def generate_speech_stream(request: AudioRequest):
+    """
+    Generar audio con detección inteligente y recibirlo en streaming
+    
+    - **text**: El texto que quieres convertir a audio (poemas, canciones, etc.)
+    - **voice**: La voz a usar (opcional, por defecto v2/es_speaker_0)
+    
+    📡 Devuelve una cabecera WAV y después el PCM de cada segmento en cuanto se
+    sintetiza, así que se puede empezar a reproducir tras el primer segmento.
+    El archivo completo se guarda igualmente y queda disponible en
+    /download/{file_id} (ver cabecera X-File-Id).
+    """
+    job, analysis_info = _submit_generation(request, use_smart_processing=True, stream=True)
+    text_type = analysis_info["type"] if analysis_info else "text"
+    
+    return StreamingResponse(
+        _stream_job_audio(job),
+        media_type="audio/wav",
+        headers={
+            "Content-Disposition": f'inline; filename="bark_{text_type}_{job["file_id"]}.wav"',
+            "X-File-Id": job["file_id"],
+            "X-Job-Id": job["job_id"],
+            "X-Cache": "HIT" if job["cache_hit"] else "MISS",
+            "X-Tier": job["metadata"]["tier"],
+            **_queue_headers(job),
+        }
     )
 
+@app.websocket("/ws/generate-stream")
+async def generate_speech_stream_ws(websocket: WebSocket):
+    """
+    Variante WebSocket de /generate-stream/
+    
+    El cliente envía un JSON como el de /generate/; el servidor responde con un
+    mensaje JSON {"type": "job", ...}, después mensajes binarios (cabecera WAV y
+    PCM de cada segmento) y por último {"type": "done", ...} o {"type": "error", ...}.
+    """
+    await websocket.accept()
+    try:
+        payload = await websocket.receive_json()
+        if not isinstance(payload, dict):
+            raise ValueError("El mensaje debe ser un objeto JSON con los campos de la petición")
+        request = AudioRequest(**payload)
+        job, analysis_info = _submit_generation(request, use_smart_processing=True, stream=True)
+    except (ValidationError, HTTPException, ValueError) as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        await websocket.send_json({"type": "error", "detail": detail})
+        await websocket.close()
+        return
+    
+    await websocket.send_json({
+        "type": "job",
+        "job_id": job["job_id"],
+        "file_id": job["file_id"],
+        "detected_type": analysis_info["type"] if analysis_info else "text",
+        "segments": len(job["segments"]),
+        "cache_hit": job["cache_hit"],
+        "tier": job["metadata"]["tier"],
+        **inference.queue_position(job["job_id"]),
+    })
+    try:
+        async for chunk in _stream_job_audio(job):
+            await websocket.send_bytes(chunk)
+        await inference.wait_for_job(job)
+        if job["status"] == "done":
+            await websocket.send_json({
+                "type": "done",
+                "audio_seconds": job["audio_seconds"],
+                "download_url": f"/download/{job['file_id']}",
+            })
+        else:
+            await websocket.send_json({"type": "error", "detail": job["error"]})
+        await websocket.close()
+    except WebSocketDisconnect:
+        # El cliente se fue: el job sigue y el archivo se guarda igualmente
+        print(f"📡 Cliente desconectado del stream del job {job['job_id']}")
+
+def _queue_headers(job: dict) -> Dict[str, str]:
+    """Cabeceras con la posición del job en la cola (vacías si no está en cola)"""
+    position = inference.queue_position(job["job_id"])
+    if not position:
+        return {}
+    return {
+        "X-Queue-Position": str(position["queue_position"]),
+        "X-Estimated-Wait-Seconds": str(position["estimated_wait_seconds"]),
+    }
+
+async def _stream_job_audio(job: dict):
+    """
+    Emitir el audio de un job como WAV: cabecera y PCM de cada segmento al terminarlo
+    
+    Los segmentos se unen igual que en el archivo final (fundidos y silencios).
+    Si el job no sintetiza nada propio (acierto de cache o petición duplicada)
+    se emite el archivo final cuando esté listo.
+    """
+    if job["segment_queue"] is None:
+        await inference.wait_for_job(job)
+        if job["status"] != "done":
+            print(f"❌ Stream del job {job['job_id']} sin audio: {job['error']}")
+            return
+        async for chunk in iterate_in_threadpool(_iter_file(job["output_file"])):
+            yield chunk
+        return
+    
+    yield wav_header(SAMPLE_RATE)
+    joiner = SegmentJoiner()
+    try:
+        async for segment_audio in inference.iter_segment_audio(job):
+            for part in joiner.add(segment_audio):
+                yield to_int16(part).tobytes()
+    except Exception as e:
+        # La respuesta ya empezó: solo se puede cortar el stream
+        print(f"❌ Stream del job {job['job_id']} interrumpido: {str(e)}")
+        return
+    for part in joiner.finish():
+        yield to_int16(part).tobytes()
+
+def _iter_file(path: str, chunk_size: int = 64 * 1024):
+    """Leer un archivo por trozos"""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
 @app.post("/generate-music/", response_model=MusicResponse)
 async def generate_music(request: MusicRequest):
     """
@@ -216,8 +537,7 @@ async def generate_music(request: MusicRequest):
             raise HTTPException(status_code=400, detail="El texto no puede estar vacío")
         
         # Usar detección inteligente para mejorar configuración automática
-        from . import smart_text_processing
-        analysis_result = smart_text_processing(request.text)
+        analysis_result = analysis_memo.analyze(request.text)
         analysis = analysis_result["analysis"]
         auto_recommendations = analysis_result["recommendations"]
         
@@ -228,22 +548,31 @@ async def generate_music(request: MusicRequest):
         
         print(f"🧠 Análisis musical: {analysis['type']} → música: {include_music}, estilo: {music_style}")
         
-        # Preparar el texto con tokens musicales
-        music_text = _prepare_music_text(request.text, include_music, music_style)
+        # Dividir según la estrategia recomendada y preparar cada trozo con tokens musicales
+        tier_settings = _resolve_tier(request)
+        segments = _prepare_music_segments(
+            split_text(request.text, auto_recommendations["split_strategy"], tier_settings["segment_max_chars"]),
+            include_music, music_style
+        )
         
         # Crear una versión modificada del request
-        audio_request = AudioRequest(text=music_text, voice=optimal_voice)
+        audio_request = _derived_request(request, segments, optimal_voice)
         
         # Generar el audio (sin procesamiento inteligente adicional ya que ya se aplicó)
-        file_id, audio_path, _ = await _generate_audio_internal(audio_request, use_smart_processing=False)
+        file_id, audio_path, _, job = await _generate_audio_internal(
+            audio_request, use_smart_processing=False, segments=segments, analysis_result=analysis_result
+        )
         
         return MusicResponse(
             message=f"Audio con música generado - Tipo detectado: {analysis['type']}",
             file_id=file_id,
-            filename=f"bark_music_{analysis['type']}_{file_id}.wav",
+            filename=f"bark_music_{analysis['type']}_{file_id}.{transcode.extension(audio_request.format or 'wav')}",
             voice_used=optimal_voice,
             music_included=include_music,
-            music_style=music_style
+            music_style=music_style,
+            cache_hit=job["cache_hit"],
+            tier=job["metadata"]["tier"],
+            download_url=_download_url(file_id, audio_request)
         )
         
     except HTTPException:
@@ -329,37 +658,25 @@ async def smart_generate(request: AudioRequest):
             raise HTTPException(status_code=400, detail="El texto no puede estar vacío")
         
         # Análisis inteligente completo del texto
-        from . import smart_text_processing
-        analysis_result = smart_text_processing(request.text)
-        
-        analysis = analysis_result["analysis"]
-        recommendations = analysis_result["recommendations"]
-        processed_text = analysis_result["processed_text"]
-        
-        print(f"🧠 Análisis inteligente completo:")
-        print(f"   Tipo detectado: {analysis['type']}")
-        print(f"   Líneas: {analysis['line_count']}")
-        print(f"   Recomendaciones: voz={recommendations['voice']}, música={recommendations['include_music']}")
-        
-        # Usar las recomendaciones automáticas o la voz especificada
-        optimal_voice = request.voice if request.voice != "v2/es_speaker_0" else recommendations["voice"]
-        
-        # Preparar texto con música si es recomendado
-        final_text = processed_text
-        if recommendations["include_music"]:
-            final_text = _prepare_music_text(processed_text, True, recommendations["music_style"])
+        analysis_result = analysis_memo.analyze(request.text)
+        segments, optimal_voice, analysis, recommendations = _plan_smart_generation(request, analysis_result)
         
         # Generar el audio con configuración optimizada (sin procesamiento adicional)
-        audio_request = AudioRequest(text=final_text, voice=optimal_voice)
-        file_id, audio_path, _ = await _generate_audio_internal(audio_request, use_smart_processing=False)
+        audio_request = _derived_request(request, segments, optimal_voice)
+        file_id, audio_path, _, job = await _generate_audio_internal(
+            audio_request, use_smart_processing=False, segments=segments, analysis_result=analysis_result
+        )
         
         return MusicResponse(
             message=f"Audio generado con IA completa - Tipo: {analysis['type']}",
             file_id=file_id,
-            filename=f"bark_smart_{analysis['type']}_{file_id}.wav",
+            filename=f"bark_smart_{analysis['type']}_{file_id}.{transcode.extension(audio_request.format or 'wav')}",
             voice_used=optimal_voice,
             music_included=recommendations["include_music"],
-            music_style=recommendations["music_style"]
+            music_style=recommendations["music_style"],
+            cache_hit=job["cache_hit"],
+            tier=job["metadata"]["tier"],
+            download_url=_download_url(file_id, audio_request)
         )
         
     except HTTPException:
@@ -381,8 +698,7 @@ async def analyze_text(request: AudioRequest):
         if not request.text.strip():
             raise HTTPException(status_code=400, detail="El texto no puede estar vacío")
         
-        from . import smart_text_processing
-        analysis_result = smart_text_processing(request.text)
+        analysis_result = analysis_memo.analyze(request.text)
         
         return {
             "original_text": request.text,
@@ -401,6 +717,36 @@ async def analyze_text(request: AudioRequest):
         print(f"❌ Error en análisis: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
+@app.post("/analyze-text/batch")
+async def analyze_text_batch(request: Request):
+    """
+    Analizar muchos textos de una vez (p. ej. un catálogo de letras) sin generar audio
+    
+    Acepta un array JSON de textos (o de objetos con "text"), `{"texts": [...]}`
+    o NDJSON (`Content-Type: application/x-ndjson`) con un texto por línea.
+    
+    Devuelve NDJSON en el orden de entrada: una línea por texto con `index`,
+    `analysis`, `recommendations` y `processed_text` (o `error`), y una última
+    línea `{"summary": ...}` con el recuento por tipo. Los textos se reparten
+    en trozos entre varios procesos, así que escala con los núcleos.
+    """
+    body = await request.body()
+    try:
+        texts = await asyncio.to_thread(batch_analysis.parse_texts, body, request.headers.get("content-type"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not texts:
+        raise HTTPException(status_code=400, detail="El lote no contiene textos")
+    if len(texts) > ANALYSIS_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Demasiados textos en el lote: {len(texts)} (máximo {ANALYSIS_BATCH_MAX_ITEMS})"
+        )
+    
+    print(f"🔍 Analizando lote de {len(texts)} textos")
+    return StreamingResponse(batch_analysis.stream_analysis(texts), media_type="application/x-ndjson")
+
 def _prepare_music_text(text: str, include_music: bool, music_style: str) -> str:
     """Preparar texto con tokens musicales avanzados para Bark"""
     
@@ -451,47 +797,224 @@ def _prepare_music_text(text: str, include_music: bool, music_style: str) -> str
         # Para música suave
         return f"[soft music] {clean_text}"
         
-async def _generate_audio_internal(request: AudioRequest, use_smart_processing: bool = True):
-    """Función interna para generar audio (reutilizable) con procesamiento inteligente"""
+def _prepare_music_segments(segments: list, include_music: bool, music_style: str) -> list:
+    """Aplicar _prepare_music_text a cada segmento de texto"""
+    return [_prepare_music_text(segment, include_music, music_style) for segment in segments]
+
+def _derived_request(request, segments: list, voice: str) -> AudioRequest:
+    """Petición con el texto ya preparado que conserva las opciones de generación de la original"""
+    return AudioRequest(
+        text="\n".join(segments), voice=voice, seed=request.seed, profile=request.profile,
+        tier=request.tier, format=request.format, sample_rate=request.sample_rate
+    )
+
+def _validate_output(output_format: Optional[str], sample_rate: Optional[int]):
+    """Rechazar con 400 formatos o frecuencias de salida no soportados"""
     try:
-        # Validar que el texto no esté vacío
-        if not request.text.strip():
-            raise HTTPException(status_code=400, detail="El texto no puede estar vacío")
-        
-        processed_text = request.text
-        analysis_info = None
-        
-        # Aplicar procesamiento inteligente si está habilitado
-        if use_smart_processing:
-            from . import smart_text_processing
-            analysis_result = smart_text_processing(request.text)
-            processed_text = analysis_result["processed_text"]
-            analysis_info = analysis_result["analysis"]
-            
-            print(f"🧠 Detección automática: {analysis_info['type']} ({analysis_info['line_count']} líneas)")
-            for note in analysis_info['processing_notes']:
-                print(f"   📝 {note}")
-        
-        # Limpiar y normalizar el texto procesado
-        clean_text = processed_text.strip()
-        # Reemplazar múltiples saltos de línea por uno solo (solo si no es procesamiento inteligente)
-        if not use_smart_processing:
-            clean_text = '\n'.join(line.strip() for line in clean_text.split('\n') if line.strip())
+        transcode.validate(output_format, sample_rate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def _audio_variant(file_id: str, audio_path: str, output_format: str,
+                         sample_rate: Optional[int] = None) -> str:
+    """Ruta del audio en el formato pedido, esperando (sin bloquear) a que se codifique"""
+    return await asyncio.wrap_future(_encode_variant(file_id, audio_path, output_format, sample_rate))
+
+def _encode_variant(file_id: str, audio_path: str, output_format: str, sample_rate: Optional[int] = None):
+    """Codificar una variante y contar su tamaño en el almacenamiento del file_id"""
+    future = transcode.ensure_variant(audio_path, output_format, sample_rate)
+    if not future.done():
+        future.add_done_callback(lambda _: storage.register(file_id))
+    return future
+
+def _download_url(file_id: str, request) -> str:
+    """URL de descarga con el formato y la frecuencia de la petición"""
+    return _variant_url(file_id, request.format, request.sample_rate)
+
+def _variant_url(file_id: str, output_format: Optional[str], sample_rate: Optional[int]) -> str:
+    params = []
+    if output_format not in (None, "wav"):
+        params.append(f"format={output_format}")
+    if sample_rate is not None:
+        params.append(f"sample_rate={sample_rate}")
+    return f"/download/{file_id}" + (f"?{'&'.join(params)}" if params else "")
+
+def _resolve_tier(request):
+    """
+    Fijar el nivel de calidad de una petición y devolver su configuración
+    
+    Con max_latency_ms se elige el mejor nivel (hasta el pedido) cuya latencia
+    estimada cabe en el plazo. El nivel elegido queda en request.tier para que
+    las peticiones derivadas usen el mismo.
+    """
+    try:
+        request.tier = select_tier(request.tier, request.max_latency_ms, request.text)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    request.max_latency_ms = None
+    return TIERS[request.tier]
+
+def _check_queue(text: str, tier: Optional[str] = None, jobs: int = 1):
+    """Responder 429 con Retry-After si la cola de generación no admite este trabajo"""
+    try:
+        inference.check_admission(inference.estimate_cost(text, tier if tier in TIERS else None), jobs)
+    except inference.QueueFull as e:
+        raise _queue_full_error(e)
+
+def _queue_full_error(error: "inference.QueueFull") -> HTTPException:
+    print(f"🚦 Generación rechazada: {str(error)}")
+    return HTTPException(status_code=429, detail=str(error), headers={"Retry-After": str(error.retry_after)})
+
+def _plan_smart_generation(request: AudioRequest, analysis_result: Optional[dict] = None):
+    """
+    Aplicar el análisis inteligente completo y decidir segmentos de texto final y voz
+    
+    Si el endpoint ya analizó el texto, se reutiliza su resultado.
+    """
+    if analysis_result is None:
+        analysis_result = analysis_memo.analyze(request.text)
+    
+    analysis = analysis_result["analysis"]
+    recommendations = analysis_result["recommendations"]
+    
+    print(f"🧠 Análisis inteligente completo:")
+    print(f"   Tipo detectado: {analysis['type']}")
+    print(f"   Líneas: {analysis['line_count']}")
+    print(f"   Recomendaciones: voz={recommendations['voice']}, música={recommendations['include_music']}")
+    
+    # Usar las recomendaciones automáticas o la voz especificada
+    optimal_voice = request.voice if request.voice != "v2/es_speaker_0" else recommendations["voice"]
+    
+    # Dividir según la estrategia recomendada (estrofas, líneas o todo junto)
+    tier_settings = _resolve_tier(request)
+    segments = segment_for_synthesis(
+        request.text, analysis, recommendations["split_strategy"], tier_settings["segment_max_chars"]
+    )
+    print(f"   Segmentos: {len(segments)} ({recommendations['split_strategy']})")
+    
+    # Preparar texto con música si es recomendado
+    segments = _prepare_music_segments(segments, recommendations["include_music"], recommendations["music_style"])
+    
+    return segments, optimal_voice, analysis, recommendations
+
+def _submit_generation(request: AudioRequest, use_smart_processing: bool = True,
+                       metadata: Optional[dict] = None, segments: Optional[list] = None,
+                       stream: bool = False, analysis_result: Optional[dict] = None,
+                       admission: bool = True):
+    """
+    Preparar el texto y encolar su generación en el worker de inferencia (no espera)
+    
+    Si no se pasan segmentos ya preparados, el texto se divide según la estrategia
+    recomendada (con procesamiento inteligente) o se genera en un solo trozo.
+    El análisis ya hecho por el endpoint (analysis_result) no se repite.
+    Con la cola llena responde 429 con Retry-After. La admisión se comprueba una
+    sola vez, al encolar (inference.submit_job), con el mismo estado de la cola
+    que da el Retry-After; admission=False si ya se comprobó, como en los lotes.
+    """
+    # Validar que el texto no esté vacío
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="El texto no puede estar vacío")
+    
+    # Rechazar voces desconocidas antes de encolar trabajo para los modelos
+    if request.voice is not None and request.voice not in voice_registry:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Voz desconocida: {request.voice}. Consulta GET /voices"
+        )
+    
+    if request.profile is not None and request.profile not in INFERENCE_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Perfil de inferencia desconocido: {request.profile}. Opciones: {', '.join(INFERENCE_PROFILES)}"
+        )
+    
+    _validate_output(request.format, request.sample_rate)
+    if stream and (request.format not in (None, "wav") or request.sample_rate is not None):
+        raise HTTPException(
+            status_code=400,
+            detail="El streaming siempre emite WAV: descarga otros formatos con /download/{file_id}?format="
+        )
+    
+    tier_settings = _resolve_tier(request)
+    analysis_info = analysis_result["analysis"] if analysis_result is not None else None
+    
+    # Aplicar procesamiento inteligente si está habilitado
+    if use_smart_processing:
+        if analysis_result is None:
+            analysis_result = analysis_memo.analyze(request.text)
+        analysis_info = analysis_result["analysis"]
+        segments = segment_for_synthesis(
+            request.text, analysis_info, analysis_result["recommendations"]["split_strategy"],
+            tier_settings["segment_max_chars"]
+        )
         
-        # Generar un ID único para el archivo
-        file_id = str(uuid.uuid4())
-        output_file = os.path.join(AUDIO_DIR, f"{file_id}.wav")
+        print(f"🧠 Detección automática: {analysis_info['type']} ({analysis_info['line_count']} líneas, {len(segments)} segmentos)")
+        for note in analysis_info['processing_notes']:
+            print(f"   📝 {note}")
+    elif segments is None:
+        segments = [request.text]
+    
+    # Limpiar y normalizar el texto procesado
+    clean_segments = [segment.strip() for segment in segments]
+    # Reemplazar múltiples saltos de línea por uno solo (solo si no es procesamiento inteligente)
+    if not use_smart_processing:
+        clean_segments = [
+            '\n'.join(line.strip() for line in segment.split('\n') if line.strip())
+            for segment in clean_segments
+        ]
+    clean_segments = [segment for segment in clean_segments if segment]
+    
+    # Generar un ID único para el archivo
+    file_id = str(uuid.uuid4())
+    output_file = storage.path_for(file_id)
+    
+    print(f"🎵 Encolando audio para: '{clean_segments[0][:50]}...' con voz: {request.voice} (nivel {request.tier})")
+    
+    params = {key: tier_settings[key] for key in ("text_temp", "waveform_temp", "small_models", "use_kv_caching")}
+    # El perfil pedido manda; si no, el del nivel (o el del servidor)
+    params.update(seed=request.seed, profile=request.profile or tier_settings["profile"])
+    metadata = {**(metadata or {}), "tier": request.tier, "format": request.format or "wav"}
+    if request.sample_rate is not None:
+        metadata["sample_rate"] = request.sample_rate
+    try:
+        job = inference.submit_job(clean_segments, request.voice, output_file, file_id, metadata,
+                                   params=params, stream=stream, profile_mode=profiling.requested_mode(),
+                                   admission=admission)
+    except inference.QueueFull as e:
+        raise _queue_full_error(e)
+    if job["profiling"] is not None:
+        profiling.note_job(job["job_id"])
+    
+    def on_job_done(future):
+        if future.exception() is not None:
+            return
+        storage.register(file_id)
+        if metadata["format"] != "wav" or request.sample_rate is not None:
+            # Codificar la variante pedida en cuanto termine el job, sin esperar a la descarga
+            _encode_variant(file_id, output_file, metadata["format"], request.sample_rate)
+    job["future"].add_done_callback(on_job_done)
+    return job, analysis_info
+
+async def _generate_audio_internal(request: AudioRequest, use_smart_processing: bool = True,
+                                   segments: Optional[list] = None, analysis_result: Optional[dict] = None):
+    """Función interna para generar audio (reutilizable) con procesamiento inteligente"""
+    try:
+        job, analysis_info = _submit_generation(request, use_smart_processing, segments=segments,
+                                                analysis_result=analysis_result)
         
-        print(f"🎵 Generando audio para: '{clean_text[:50]}...' con voz: {request.voice}")
+        # Esperar al worker de inferencia sin bloquear el event loop
+        await inference.wait_for_job(job)
+        if job["status"] != "done":
+            raise HTTPException(status_code=500, detail=f"Error interno: {job['error']}")
         
-        # Generar el audio con el texto procesado
-        audio_path = generate_audio(clean_text, request.voice, output_file)
+        file_id = job["file_id"]
+        audio_path = job["output_file"]
         
         # Verificar que el archivo se creó
         if not os.path.exists(audio_path):
             raise HTTPException(status_code=500, detail="Error al generar el archivo de audio")
         
-        return file_id, audio_path, analysis_info
+        return file_id, audio_path, analysis_info, job
         
     except HTTPException:
         raise
@@ -499,6 +1022,317 @@ async def _generate_audio_internal(request: AudioRequest, use_smart_processing:
         print(f"❌ Error generando audio: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(request: AudioRequest):
+    """
+    Encolar una generación con IA completa y devolver el id del job inmediatamente
+    
+    - **text**: El texto que quieres convertir (poema, canción, narrativa, etc.)
+    - **voice**: La voz a usar (opcional, se auto-detectará la mejor)
+    
+    ⏳ No espera a Bark: consulta GET /jobs/{job_id} y descarga el audio con
+    GET /jobs/{job_id}/result cuando el estado sea "done".
+    """
+    try:
+        if not request.text.strip():
+            raise HTTPException(status_code=400, detail="El texto no puede estar vacío")
+        
+        analysis_result = analysis_memo.analyze(request.text)
+        segments, optimal_voice, analysis, recommendations = _plan_smart_generation(request, analysis_result)
+        
+        audio_request = _derived_request(request, segments, optimal_voice)
+        job, _ = _submit_generation(
+            audio_request,
+            use_smart_processing=False,
+            metadata={"detected_type": analysis["type"]},
+            segments=segments,
+            analysis_result=analysis_result
+        )
+        
+        return JobResponse(
+            job_id=job["job_id"],
+            status=job["status"],
+            file_id=job["file_id"],
+            voice_used=optimal_voice,
+            detected_type=analysis["type"],
+            status_url=f"/jobs/{job['job_id']}",
+            result_url=f"/jobs/{job['job_id']}/result",
+            cache_hit=job["cache_hit"],
+            tier=job["metadata"]["tier"],
+            **inference.queue_position(job["job_id"])
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error encolando job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Consultar el estado de un job de generación"""
+    status = inference.lookup_job(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    
+    return status
+
+@app.get("/jobs/{job_id}/result", response_class=FileResponse)
+async def get_job_result(job_id: str, request: Request):
+    """
+    Descargar el audio de un job terminado
+    
+    Devuelve 202 con el estado si el job todavía está en cola o generándose.
+    """
+    status = inference.lookup_job(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    
+    if status["status"] == "error":
+        raise HTTPException(status_code=500, detail=f"Error interno: {status['error']}")
+    
+    if status["status"] != "done":
+        return JSONResponse(status_code=202, content=status)
+    
+    text_type = status.get("detected_type", "text")
+    output_format = status.get("format", "wav")
+    audio_path = await asyncio.to_thread(storage.locate, status["file_id"])
+    if audio_path is None:
+        raise HTTPException(status_code=410, detail="El audio de este job ya se borró (expiró)")
+    audio_path = await _audio_variant(status["file_id"], audio_path, output_format, status.get("sample_rate"))
+    return await _immutable_file_response(
+        request,
+        audio_path,
+        media_type=transcode.media_type(output_format),
+        filename=f"bark_{text_type}_{status['file_id']}.{transcode.extension(output_format)}"
+    )
+
+@app.get("/jobs/{job_id}/profile")
+async def get_job_profile(job_id: str):
+    """
+    Perfil de un job perfilado: tiempo de cada etapa, operadores con más CPU y pico de memoria
+
+    Devuelve 202 con el estado si el job todavía no ha terminado.
+    """
+    status = inference.lookup_job(job_id)
+    if status is None or "profiling" not in status:
+        raise HTTPException(status_code=404, detail="Job no encontrado o sin perfil")
+    
+    if status["profiling"]["status"] == "error":
+        raise HTTPException(status_code=500, detail=f"Error guardando el perfil: {status['profiling'].get('error')}")
+    
+    if status["profiling"]["status"] != "done":
+        return JSONResponse(status_code=202, content=status)
+    
+    path = profiling.summary_path(job_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="El perfil de este job ya se borró")
+    return FileResponse(path, media_type="application/json")
+
+@app.get("/jobs/{job_id}/profile/trace", response_class=FileResponse)
+async def get_job_profile_trace(job_id: str):
+    """Descargar la traza del job perfilado (JSON comprimido para chrome://tracing o ui.perfetto.dev)"""
+    path = profiling.trace_path(job_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Traza no encontrada (¿job sin perfil o sin terminar?)")
+    
+    return FileResponse(path, media_type="application/gzip", filename=f"bark_profile_{job_id}.trace.json.gz")
+
+@app.post("/generate-batch/", response_model=BatchResponse, status_code=202)
+async def create_generation_batch(request: BatchRequest):
+    """
+    Generar un lote de textos (un álbum, una lista de poemas...) sin esperar a Bark
+    
+    Cada elemento se analiza como en /smart-generate/ (voz y música automáticas
+    salvo que se indiquen) y se encola en el worker de inferencia. Los elementos
+    se encolan agrupados por voz y estilo para que caigan en los mismos
+    micro-batches: el prompt de voz se reutiliza y las frases repetidas se
+    sintetizan una vez.
+    
+    Consulta GET /generate-batch/{batch_id} (manifiesto con el estado de cada
+    elemento) y descarga todo con GET /generate-batch/{batch_id}/zip.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="El lote no contiene elementos")
+    if len(request.items) > GENERATION_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Demasiados elementos en el lote: {len(request.items)} (máximo {GENERATION_BATCH_MAX_ITEMS})"
+        )
+    
+    # Validar todo antes de encolar nada: un lote se acepta o se rechaza entero
+    for index, item in enumerate(request.items):
+        if not item.text.strip():
+            raise HTTPException(status_code=400, detail=f"Elemento {index}: el texto no puede estar vacío")
+        if item.voice is not None and item.voice not in voice_registry:
+            raise HTTPException(status_code=400, detail=f"Elemento {index}: voz desconocida: {item.voice}. Consulta GET /voices")
+    if request.profile is not None and request.profile not in INFERENCE_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Perfil de inferencia desconocido: {request.profile}. Opciones: {', '.join(INFERENCE_PROFILES)}"
+        )
+    _validate_output(request.format, request.sample_rate)
+    try:
+        request.tier = select_tier(request.tier, None, "")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    tier_settings = TIERS[request.tier]
+    # El lote entero cabe en la cola o se rechaza entero
+    _check_queue("\n".join(item.text for item in request.items), request.tier, jobs=len(request.items))
+    
+    planned = await asyncio.to_thread(lambda: [_plan_batch_item(item, tier_settings) for item in request.items])
+    
+    # Encolar agrupando por voz y música (localidad de prompts de voz y de frases)
+    order = sorted(range(len(planned)), key=lambda index: (
+        planned[index]["voice"], planned[index]["music_style"] if planned[index]["music_included"] else "",
+        planned[index]["detected_type"], index
+    ))
+    try:
+        for index in order:
+            plan, item = planned[index], request.items[index]
+            audio_request = AudioRequest(
+                text="\n".join(plan["segments"]), voice=plan["voice"], seed=item.seed, profile=request.profile,
+                tier=request.tier, format=request.format, sample_rate=request.sample_rate
+            )
+            plan["job"], _ = _submit_generation(
+                audio_request,
+                use_smart_processing=False,
+                metadata={"detected_type": plan["detected_type"]},
+                segments=plan["segments"],
+                analysis_result=plan["analysis_result"],
+                admission=False
+            )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error encolando lote: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+    
+    manifest = batches.create_batch(planned, options={
+        "tier": request.tier, "profile": request.profile,
+        "format": request.format or "wav", "sample_rate": request.sample_rate,
+    })
+    print(f"📚 Lote {manifest['batch_id']}: {manifest['total']} elementos encolados")
+    return BatchResponse(
+        batch_id=manifest["batch_id"],
+        status=manifest["status"],
+        total=manifest["total"],
+        manifest_url=f"/generate-batch/{manifest['batch_id']}",
+        zip_url=f"/generate-batch/{manifest['batch_id']}/zip"
+    )
+
+def _plan_batch_item(item: BatchItem, tier_settings: dict) -> dict:
+    """Analizar un elemento del lote y preparar sus segmentos (como /generate-music/)"""
+    analysis_result = analysis_memo.analyze(item.text)
+    recommendations = analysis_result["recommendations"]
+    include_music = item.include_music if item.include_music is not None else recommendations["include_music"]
+    music_style = item.music_style or recommendations["music_style"]
+    segments = segment_for_synthesis(
+        item.text, analysis_result["analysis"], recommendations["split_strategy"], tier_settings["segment_max_chars"]
+    )
+    return {
+        "name": item.name,
+        "voice": item.voice or recommendations["voice"],
+        "detected_type": analysis_result["analysis"]["type"],
+        "music_included": include_music,
+        "music_style": music_style,
+        "segments": _prepare_music_segments(segments, include_music, music_style),
+        "analysis_result": analysis_result,
+    }
+
+@app.get("/generate-batch/{batch_id}")
+async def get_generation_batch(batch_id: str):
+    """Manifiesto de un lote: estado global y, por elemento, estado, file_id, duración y tiempos"""
+    manifest = batches.lookup_batch(batch_id)
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Lote no encontrado")
+    
+    options = manifest["options"]
+    for item in manifest["items"]:
+        item["download_url"] = (
+            _variant_url(item["file_id"], options["format"], options["sample_rate"])
+            if item["status"] == "done" else None
+        )
+    manifest["zip_url"] = f"/generate-batch/{batch_id}/zip"
+    return manifest
+
+@app.get("/generate-batch/{batch_id}/zip")
+async def get_generation_batch_zip(batch_id: str):
+    """
+    Descargar en un ZIP el audio de todos los elementos terminados y el manifiesto
+    
+    Devuelve 202 con el manifiesto mientras queden elementos en cola o generándose.
+    """
+    manifest = batches.lookup_batch(batch_id)
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Lote no encontrado")
+    if manifest["status"] in ("queued", "running"):
+        return JSONResponse(status_code=202, content=manifest)
+    if manifest["status"] == "error":
+        raise HTTPException(status_code=500, detail="Ningún elemento del lote se generó correctamente")
+    
+    output_format = manifest["options"]["format"]
+    sample_rate = manifest["options"]["sample_rate"]
+    files = []
+    for item in manifest["items"]:
+        if item["status"] != "done":
+            continue
+        audio_path = await asyncio.to_thread(storage.locate, item["file_id"])
+        if audio_path is None:
+            item["status"], item["error"] = "expired", "El audio ya se borró (expiró)"
+            continue
+        audio_path = await _audio_variant(item["file_id"], audio_path, output_format, sample_rate)
+        files.append((batches.archive_name(item, transcode.extension(output_format)), audio_path))
+    
+    return StreamingResponse(
+        iterate_in_threadpool(batches.iter_zip(manifest, files)),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="bark_batch_{batch_id}.zip"'}
+    )
+
+@app.get("/tiers")
+async def list_tiers():
+    """Niveles de calidad disponibles, su configuración y el RTF estimado con el que se eligen"""
+    return {"tiers": tier_info(), "default": DEFAULT_TIER}
+
+@app.get("/admin/cache")
+async def cache_stats():
+    """Estadísticas de los caches de audio y del memo de análisis de texto (aciertos, fallos, tamaño)"""
+    return {
+        "result_cache": result_cache.stats(),
+        "phrase_cache": phrase_cache.stats(),
+        "text_analysis": analysis_memo.stats(),
+        "voice_prompts": voice_registry.stats(),
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Métricas en formato Prometheus: peticiones, etapas de Bark, RTF, caches y colas"""
+    body, content_type = await asyncio.to_thread(metrics.render)
+    return Response(content=body, media_type=content_type)
+
+@app.get("/admin/profiling")
+async def profiling_settings():
+    """Configuración del perfilado de este proceso (muestreo y jobs armados)"""
+    return profiling.settings()
+
+@app.post("/admin/profiling")
+async def configure_profiling(request: ProfilingRequest):
+    """
+    Cambiar la fracción de jobs perfilados al azar o perfilar los próximos `arm` jobs
+
+    Con varios workers (app.serve) afecta solo al proceso que atiende la petición.
+    """
+    try:
+        return profiling.configure(request.sample_rate, request.arm, request.mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/admin/storage")
+async def storage_usage():
+    """Uso del almacenamiento de audio generado (archivos, bytes, presupuesto, último barrido)"""
+    return await asyncio.to_thread(storage.usage)
+
 @app.post("/paste-text/", response_model=MusicResponse)
 async def paste_text_generate(text_data: str = None):
     """
@@ -522,36 +1356,41 @@ async def paste_text_generate(text_data: str = None):
         
         # Crear un AudioRequest con el texto recibido
         request = AudioRequest(text=text_data.strip())
+        tier_settings = _resolve_tier(request)
         
         # Usar el sistema inteligente completo
-        from . import smart_text_processing
-        analysis_result = smart_text_processing(request.text)
+        analysis_result = analysis_memo.analyze(request.text)
         
         analysis = analysis_result["analysis"]
         recommendations = analysis_result["recommendations"]
-        processed_text = analysis_result["processed_text"]
         
         print(f"🍃 Texto pegado - Tipo detectado: {analysis['type']}")
         
         # Usar recomendaciones automáticas
         optimal_voice = recommendations["voice"]
         
-        # Preparar texto con música si es recomendado
-        final_text = processed_text
-        if recommendations["include_music"]:
-            final_text = _prepare_music_text(processed_text, True, recommendations["music_style"])
+        # Dividir según la estrategia recomendada y preparar música si es recomendado
+        segments = segment_for_synthesis(
+            request.text, analysis, recommendations["split_strategy"], tier_settings["segment_max_chars"]
+        )
+        segments = _prepare_music_segments(segments, recommendations["include_music"], recommendations["music_style"])
         
         # Generar el audio
-        audio_request = AudioRequest(text=final_text, voice=optimal_voice)
-        file_id, audio_path, _ = await _generate_audio_internal(audio_request, use_smart_processing=False)
+        audio_request = _derived_request(request, segments, optimal_voice)
+        file_id, audio_path, _, job = await _generate_audio_internal(
+            audio_request, use_smart_processing=False, segments=segments, analysis_result=analysis_result
+        )
         
         return MusicResponse(
             message=f"Texto pegado procesado - Tipo: {analysis['type']}",
             file_id=file_id,
-            filename=f"bark_pasted_{analysis['type']}_{file_id}.wav",
+            filename=f"bark_pasted_{analysis['type']}_{file_id}.{transcode.extension(audio_request.format or 'wav')}",
             voice_used=optimal_voice,
             music_included=recommendations["include_music"],
-            music_style=recommendations["music_style"]
+            music_style=recommendations["music_style"],
+            cache_hit=job["cache_hit"],
+            tier=job["metadata"]["tier"],
+            download_url=_download_url(file_id, audio_request)
         )
         
     except HTTPException:
@@ -580,6 +1419,8 @@ async def paste_text_from_body(request: Request):
         
     except UnicodeDecodeError:
         raise HTTPException(status_code=400, detail="Error decodificando el texto. Asegúrate de usar UTF-8.")
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error procesando cuerpo: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
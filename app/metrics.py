@@ -0,0 +1,233 @@
+"""
+Métricas de Prometheus (GET /metrics)
+
+Peticiones HTTP por endpoint, tiempo de cada etapa de Bark (semantic, coarse,
+fine, codec), duración del audio generado y factor de tiempo real de cada job,
+tiempo de unir segmentos y escribir el WAV, longitud y tipo de los textos
+analizados, aciertos de los caches y jobs en cola o ejecutándose.
+
+Con varios workers (app.serve) cada proceso escribe sus métricas en
+PROMETHEUS_MULTIPROC_DIR y /metrics suma las de todos; con un solo proceso se
+usa el registro en memoria de prometheus_client.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+from . import profiling
+
+# Buckets (segundos, salvo que se indique otra unidad)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160, 320)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128)
+IO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+AUDIO_BUCKETS = (1, 2, 5, 10, 15, 30, 60, 120, 300, 600)
+RTF_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 4, 6, 8, 12)
+ROW_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 32)
+TEXT_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000, 250000)
+
+http_requests = Counter(
+    "bark_http_requests_total", "Peticiones HTTP por endpoint y código de estado",
+    ["method", "endpoint", "status"],
+)
+http_request_seconds = Histogram(
+    "bark_http_request_duration_seconds", "Duración de las peticiones HTTP (hasta enviar el último byte)",
+    ["method", "endpoint"], buckets=REQUEST_BUCKETS,
+)
+http_in_progress = Gauge(
+    "bark_http_requests_in_progress", "Peticiones HTTP en curso",
+    ["method"], multiprocess_mode="livesum",
+)
+
+stage_seconds = Histogram(
+    "bark_stage_duration_seconds",
+    "Tiempo de cada etapa de Bark por llamada (un batch cuenta una vez en semantic y codec)",
+    ["stage"], buckets=STAGE_BUCKETS,
+)
+synthesis_seconds = Histogram(
+    "bark_synthesis_duration_seconds", "Tiempo de cada llamada al backend de síntesis",
+    ["backend"], buckets=STAGE_BUCKETS,
+)
+synthesis_rows = Histogram(
+    "bark_synthesis_batch_rows", "Segmentos sintetizados en cada llamada al backend",
+    buckets=ROW_BUCKETS,
+)
+postprocess_seconds = Histogram(
+    "bark_postprocess_duration_seconds", "Post-procesado del audio de un job (join: unir segmentos, wav_write: normalizar y escribir el WAV)",
+    ["step"], buckets=IO_BUCKETS,
+)
+
+generation_jobs = Counter(
+    "bark_generation_jobs_total",
+    "Jobs de generación por resultado (synthesized, cache_hit, deduplicated, rejected, error)",
+    ["outcome"],
+)
+generation_jobs_current = Gauge(
+    "bark_generation_jobs_in_progress", "Jobs de generación en cola (queued) o ejecutándose (running)",
+    ["state"], multiprocess_mode="livesum",
+)
+job_queue_seconds = Histogram(
+    "bark_job_queue_wait_seconds", "Espera de un job en la cola hasta empezar a sintetizarse",
+    buckets=REQUEST_BUCKETS,
+)
+job_compute_seconds = Histogram(
+    "bark_job_compute_seconds", "Tiempo de cómputo de un job (en un micro-batch, su parte de cada batch)",
+    ["tier"], buckets=REQUEST_BUCKETS,
+)
+job_audio_seconds = Histogram(
+    "bark_job_audio_seconds", "Duración del audio de cada job generado",
+    ["tier"], buckets=AUDIO_BUCKETS,
+)
+generated_audio_seconds = Counter(
+    "bark_generated_audio_seconds_total", "Segundos de audio sintetizados",
+    ["tier"],
+)
+job_rtf = Histogram(
+    "bark_job_real_time_factor", "Factor de tiempo real de cada job (segundos de cómputo / segundos de audio)",
+    ["tier"], buckets=RTF_BUCKETS,
+)
+
+cache_lookups = Counter(
+    "bark_cache_lookups_total", "Consultas a los caches (result, phrase, text_analysis) por resultado",
+    ["cache", "result"],
+)
+
+text_length_chars = Histogram(
+    "bark_text_length_chars", "Longitud (caracteres) de los textos analizados",
+    ["source"], buckets=TEXT_BUCKETS,
+)
+text_types = Counter(
+    "bark_detected_text_type_total", "Tipo detectado de los textos analizados (song, poem, narrative, text)",
+    ["type", "source"],
+)
+
+def multiprocess_mode() -> bool:
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+def render() -> Tuple[bytes, str]:
+    """Métricas en el formato de texto de Prometheus (sumando todos los workers si hay varios)"""
+    if multiprocess_mode():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid: int):
+    """Descartar los gauges de un worker que ya no existe (llamar desde el proceso padre)"""
+    if multiprocess_mode():
+        multiprocess.mark_process_dead(pid)
+
+@contextmanager
+def stage(name: str):
+    """Medir una etapa de Bark: with metrics.stage("semantic"): ... (también en el perfil del job, si lo hay)"""
+    started_at = time.perf_counter()
+    try:
+        with profiling.span(name):
+            yield
+    finally:
+        stage_seconds.labels(name).observe(time.perf_counter() - started_at)
+
+@contextmanager
+def postprocess(step: str):
+    started_at = time.perf_counter()
+    try:
+        with profiling.span(step):
+            yield
+    finally:
+        postprocess_seconds.labels(step).observe(time.perf_counter() - started_at)
+
+def record_synthesis(backend: str, rows: int, seconds: float):
+    synthesis_seconds.labels(backend).observe(seconds)
+    synthesis_rows.observe(rows)
+
+def record_cache(cache: str, hit: bool):
+    cache_lookups.labels(cache, "hit" if hit else "miss").inc()
+
+def record_text(length: int, text_type: str, source: str):
+    text_length_chars.labels(source).observe(length)
+    text_types.labels(text_type, source).inc()
+
+def job_queued():
+    generation_jobs_current.labels("queued").inc()
+
+def job_started():
+    generation_jobs_current.labels("queued").dec()
+    generation_jobs_current.labels("running").inc()
+
+def job_finished(job: Dict[str, Any]):
+    """Registrar un job sintetizado por este proceso al terminar (bien o con error)"""
+    generation_jobs_current.labels("running").dec()
+    if job["status"] != "done":
+        generation_jobs.labels("error").inc()
+        return
+    generation_jobs.labels("synthesized").inc()
+    tier = job["metadata"].get("tier") or "unknown"
+    job_queue_seconds.observe(job["started_at"] - job["created_at"])
+    compute = job["compute_seconds"]
+    job_compute_seconds.labels(tier).observe(compute)
+    if job["audio_seconds"]:
+        job_audio_seconds.labels(tier).observe(job["audio_seconds"])
+        generated_audio_seconds.labels(tier).inc(job["audio_seconds"])
+        job_rtf.labels(tier).observe(compute / job["audio_seconds"])
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: cuenta y mide cada petición HTTP por endpoint
+
+    El endpoint es la plantilla de la ruta (/download/{file_id}), no la URL, para
+    que el número de series no crezca con cada file_id. La duración llega hasta el
+    último byte del cuerpo (también en respuestas en streaming y archivos).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        started_at = time.perf_counter()
+        status: Dict[str, Optional[int]] = {"code": None}
+        recorded = False
+
+        def record(code: int):
+            nonlocal recorded
+            if recorded:
+                return
+            recorded = True
+            endpoint = _endpoint(scope)
+            http_requests.labels(method, endpoint, str(code)).inc()
+            http_request_seconds.labels(method, endpoint).observe(time.perf_counter() - started_at)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record(status["code"])
+            elif message["type"] == "http.response.pathsend":
+                record(status["code"])
+
+        http_in_progress.labels(method).inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            record(500)
+            raise
+        finally:
+            http_in_progress.labels(method).dec()
+            if status["code"] is not None:
+                # Cliente desconectado antes del final del cuerpo
+                record(status["code"])
+
+def _endpoint(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path or "unmatched"
@@ -0,0 +1,137 @@
+"""
+Ciclo de vida de los modelos de Bark
+
+Importar la API no carga nada: ni torch ni Bark. Los modelos (text, coarse,
+fine y codec, ~6.6GB) se cargan en un hilo en segundo plano después del arranque
+del servidor, o bajo demanda la primera vez que una etapa los necesita. Mientras
+tanto los endpoints que no generan audio (análisis de texto, descargas...)
+responden con normalidad y /ready informa del estado de cada etapa.
+
+Los modelos pequeños del nivel "draft" ("<etapa>_small") no cuentan para /ready:
+se cargan la primera vez que se piden o al arrancar con BARK_PRELOAD_SMALL_MODELS=1.
+
+La carga y el calentamiento pasan por el backend de síntesis (BARK_BACKEND):
+con el backend "fake" las etapas quedan listas al instante.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .backends import get_backend
+from .config import PRELOAD_MODELS, PRELOAD_SMALL_MODELS, SYNTHESIS_BACKEND, WARMUP_TEXT, WARMUP_VOICE
+
+# Etapas del pipeline de Bark, en el orden en que se usan
+STAGES = ("text", "coarse", "fine", "codec")
+# Checkpoints pequeños de las etapas GPT (nivel "draft"; el codec es el mismo)
+SMALL_STAGES = ("text_small", "coarse_small", "fine_small")
+
+_stage_state: Dict[str, Dict[str, Any]] = {
+    stage: {"state": "pending", "seconds": None, "error": None} for stage in STAGES + SMALL_STAGES
+}
+_stage_locks = {stage: threading.Lock() for stage in STAGES + SMALL_STAGES}
+_warmup: Dict[str, Any] = {"state": "pending" if WARMUP_TEXT else "disabled", "seconds": None, "error": None}
+_loader_thread: Optional[threading.Thread] = None
+_loader_lock = threading.Lock()
+_started_at = time.time()
+
+def ensure_stage(stage: str):
+    """
+    Cargar el modelo de una etapa si aún no está en memoria (bloquea hasta tenerlo)
+
+    Si otro hilo ya lo está cargando, espera a que termine en lugar de cargarlo dos veces.
+    """
+    state = _stage_state[stage]
+    if state["state"] == "ready":
+        return
+    with _stage_locks[stage]:
+        if state["state"] == "ready":
+            return
+        state["state"] = "loading"
+        state["error"] = None
+        started_at = time.time()
+        print(f"⏳ Cargando modelo de Bark: {stage}...")
+        try:
+            get_backend().load_stage(stage)
+        except Exception as e:
+            state["state"] = "error"
+            state["error"] = str(e)
+            print(f"❌ Error cargando el modelo {stage}: {str(e)}")
+            raise
+        state["seconds"] = time.time() - started_at
+        state["state"] = "ready"
+        print(f"✅ Modelo {stage} cargado en {state['seconds']:.1f}s")
+
+def ensure_all_stages():
+    """Cargar todas las etapas en orden"""
+    for stage in STAGES:
+        ensure_stage(stage)
+
+def preload_optional_stages():
+    """Cargar los modelos pequeños al arrancar si BARK_PRELOAD_SMALL_MODELS=1"""
+    if not PRELOAD_SMALL_MODELS:
+        return
+    for stage in SMALL_STAGES:
+        try:
+            ensure_stage(stage)
+        except Exception:
+            return
+
+def start_background_loading():
+    """Cargar los modelos (y hacer una inferencia de calentamiento) en un hilo aparte"""
+    global _loader_thread
+    if is_ready():
+        # Ya cargados (p. ej. heredados del proceso padre en app.serve)
+        return
+    if not PRELOAD_MODELS:
+        print("💤 Modelos de Bark bajo demanda (BARK_PRELOAD_MODELS=0)")
+        return
+    with _loader_lock:
+        if _loader_thread is not None and _loader_thread.is_alive():
+            return
+        _loader_thread = threading.Thread(target=_load_and_warm_up, name="bark-loader", daemon=True)
+        _loader_thread.start()
+
+def _load_and_warm_up():
+    """Hilo de carga: todas las etapas y después una generación corta para medir el arranque"""
+    print("🚀 Cargando modelos de Bark en segundo plano...")
+    print("⏳ Si es la primera vez, esto descargará ~6.6GB de modelos...")
+    try:
+        ensure_all_stages()
+    except Exception:
+        return
+    warm_up()
+    preload_optional_stages()
+
+def warm_up():
+    """Hacer una generación corta (una sola vez) y guardar cuánto tardó"""
+    if _warmup["state"] in ("disabled", "done"):
+        return
+    _warmup["state"] = "running"
+    started_at = time.time()
+    try:
+        get_backend().synthesize(WARMUP_TEXT, WARMUP_VOICE)
+    except Exception as e:
+        _warmup["state"] = "error"
+        _warmup["error"] = str(e)
+        print(f"⚠️ La inferencia de calentamiento falló: {str(e)}")
+        return
+    _warmup["seconds"] = time.time() - started_at
+    _warmup["state"] = "done"
+    print(f"🔥 Inferencia de calentamiento en {_warmup['seconds']:.1f}s: modelos listos")
+
+def is_ready() -> bool:
+    """True cuando todas las etapas están cargadas y el calentamiento terminó (o está desactivado)"""
+    return (all(_stage_state[stage]["state"] == "ready" for stage in STAGES)
+            and _warmup["state"] in ("done", "error", "disabled"))
+
+def readiness() -> Dict[str, Any]:
+    """Estado de carga de cada etapa y del calentamiento (para /ready)"""
+    return {
+        "ready": is_ready(),
+        "backend": SYNTHESIS_BACKEND,
+        "preload": PRELOAD_MODELS,
+        "stages": {stage: dict(state) for stage, state in _stage_state.items()},
+        "warmup": dict(_warmup),
+        "uptime_seconds": time.time() - _started_at,
+    }
@@ -0,0 +1,393 @@
+"""
+Perfilado bajo demanda de jobs de generación
+
+Un job se perfila si la petición lleva la cabecera X-Bark-Profile, si se armó
+con POST /admin/profiling o si sale elegido al azar (PROFILE_SAMPLE_RATE). El
+job perfilado se sintetiza solo (no se junta con otros en el micro-batch) y sin
+caches, y al terminar quedan en PROFILE_DIR:
+
+- <job_id>.json: tiempo de cada etapa (semantic, coarse, fine, codec, join,
+  wav_write), operadores con más tiempo de CPU en cada etapa y pico de memoria
+- <job_id>.trace.json.gz: traza para chrome://tracing o ui.perfetto.dev
+
+Con el backend de Bark se usa torch.profiler (operadores de torch y memoria de
+los tensores); sin torch (backend fake) o con el modo "cprofile", cProfile
+(funciones de Python) y una traza con los tramos de cada etapa. En ambos casos
+tracemalloc mide el pico de memoria de Python y NumPy.
+"""
+
+import contextvars
+import cProfile
+import gzip
+import json
+import os
+import pstats
+import random
+import resource
+import shutil
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from .config import PROFILE_DIR, PROFILE_HEADER_ENABLED, PROFILE_SAMPLE_RATE
+
+PROFILE_HEADER = "x-bark-profile"
+MODES = ("auto", "torch", "cprofile")
+# Operadores o funciones que se guardan por etapa (los de más tiempo de CPU)
+TOP_OPERATORS = 15
+# Un job perfilado se sintetiza solo, sin caches y varias veces más lento: su coste en el
+# control de admisión se multiplica por este factor
+COST_FACTOR = 4.0
+
+# Perfilado de la petición en curso (lo pone ProfilingMiddleware)
+_request_profiling: contextvars.ContextVar = contextvars.ContextVar("bark_request_profiling", default=None)
+# Perfil activo en el hilo de inferencia
+_active = threading.local()
+
+_lock = threading.Lock()
+_sample_rate = PROFILE_SAMPLE_RATE
+_armed: List[str] = []  # Modos de los próximos jobs a perfilar (POST /admin/profiling)
+
+def validate_mode(mode: str):
+    """
+    Raises:
+        ValueError: Si el modo no existe
+    """
+    if mode not in MODES:
+        raise ValueError(f"Modo de perfilado desconocido: {mode}. Opciones: {', '.join(MODES)}")
+
+def configure(sample_rate: Optional[float] = None, arm: int = 0, mode: str = "auto") -> Dict[str, Any]:
+    """
+    Cambiar la fracción de jobs perfilados al azar y/o perfilar los próximos `arm` jobs
+
+    Raises:
+        ValueError: Si la fracción no está entre 0 y 1 o el modo no existe
+    """
+    global _sample_rate
+    validate_mode(mode)
+    if sample_rate is not None and not 0 <= sample_rate <= 1:
+        raise ValueError("sample_rate debe estar entre 0 y 1")
+    with _lock:
+        if sample_rate is not None:
+            _sample_rate = sample_rate
+        _armed.extend([mode] * max(0, arm))
+    return settings()
+
+def settings() -> Dict[str, Any]:
+    """Configuración actual del perfilado (de este proceso)"""
+    with _lock:
+        return {
+            "header_enabled": PROFILE_HEADER_ENABLED,
+            "sample_rate": _sample_rate,
+            "armed": len(_armed),
+            "directory": PROFILE_DIR,
+        }
+
+def requested_mode() -> Optional[str]:
+    """
+    Modo de perfilado para el job que se va a encolar (None si no se perfila)
+
+    Por orden: la cabecera de la petición, un job armado desde /admin/profiling
+    o el muestreo al azar.
+    """
+    state = _request_profiling.get()
+    if state is not None and state["mode"] is not None:
+        return state["mode"]
+    with _lock:
+        if _armed:
+            return _armed.pop(0)
+        if _sample_rate > 0 and random.random() < _sample_rate:
+            return "auto"
+    return None
+
+def note_job(job_id: str):
+    """Recordar el job perfilado para devolver su URL en la cabecera X-Bark-Profile"""
+    state = _request_profiling.get()
+    if state is not None:
+        state["jobs"].append(job_id)
+
+def resolve_mode(mode: str, backend_name: str) -> str:
+    """"auto": torch.profiler con el backend de Bark y cProfile con el resto"""
+    if mode != "auto":
+        return mode
+    return "torch" if backend_name == "bark" else "cprofile"
+
+def job_info(job_id: str, mode: str) -> Dict[str, Any]:
+    """Estado del perfil de un job (se guarda en el estado del job)"""
+    return {
+        "mode": mode,
+        "status": "pending",
+        "summary_url": f"/jobs/{job_id}/profile",
+        "trace_url": f"/jobs/{job_id}/profile/trace",
+    }
+
+def summary_path(job_id: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{job_id}.json")
+
+def trace_path(job_id: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{job_id}.trace.json.gz")
+
+def remove(job_id: str):
+    """Borrar el perfil de un job olvidado"""
+    for path in (summary_path(job_id), trace_path(job_id)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+@contextmanager
+def span(name: str):
+    """
+    Tramo con nombre dentro del job perfilado en este hilo (etapas de Bark, post-procesado)
+
+    Sin perfil activo no hace nada. Con torch.profiler el tramo aparece también
+    como record_function en la traza.
+    """
+    profile = getattr(_active, "profile", None)
+    if profile is None:
+        yield
+        return
+    record = profile.torch_range(name)
+    started_at = time.perf_counter()
+    try:
+        if record is not None:
+            with record:
+                yield
+        else:
+            yield
+    finally:
+        profile.spans.append((name, started_at, time.perf_counter()))
+
+class JobProfile:
+    """Perfil de un job en el hilo de inferencia: with JobProfile(job_id, mode): _run_job(job)"""
+
+    def __init__(self, job_id: str, mode: str):
+        self.job_id = job_id
+        self.mode = mode
+        self.spans: List[tuple] = []
+        self.info: Dict[str, Any] = job_info(job_id, mode)
+        self._torch = None
+        self._profiler = None
+        self._cprofile = None
+
+    def torch_range(self, name: str):
+        if self._torch is None:
+            return None
+        return self._torch.profiler.record_function(f"bark::{name}")
+
+    def __enter__(self):
+        if self.mode == "torch":
+            import torch  # Solo con el backend de Bark (ya importado por el worker)
+            self._torch = torch
+            self._profiler = torch.profiler.profile(
+                activities=[torch.profiler.ProfilerActivity.CPU], profile_memory=True, record_shapes=False,
+            )
+            self._profiler.__enter__()
+        else:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._tracemalloc = not tracemalloc.is_tracing()
+        if self._tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._rss_before = _rss_bytes()
+        self._started_at = time.perf_counter()
+        self._cpu_started_at = time.thread_time()
+        _active.profile = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _active.profile = None
+        wall_seconds = time.perf_counter() - self._started_at
+        cpu_seconds = time.thread_time() - self._cpu_started_at
+        _, python_peak = tracemalloc.get_traced_memory()
+        if self._tracemalloc:
+            tracemalloc.stop()
+        if self._profiler is not None:
+            self._profiler.__exit__(None, None, None)
+        else:
+            self._cprofile.disable()
+
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            summary = {
+                "job_id": self.job_id,
+                "mode": self.mode,
+                "wall_seconds": round(wall_seconds, 4),
+                "thread_cpu_seconds": round(cpu_seconds, 4),
+                "stages": self._stage_times(),
+                "memory": {
+                    "python_peak_bytes": python_peak,
+                    "rss_before_bytes": self._rss_before,
+                    "rss_after_bytes": _rss_bytes(),
+                    "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                },
+            }
+            if self._profiler is not None:
+                self._torch_summary(summary)
+            else:
+                self._cprofile_summary(summary)
+            _write_json(summary_path(self.job_id), summary)
+            self.info["status"] = "done"
+            self.info["wall_seconds"] = summary["wall_seconds"]
+            print(f"🔬 Perfil del job {self.job_id} ({self.mode}) guardado en {PROFILE_DIR}")
+        except Exception as e:
+            self.info["status"] = "error"
+            self.info["error"] = str(e)
+            print(f"⚠️ No se pudo guardar el perfil del job {self.job_id}: {str(e)}")
+        return False
+
+    def _stage_times(self) -> Dict[str, Dict[str, Any]]:
+        stages: Dict[str, Dict[str, Any]] = {}
+        for name, started_at, finished_at in self.spans:
+            stage = stages.setdefault(name, {"calls": 0, "wall_seconds": 0.0})
+            stage["calls"] += 1
+            stage["wall_seconds"] = round(stage["wall_seconds"] + finished_at - started_at, 4)
+        return stages
+
+    def _torch_summary(self, summary: Dict[str, Any]):
+        """
+        Operadores por etapa (el tramo bark:: más interno que los contiene), pico de memoria de tensores y traza
+
+        Un segmento de Bark ejecuta millones de operadores (uno por capa y token):
+        se recorren los eventos de kineto directamente, sin profiler.events(), que
+        crea un objeto de Python por operador y no cabe en memoria.
+        """
+        events = self._profiler.profiler.kineto_results.events()
+        order = sorted(range(len(events)), key=lambda i: (events[i].start_ns(), -events[i].duration_ns()))
+        operators: Dict[str, Dict[str, List[float]]] = {}
+        stacks: Dict[int, List[list]] = {}  # hilo -> [fin, nombre, etapa, duración, duración de los hijos]
+        allocated = peak = 0
+
+        def close(frame):
+            if not frame[1].startswith("bark::"):
+                row = operators.setdefault(frame[2], {}).setdefault(frame[1], [0, 0, 0])
+                row[0] += 1
+                row[1] += frame[3] - frame[4]
+                row[2] += frame[3]
+
+        for index in order:
+            event = events[index]
+            name = event.name()
+            if name == "[memory]":
+                allocated += event.nbytes()
+                peak = max(peak, allocated)
+                continue
+            if event.is_async():
+                continue
+            started_at = event.start_ns()
+            duration = event.duration_ns()
+            stack = stacks.setdefault(event.start_thread_id(), [])
+            while stack and stack[-1][0] <= started_at:
+                close(stack.pop())
+            stage = name[len("bark::"):] if name.startswith("bark::") else (stack[-1][2] if stack else "other")
+            if stack:
+                stack[-1][4] += duration
+            stack.append([started_at + duration, name, stage, duration, 0])
+        for stack in stacks.values():
+            while stack:
+                close(stack.pop())
+
+        for stage, rows in operators.items():
+            top = sorted(rows.items(), key=lambda item: item[1][1], reverse=True)[:TOP_OPERATORS]
+            summary["stages"].setdefault(stage, {"calls": 0, "wall_seconds": None})["top_operators"] = [
+                {"name": name, "calls": calls, "self_cpu_ms": round(self_ns / 1e6, 3), "cpu_ms": round(total_ns / 1e6, 3)}
+                for name, (calls, self_ns, total_ns) in top
+            ]
+        summary["memory"]["torch_peak_bytes"] = peak
+
+        raw_path = f"{trace_path(self.job_id)}.{os.getpid()}.raw"
+        try:
+            self._profiler.export_chrome_trace(raw_path)
+            _gzip_file(raw_path, trace_path(self.job_id))
+        finally:
+            if os.path.exists(raw_path):
+                os.remove(raw_path)
+
+    def _cprofile_summary(self, summary: Dict[str, Any]):
+        """Funciones con más tiempo propio (de reloj: incluye esperas) y una traza con los tramos de cada etapa"""
+        stats = pstats.Stats(self._cprofile)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_OPERATORS * 2]
+        summary["top_functions"] = [
+            {
+                "function": f"{os.path.basename(filename)}:{line}({name})",
+                "calls": calls,
+                "self_ms": round(self_time * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            }
+            for (filename, line, name), (_, calls, self_time, cumulative, _) in rows
+        ]
+        origin = self._started_at
+        trace = {
+            "traceEvents": [
+                {"name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                 "ts": (started_at - origin) * 1e6, "dur": (finished_at - started_at) * 1e6}
+                for name, started_at, finished_at in self.spans
+            ],
+            "displayTimeUnit": "ms",
+        }
+        tmp_path = f"{trace_path(self.job_id)}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(trace, f)
+        os.replace(tmp_path, trace_path(self.job_id))
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI: lee X-Bark-Profile y devuelve en la misma cabecera la URL del perfil
+
+    Valores de la cabecera: "1" o "auto", "torch", "cprofile".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mode = None
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER.encode():
+                mode = value.decode("latin-1").strip().lower()
+        if mode in ("1", "true", "yes"):
+            mode = "auto"
+        if mode not in MODES or not PROFILE_HEADER_ENABLED:
+            mode = None
+
+        state = {"mode": mode, "jobs": []}
+        token = _request_profiling.set(state)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and state["jobs"]:
+                urls = ", ".join(f"/jobs/{job_id}/profile" for job_id in state["jobs"])
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-bark-profile", urls.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_profiling.reset(token)
+
+def _rss_bytes() -> Optional[int]:
+    """Memoria residente actual del proceso (Linux; None si no se puede leer)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _write_json(path: str, data: Dict[str, Any]):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def _gzip_file(source: str, destination: str):
+    tmp_path = f"{destination}.{os.getpid()}.tmp"
+    # Nivel 1: las trazas de torch ocupan cientos de MB y comprimirlas más tarda mucho
+    with open(source, "rb") as src, gzip.open(tmp_path, "wb", compresslevel=1) as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp_path, destination)
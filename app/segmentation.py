@@ -0,0 +1,136 @@
+"""
+Segmentación de textos largos para síntesis por trozos
+
+Bark degrada (y recorta) los prompts de más de ~13 segundos de audio, así que
+los textos largos se dividen según la estrategia recomendada por
+smart_text_processing (estrofas, líneas o todo junto) en trozos de tamaño
+adecuado que se sintetizan en paralelo y luego se unen.
+"""
+
+import re
+from typing import Any, Dict, List
+
+from . import _process_text_for_audio, normalize_text_input
+from .config import SEGMENT_MAX_CHARS
+
+_SENTENCE_END = re.compile(r'(?<=[.!?;:…])\s+')
+
+def split_text(text: str, split_strategy: str = "keep_together",
+               max_chars: int = SEGMENT_MAX_CHARS) -> List[str]:
+    """
+    Dividir el texto original en trozos (cada trozo conserva sus saltos de línea)
+
+    Args:
+        text: Texto original (con saltos de línea)
+        split_strategy: "split_by_stanzas", "split_by_lines" o "keep_together"
+        max_chars: Longitud máxima aproximada de cada trozo
+
+    Returns:
+        list: Trozos de texto, en orden
+    """
+    text = normalize_text_input(text)
+    if not text:
+        return []
+
+    if split_strategy == "split_by_stanzas":
+        stanzas = [stanza for stanza in text.split('\n\n') if stanza.strip()]
+        if len(stanzas) == 1:
+            # Sin líneas en blanco: estrofas implícitas de 4 líneas
+            lines = stanzas[0].split('\n')
+            stanzas = ['\n'.join(lines[i:i + 4]) for i in range(0, len(lines), 4)]
+        groups = stanzas
+    elif split_strategy == "split_by_lines":
+        groups = _pack(text.replace('\n\n', '\n').split('\n'), '\n', max_chars)
+    else:
+        groups = [text]
+
+    segments = []
+    for group in groups:
+        if len(group) <= max_chars:
+            segments.append(group)
+        else:
+            segments.extend(_split_long_group(group, max_chars))
+    return segments
+
+def segment_for_synthesis(text: str, analysis: Dict[str, Any], split_strategy: str,
+                          max_chars: int = SEGMENT_MAX_CHARS) -> List[str]:
+    """
+    Dividir el texto y procesar cada trozo igual que smart_text_processing
+
+    Los estribillos se detectan sobre el texto completo, no solo dentro de cada trozo.
+    En las canciones las líneas repetidas van en segmentos propios: así cada
+    aparición produce el mismo texto y se sintetiza una sola vez (cache de frases).
+
+    Returns:
+        list: Textos procesados, uno por segmento de audio
+    """
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    line_counts = {}
+    for line in lines:
+        line_counts[line] = line_counts.get(line, 0) + 1
+
+    segments = split_text(text, split_strategy, max_chars)
+    if analysis["is_song"] and any(count > 1 for count in line_counts.values()):
+        segments = [run for segment in segments for run in _split_repeated_lines(segment, line_counts)]
+
+    return [
+        _process_text_for_audio(segment, analysis, line_counts=line_counts)
+        for segment in segments
+    ]
+
+def _split_repeated_lines(segment: str, line_counts: Dict[str, int]) -> List[str]:
+    """
+    Separar un trozo en tramos de líneas repetidas (estribillo) y no repetidas
+
+    Un tramo de estribillo se corta cuando vuelve a empezar (una línea que ya
+    está en el tramo): dos estribillos seguidos o "A B A B" dan un segmento por
+    copia, y todas las copias se sintetizan una vez gracias al cache de frases.
+    """
+    runs = []
+    current = []
+    current_is_chorus = None
+    for line in segment.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        is_chorus = line_counts.get(line, 0) > 1
+        if current and (is_chorus != current_is_chorus or (is_chorus and line in current)):
+            runs.append('\n'.join(current))
+            current = []
+        current.append(line)
+        current_is_chorus = is_chorus
+    if current:
+        runs.append('\n'.join(current))
+    return runs
+
+def _pack(pieces: List[str], separator: str, max_chars: int) -> List[str]:
+    """Agrupar piezas consecutivas mientras quepan en max_chars"""
+    groups = []
+    current = ""
+    for piece in pieces:
+        piece = piece.strip()
+        if not piece:
+            continue
+        candidate = f"{current}{separator}{piece}" if current else piece
+        if current and len(candidate) > max_chars:
+            groups.append(current)
+            current = piece
+        else:
+            current = candidate
+    if current:
+        groups.append(current)
+    return groups
+
+def _split_long_group(group: str, max_chars: int) -> List[str]:
+    """Dividir un trozo demasiado largo por líneas, luego frases y por último palabras"""
+    segments = []
+    for chunk in _pack(group.split('\n'), '\n', max_chars):
+        if len(chunk) <= max_chars:
+            segments.append(chunk)
+            continue
+        for sentence in _pack(_SENTENCE_END.split(chunk), ' ', max_chars):
+            if len(sentence) <= max_chars:
+                segments.append(sentence)
+            else:
+                segments.extend(_pack(sentence.split(), ' ', max_chars))
+    return segments
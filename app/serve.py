@@ -0,0 +1,172 @@
+"""
+Servidor de producción con varios procesos worker
+
+Uvicorn con --workers arranca procesos independientes y cada uno carga sus
+propios ~3GB de pesos de Bark. Aquí el proceso padre carga los modelos (y hace
+la inferencia de calentamiento) una sola vez y después crea los workers con
+fork(): los pesos son de solo lectura, así que los procesos hijos comparten sus
+páginas de memoria con el padre (copy-on-write) y la RAM no crece con el número
+de workers.
+
+Todos los workers escuchan en el mismo socket (abierto por el padre). Con
+SIGTERM o Ctrl+C el padre avisa a los workers, que dejan de aceptar conexiones,
+terminan las peticiones y jobs en curso (hasta GRACEFUL_TIMEOUT segundos) y
+salen. Si un worker muere inesperadamente, se reemplaza.
+
+Las métricas de Prometheus de todos los workers se escriben en METRICS_DIR
+(modo multiproceso de prometheus_client) y GET /metrics las suma.
+
+Uso (solo Linux/macOS, necesita fork):
+
+    python -m app.serve --workers 4 --port 8000
+"""
+
+import argparse
+import gc
+import os
+import shutil
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+from .config import GRACEFUL_TIMEOUT, METRICS_DIR, WORKERS
+
+def serve(host: str = "0.0.0.0", port: int = 8000, workers: int = WORKERS):
+    """Cargar los modelos en este proceso y servir la API con `workers` procesos hijos"""
+    import uvicorn
+
+    # Antes de importar prometheus_client (app.main): métricas en archivos por proceso
+    _prepare_metrics_dir()
+
+    from . import metrics, model_loader
+    from .backends import get_backend
+    from .main import app
+    from .voices import voice_registry
+
+    workers = max(1, workers)
+    print(f"🚀 Servidor de producción: {workers} workers en http://{host}:{port}")
+
+    # 1. Cargar todo antes de hacer fork: los hijos heredan los pesos ya en memoria
+    voice_registry.load()
+    model_loader.ensure_all_stages()
+    model_loader.warm_up()
+    model_loader.preload_optional_stages()
+    _freeze_models()
+
+    # Repartir los núcleos entre workers para que no compitan entre sí
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    config = uvicorn.Config(
+        app, host=host, port=port, workers=1, lifespan="on",
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+    )
+
+    def run_worker(index: int):
+        """Código del proceso hijo: un servidor uvicorn sobre el socket compartido"""
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        get_backend().set_num_threads(threads_per_worker)
+        print(f"👷 Worker {index} (pid {os.getpid()}) listo con {threads_per_worker} hilos de cómputo")
+        uvicorn.Server(config).run(sockets=[sock])
+
+    children: Dict[int, int] = {}
+    shutting_down = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                run_worker(index)
+            except BaseException as e:
+                print(f"❌ Worker {index} terminó con error: {e}")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        children[pid] = index
+
+    def stop(signum, frame):
+        nonlocal shutting_down
+        if shutting_down:
+            return
+        shutting_down = True
+        print(f"🛑 Apagando: esperando hasta {GRACEFUL_TIMEOUT}s a que los workers terminen su trabajo...")
+        for pid in list(children):
+            _kill(pid, signal.SIGTERM)
+        # Si algún worker no termina a tiempo, se fuerza su salida
+        signal.alarm(GRACEFUL_TIMEOUT + 10)
+
+    def force_stop(signum, frame):
+        for pid in list(children):
+            print(f"⚠️ Worker {children[pid]} no terminó a tiempo, forzando salida")
+            _kill(pid, signal.SIGKILL)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGALRM, force_stop)
+
+    for index in range(workers):
+        spawn(index)
+
+    # 2. Supervisar: reemplazar workers caídos hasta que se pida apagar
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        metrics.mark_process_dead(pid)
+        if index is None or shutting_down:
+            continue
+        print(f"⚠️ Worker {index} (pid {pid}) terminó inesperadamente (estado {status}), reiniciándolo")
+        time.sleep(1)
+        spawn(index)
+
+    sock.close()
+    print("✅ Servidor detenido")
+
+def _prepare_metrics_dir():
+    """Directorio vacío para las métricas de los workers (las de una ejecución anterior no cuentan)"""
+    directory = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", METRICS_DIR)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+def _freeze_models():
+    """
+    Preparar los pesos para compartirlos entre procesos
+
+    Los modelos pasan a modo evaluación sin gradientes (nadie escribe en sus
+    tensores) y gc.freeze() saca los objetos ya creados del recolector de
+    basura para que sus pasadas no toquen (y copien) las páginas heredadas.
+    """
+    from .backends import get_backend
+
+    get_backend().freeze()
+    gc.collect()
+    gc.freeze()
+
+def _kill(pid: int, signum: int):
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor de producción de la API Bark (varios workers)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Procesos worker (por defecto BARK_WORKERS o 1)")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+Ciclo de vida del audio generado en AUDIO_DIR
+
+Los WAV (y sus variantes comprimidas) se guardan en subdirectorios por prefijo
+del file_id (ab/cd/<file_id>.wav) para que ningún directorio crezca sin límite.
+Un índice SQLite (compartido por los procesos worker) guarda de cada file_id su
+ruta, tamaño total, fecha de creación y último acceso. Un hilo en segundo plano
+borra los archivos que superan el TTL y, si el total pasa del presupuesto de
+espacio, los menos usados recientemente.
+"""
+
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl  # Solo un proceso barre a la vez (no existe en Windows)
+except ImportError:
+    fcntl = None
+
+from .config import AUDIO_DIR, STORAGE_DB, STORAGE_MAX_MB, STORAGE_SWEEP_INTERVAL_S, STORAGE_TTL_HOURS
+
+# No reescribir el último acceso en cada descarga: basta con esta resolución
+ACCESS_RESOLUTION_S = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_last_access ON files (last_access);
+"""
+
+class AudioStorage:
+    """Almacén de audio generado con índice SQLite, TTL y presupuesto de espacio (LRU)"""
+
+    def __init__(self, directory: str, db_path: str, ttl_seconds: float, max_bytes: int,
+                 sweep_interval: float):
+        self.directory = directory
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.last_sweep: Optional[Dict[str, Any]] = None
+        self._local = threading.local()
+        self._sweeper: Optional[threading.Thread] = None
+        self._sweeper_lock = threading.Lock()
+        self._legacy_adopted = False
+
+    def _db(self) -> sqlite3.Connection:
+        """Conexión de este hilo (y de este proceso: no se comparten tras fork)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def path_for(self, file_id: str) -> str:
+        """Ruta (en su subdirectorio) donde guardar el WAV de un file_id nuevo"""
+        shard = os.path.join(self.directory, file_id[:2], file_id[2:4])
+        os.makedirs(shard, exist_ok=True)
+        return os.path.join(shard, f"{file_id}.wav")
+
+    def locate(self, file_id: str) -> Optional[str]:
+        """
+        Ruta del WAV de un file_id o None si no existe (o ya se borró)
+
+        También encuentra los archivos de antes de los subdirectorios (AUDIO_DIR/<file_id>.wav)
+        y actualiza el último acceso para la expulsión LRU.
+        """
+        for path in (os.path.join(self.directory, file_id[:2], file_id[2:4], f"{file_id}.wav"),
+                     os.path.join(self.directory, f"{file_id}.wav")):
+            if os.path.exists(path):
+                self.touch(file_id)
+                return path
+        return None
+
+    def register(self, file_id: str):
+        """Añadir o actualizar un file_id en el índice (tamaño de todas sus variantes)"""
+        path = self.locate(file_id)
+        if path is None:
+            return
+        now = time.time()
+        self._db().execute(
+            "INSERT INTO files (file_id, path, bytes, created_at, last_access) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (file_id) DO UPDATE SET bytes = excluded.bytes, last_access = excluded.last_access",
+            (file_id, path, sum(os.path.getsize(p) for p in self._files_of(file_id, path)), now, now),
+        )
+
+    def touch(self, file_id: str):
+        """Marcar un file_id como usado ahora"""
+        now = time.time()
+        self._db().execute(
+            "UPDATE files SET last_access = ? WHERE file_id = ? AND last_access < ?",
+            (now, file_id, now - ACCESS_RESOLUTION_S),
+        )
+
+    def _files_of(self, file_id: str, path: str) -> List[str]:
+        """El WAV de un file_id y sus variantes (<file_id>.opus, <file_id>.8000.mp3...)"""
+        directory = os.path.dirname(path)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        return [os.path.join(directory, name) for name in names if name.startswith(f"{file_id}.")]
+
+    def _delete(self, file_id: str, path: str):
+        for file_path in self._files_of(file_id, path):
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+        self._db().execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+
+    def _adopt_legacy_files(self):
+        """Indexar los WAV del directorio plano de versiones anteriores (una vez por proceso)"""
+        if self._legacy_adopted:
+            return
+        self._legacy_adopted = True
+        adopted = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".wav"):
+                continue
+            file_id = name[:-len(".wav")]
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            cursor = self._db().execute(
+                "INSERT OR IGNORE INTO files (file_id, path, bytes, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (file_id, path, sum(os.path.getsize(p) for p in self._files_of(file_id, path)), mtime, mtime),
+            )
+            adopted += cursor.rowcount
+        if adopted:
+            print(f"🗂️ {adopted} archivos de audio antiguos añadidos al índice")
+
+    def sweep(self) -> Dict[str, Any]:
+        """
+        Borrar lo expirado (TTL) y, si se pasa del presupuesto, lo menos usado (LRU)
+
+        Returns:
+            dict: Archivos y bytes borrados por cada motivo
+        """
+        started_at = time.time()
+        self._adopt_legacy_files()
+        db = self._db()
+        result = {"expired": 0, "evicted": 0, "freed_bytes": 0}
+
+        if self.ttl_seconds > 0:
+            expired = db.execute(
+                "SELECT file_id, path, bytes FROM files WHERE last_access < ?",
+                (started_at - self.ttl_seconds,),
+            ).fetchall()
+            for file_id, path, size in expired:
+                self._delete(file_id, path)
+                result["expired"] += 1
+                result["freed_bytes"] += size
+
+        total = db.execute("SELECT COALESCE(SUM(bytes), 0) FROM files").fetchone()[0]
+        if self.max_bytes > 0 and total > self.max_bytes:
+            for file_id, path, size in db.execute(
+                "SELECT file_id, path, bytes FROM files ORDER BY last_access"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._delete(file_id, path)
+                total -= size
+                result["evicted"] += 1
+                result["freed_bytes"] += size
+
+        result["seconds"] = time.time() - started_at
+        result["finished_at"] = time.time()
+        self.last_sweep = result
+        if result["expired"] or result["evicted"]:
+            print(f"🧹 Almacenamiento: {result['expired']} expirados y {result['evicted']} expulsados "
+                  f"({result['freed_bytes'] / 1024 / 1024:.1f}MB liberados)")
+        return result
+
+    def start_sweeper(self):
+        """Barrer periódicamente en un hilo en segundo plano"""
+        if self.sweep_interval <= 0:
+            return
+        with self._sweeper_lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="storage-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        lock_path = f"{self.db_path}.sweep.lock"
+        while True:
+            try:
+                with open(lock_path, "a") as lock_file:
+                    if _try_lock(lock_file):
+                        self.sweep()
+            except Exception as e:
+                print(f"⚠️ Error barriendo el almacenamiento: {str(e)}")
+            time.sleep(self.sweep_interval)
+
+    def usage(self) -> Dict[str, Any]:
+        """Uso del almacenamiento (para /admin/storage)"""
+        count, total, oldest = self._db().execute(
+            "SELECT COUNT(*), COALESCE(SUM(bytes), 0), MIN(created_at) FROM files"
+        ).fetchone()
+        disk = shutil.disk_usage(self.directory)
+        return {
+            "files": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "usage_ratio": total / self.max_bytes if self.max_bytes > 0 else None,
+            "ttl_seconds": self.ttl_seconds,
+            "oldest_created_at": oldest,
+            "sweep_interval_seconds": self.sweep_interval,
+            "last_sweep": self.last_sweep,
+            "disk_free_bytes": disk.free,
+            "disk_total_bytes": disk.total,
+        }
+
+def _try_lock(lock_file) -> bool:
+    """Con varios procesos worker solo barre el que consigue el lock del archivo"""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+# Almacén compartido por todos los endpoints
+storage = AudioStorage(
+    AUDIO_DIR,
+    STORAGE_DB,
+    ttl_seconds=STORAGE_TTL_HOURS * 3600,
+    max_bytes=STORAGE_MAX_MB * 1024 * 1024,
+    sweep_interval=STORAGE_SWEEP_INTERVAL_S,
+)
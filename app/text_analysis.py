@@ -0,0 +1,104 @@
+"""
+Memo del análisis inteligente de texto (smart_text_processing)
+
+Un mismo texto suele analizarse varias veces: el cliente llama a /analyze-text/
+y luego a /smart-generate/, o reintenta la misma petición. El resultado se
+guarda en un LRU acotado (en entradas y en caracteres) indexado por el hash del
+texto normalizado, y cada petición recibe su propia copia.
+"""
+
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from . import metrics, smart_text_processing
+from .config import TEXT_ANALYSIS_CACHE_ENTRIES, TEXT_ANALYSIS_CACHE_MAX_CHARS
+
+def normalize_for_analysis(text: str) -> str:
+    """Saltos de línea de cualquier sistema como '\\n' y sin espacios al principio ni al final"""
+    return text.replace('\r\n', '\n').replace('\r', '\n').strip()
+
+def analysis_key(text: str) -> str:
+    return hashlib.sha256(normalize_for_analysis(text).encode("utf-8")).hexdigest()
+
+class TextAnalysisMemo:
+    """LRU en memoria de resultados de smart_text_processing"""
+
+    def __init__(self, max_entries: int, max_chars: int):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.enabled = max_entries > 0 and max_chars > 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._total_chars = 0
+        self._lock = threading.Lock()
+
+    def analyze(self, text: str, source: str = "request") -> Dict[str, Any]:
+        """
+        Resultado de smart_text_processing para el texto normalizado
+
+        Args:
+            source: Origen del texto para las métricas ("request" o "batch")
+
+        Returns:
+            dict: Copia propia de {"analysis", "recommendations", "processed_text"}
+        """
+        text = normalize_for_analysis(text)
+        if not self.enabled:
+            return _observed(smart_text_processing(text), source)
+
+        key = analysis_key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.record_cache("text_analysis", True)
+                return _observed(copy.deepcopy(entry[0]), source)
+            self.misses += 1
+        metrics.record_cache("text_analysis", False)
+
+        # Analizar fuera del lock: otros textos no esperan a este
+        result = _observed(smart_text_processing(text), source)
+        size = len(text) + len(result["processed_text"])
+        if size <= self.max_chars:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = (copy.deepcopy(result), size)
+                    self._total_chars += size
+                    while len(self._entries) > self.max_entries or self._total_chars > self.max_chars:
+                        _, (_, evicted_size) = self._entries.popitem(last=False)
+                        self._total_chars -= evicted_size
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_chars = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas de uso del memo"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "chars": self._total_chars,
+                "max_entries": self.max_entries,
+                "max_chars": self.max_chars,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+def _observed(result: Dict[str, Any], source: str) -> Dict[str, Any]:
+    """Contar la longitud y el tipo de cada texto analizado (también los aciertos del memo)"""
+    analysis = result["analysis"]
+    metrics.record_text(len(analysis["text"]), analysis["type"], source)
+    return result
+
+# Memo compartido por todos los endpoints
+analysis_memo = TextAnalysisMemo(TEXT_ANALYSIS_CACHE_ENTRIES, TEXT_ANALYSIS_CACHE_MAX_CHARS)
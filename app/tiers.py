@@ -0,0 +1,107 @@
+"""
+Niveles de calidad/latencia de la generación
+
+Cada nivel fija los modelos (pequeños o grandes), la precisión, el KV
+caching, las temperaturas y la longitud de los segmentos. Con max_latency_ms se elige el
+mejor nivel cuya latencia estimada cabe en el plazo; la estimación usa el
+factor de tiempo real (RTF) observado en los jobs terminados de cada nivel.
+"""
+
+import threading
+from typing import Any, Dict, Optional
+
+from .config import SEGMENT_MAX_CHARS
+
+# De mejor a peor calidad (y de más lento a más rápido)
+TIERS: Dict[str, Dict[str, Any]] = {
+    "high": {
+        "small_models": False,
+        # Siempre los modelos en fp32 aunque el servidor use int8 o bf16 por defecto
+        "profile": "fp32",
+        "use_kv_caching": True,
+        # Muestreo más conservador: menos variación en la voz y la pronunciación
+        "text_temp": 0.6,
+        "waveform_temp": 0.5,
+        # Segmentos más cortos: Bark se desvía menos de la voz y del texto
+        "segment_max_chars": 150,
+    },
+    "standard": {
+        "small_models": False,
+        # None: el perfil de inferencia por defecto del servidor (BARK_INFERENCE_PROFILE)
+        "profile": None,
+        "use_kv_caching": True,
+        "text_temp": 0.7,
+        "waveform_temp": 0.7,
+        "segment_max_chars": SEGMENT_MAX_CHARS,
+    },
+    "draft": {
+        "small_models": True,
+        "profile": None,
+        "use_kv_caching": True,
+        "text_temp": 0.7,
+        "waveform_temp": 0.7,
+        # Más segmentos cortos en paralelo dentro del batch
+        "segment_max_chars": 120,
+    },
+}
+
+DEFAULT_TIER = "standard"
+
+# Velocidad media del habla de Bark para estimar la duración del audio
+CHARS_PER_AUDIO_SECOND = 15.0
+
+# RTF (segundos de cómputo por segundo de audio) inicial de cada nivel en CPU;
+# se ajusta con una media móvil de los jobs reales
+_rtf_estimates = {"high": 3.5, "standard": 3.0, "draft": 1.2}
+_rtf_lock = threading.Lock()
+RTF_SMOOTHING = 0.2
+
+def predict_latency_ms(text: str, tier: str) -> float:
+    """Latencia estimada (ms) para generar un texto con un nivel"""
+    audio_seconds = max(1.0, len(text.strip()) / CHARS_PER_AUDIO_SECOND)
+    return audio_seconds * _rtf_estimates[tier] * 1000
+
+def select_tier(requested: Optional[str], max_latency_ms: Optional[int], text: str) -> str:
+    """
+    Elegir el nivel de una petición
+
+    Sin plazo se usa el nivel pedido (o el estándar). Con plazo, el nivel pedido
+    (o "high" si no se pidió ninguno) es el máximo y se baja hasta el primero
+    cuya latencia estimada cabe en el plazo; si ninguno cabe, el más rápido.
+
+    Raises:
+        ValueError: Si el nivel no existe
+    """
+    if requested is not None and requested not in TIERS:
+        raise ValueError(f"Nivel de calidad desconocido: {requested}. Opciones: {', '.join(TIERS)}")
+    if max_latency_ms is None:
+        return requested or DEFAULT_TIER
+
+    candidates = list(TIERS)
+    if requested is not None:
+        candidates = candidates[candidates.index(requested):]
+    for tier in candidates:
+        if predict_latency_ms(text, tier) <= max_latency_ms:
+            return tier
+    return candidates[-1]
+
+def record_job_timing(tier: str, compute_seconds: float, audio_seconds: float):
+    """
+    Actualizar el RTF estimado de un nivel con un job terminado
+
+    compute_seconds es el cómputo atribuible al job: en un micro-batch, su parte
+    del tiempo de cada batch en el que entró, no la duración de todo el grupo.
+    """
+    if tier not in TIERS or not audio_seconds or compute_seconds <= 0:
+        return
+    with _rtf_lock:
+        rtf = compute_seconds / audio_seconds
+        _rtf_estimates[tier] += RTF_SMOOTHING * (rtf - _rtf_estimates[tier])
+
+def tier_info() -> Dict[str, Any]:
+    """Niveles disponibles con su configuración y RTF estimado"""
+    with _rtf_lock:
+        return {
+            name: {**settings, "estimated_rtf": round(_rtf_estimates[name], 3)}
+            for name, settings in TIERS.items()
+        }
@@ -0,0 +1,153 @@
+"""
+Formatos de salida comprimidos (Opus, MP3, FLAC) a partir del WAV generado
+
+El WAV de 16 bits a 24 kHz sigue siendo el archivo original. Las variantes en
+otros formatos (y, opcionalmente, a menor frecuencia de muestreo para
+telefonía) se codifican en un pool de hilos aparte, se guardan junto al WAV y
+se reutilizan en las siguientes descargas. La codificación usa libsndfile a
+través de soundfile, que se importa solo al codificar.
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from math import gcd
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy.io import wavfile
+from scipy.signal import resample_poly
+
+from .audio_utils import SAMPLE_RATE
+from .config import TRANSCODE_WORKERS
+
+# formato -> (extensión, tipo MIME, formato y subtipo de libsndfile)
+FORMATS: Dict[str, Tuple[str, str, Optional[str], Optional[str]]] = {
+    "wav": ("wav", "audio/wav", None, None),
+    "opus": ("opus", "audio/ogg", "OGG", "OPUS"),
+    "mp3": ("mp3", "audio/mpeg", "MP3", "MPEG_LAYER_III"),
+    "flac": ("flac", "audio/flac", "FLAC", "PCM_16"),
+}
+
+# Frecuencias a las que se puede bajar el audio (Opus solo admite estas)
+SAMPLE_RATES = (8000, 12000, 16000, SAMPLE_RATE)
+
+# Tipos MIME aceptados en la cabecera Accept
+_MEDIA_TYPES = {
+    "audio/wav": "wav", "audio/wave": "wav", "audio/x-wav": "wav",
+    "audio/ogg": "opus", "audio/opus": "opus",
+    "audio/mpeg": "mp3", "audio/mp3": "mp3",
+    "audio/flac": "flac", "audio/x-flac": "flac",
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_inflight: Dict[str, Future] = {}
+_lock = threading.Lock()
+
+def validate(output_format: Optional[str], sample_rate: Optional[int] = None):
+    """
+    Comprobar un formato y una frecuencia de salida
+
+    Raises:
+        ValueError: Si el formato o la frecuencia no están soportados
+    """
+    if output_format is not None and output_format not in FORMATS:
+        raise ValueError(f"Formato desconocido: {output_format}. Opciones: {', '.join(FORMATS)}")
+    if sample_rate is not None and sample_rate not in SAMPLE_RATES:
+        raise ValueError(
+            f"Frecuencia no soportada: {sample_rate}. Opciones: {', '.join(map(str, SAMPLE_RATES))}"
+        )
+
+def negotiate(accept: Optional[str]) -> str:
+    """Elegir el formato según la cabecera Accept (WAV si no pide ninguno soportado)"""
+    best, best_q = "wav", 0.0
+    for part in (accept or "").split(","):
+        media_type, _, params = part.strip().partition(";")
+        output_format = _MEDIA_TYPES.get(media_type.strip().lower())
+        if output_format is None:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = output_format, q
+    return best
+
+def media_type(output_format: str) -> str:
+    return FORMATS[output_format][1]
+
+def extension(output_format: str) -> str:
+    return FORMATS[output_format][0]
+
+def variant_path(wav_path: str, output_format: str, sample_rate: Optional[int] = None) -> str:
+    """Ruta de una variante junto al WAV (p. ej. <file_id>.opus o <file_id>.8000.mp3)"""
+    base = wav_path[:-len(".wav")] if wav_path.endswith(".wav") else wav_path
+    if sample_rate is not None and sample_rate != SAMPLE_RATE:
+        base = f"{base}.{sample_rate}"
+    return f"{base}.{extension(output_format)}"
+
+def ensure_variant(wav_path: str, output_format: str, sample_rate: Optional[int] = None) -> Future:
+    """
+    Codificar (en segundo plano) una variante del WAV si aún no existe
+
+    Returns:
+        Future: Se resuelve con la ruta de la variante
+    """
+    path = variant_path(wav_path, output_format, sample_rate)
+    if path == wav_path or os.path.exists(path):
+        future = Future()
+        future.set_result(path)
+        return future
+
+    global _executor
+    with _lock:
+        future = _inflight.get(path)
+        if future is not None:
+            # Otra petición ya la está codificando: esperar al mismo trabajo
+            return future
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TRANSCODE_WORKERS, thread_name_prefix="transcode")
+        future = _executor.submit(_encode, wav_path, path, output_format, sample_rate)
+        _inflight[path] = future
+    future.add_done_callback(lambda _: _forget(path))
+    return future
+
+def _forget(path: str):
+    with _lock:
+        _inflight.pop(path, None)
+
+def _encode(wav_path: str, path: str, output_format: str, sample_rate: Optional[int]) -> str:
+    """Leer el WAV, bajar la frecuencia si hace falta y escribir la variante"""
+    source_rate, pcm = wavfile.read(wav_path)
+    audio = pcm.astype(np.float32) / 32768.0
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+
+    target_rate = sample_rate or source_rate
+    if target_rate != source_rate:
+        divisor = gcd(target_rate, source_rate)
+        audio = resample_poly(audio, target_rate // divisor, source_rate // divisor).astype(np.float32)
+
+    # Escribir en un temporal y renombrar: nadie lee una variante a medias
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    _, _, sf_format, subtype = FORMATS[output_format]
+    try:
+        if sf_format is None:
+            wavfile.write(temp_path, target_rate, (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16))
+        else:
+            import soundfile  # libsndfile (Opus, MP3 y FLAC)
+            soundfile.write(temp_path, audio, target_rate, format=sf_format, subtype=subtype)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    print(f"🗜️ Variante {output_format} ({target_rate} Hz): "
+          f"{os.path.getsize(wav_path) / 1024:.0f}KB → {os.path.getsize(path) / 1024:.0f}KB")
+    return path
@@ -0,0 +1,136 @@
+"""
+Registro de voces (history prompts) de Bark
+
+Bark resuelve el preset "v2/xx_speaker_N" y lee su .npz de disco en cada
+etapa de cada generación. El registro descubre los presets disponibles una sola
+vez, carga sus arrays (semantic/coarse/fine) en memoria y los entrega ya
+cargados a la generación; también sirve la lista de /voices y permite rechazar
+voces desconocidas antes de tocar los modelos.
+"""
+
+import importlib.util
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .config import SYNTHESIS_BACKEND, VOICE_PROMPTS_DIR
+
+PROMPT_KEYS = ("semantic_prompt", "coarse_prompt", "fine_prompt")
+
+# Idiomas de los presets "v2/<idioma>_speaker_<0-9>" incluidos en Bark
+BARK_V2_LANGUAGES = ("en", "de", "es", "fr", "hi", "it", "ja", "ko", "pl", "pt", "ru", "tr", "zh")
+
+# Nombre de cada idioma en la respuesta de /voices (el resto va a "other_languages")
+_LANGUAGE_GROUPS = {"en": "english", "es": "spanish"}
+
+def _bark_prompts_dir() -> Optional[str]:
+    """Carpeta de presets incluida en el paquete de Bark (sin importar Bark ni torch)"""
+    spec = importlib.util.find_spec("bark")
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    return os.path.join(list(spec.submodule_search_locations)[0], "assets", "prompts")
+
+def _discover(directory: str) -> Dict[str, str]:
+    """Buscar presets (.npz) en una carpeta: {"v2/es_speaker_0": ruta, ...}"""
+    presets = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(".npz"):
+                continue
+            path = os.path.join(root, name)
+            voice = os.path.relpath(path, directory)[:-4].replace(os.sep, "/")
+            presets[voice] = path
+    return presets
+
+class VoiceRegistry:
+    """Presets de voz descubiertos en disco y cargados en memoria"""
+
+    def __init__(self, directories: List[str]):
+        self.directories = directories
+        self._prompts: Dict[str, Dict[str, np.ndarray]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Descubrir y cargar todos los presets (idempotente)"""
+        with self._lock:
+            if self._loaded:
+                return
+            started_at = time.time()
+            presets = {}
+            for directory in self.directories:
+                if directory and os.path.isdir(directory):
+                    presets.update(_discover(directory))
+
+            for voice, path in sorted(presets.items()):
+                try:
+                    with np.load(path) as data:
+                        prompt = {key: np.array(data[key]) for key in PROMPT_KEYS}
+                except (OSError, KeyError, ValueError) as e:
+                    print(f"⚠️ Preset de voz ignorado ({voice}): {e}")
+                    continue
+                for array in prompt.values():
+                    # Compartidos entre peticiones: nadie debe modificarlos
+                    array.setflags(write=False)
+                self._prompts[voice] = prompt
+
+            if SYNTHESIS_BACKEND == "fake":
+                # El backend "fake" no usa los prompts: aceptar los nombres de Bark aunque no esté instalado
+                for language in BARK_V2_LANGUAGES:
+                    for speaker in range(10):
+                        self._prompts.setdefault(f"v2/{language}_speaker_{speaker}", {})
+
+            self._loaded = True
+            print(f"🗣️ {len(self._prompts)} voces cargadas en memoria en {time.time() - started_at:.2f}s")
+
+    def __contains__(self, voice: str) -> bool:
+        self.load()
+        return voice in self._prompts
+
+    def names(self) -> List[str]:
+        """Nombres de todas las voces disponibles"""
+        self.load()
+        return sorted(self._prompts)
+
+    def get(self, voice: Optional[str]) -> Optional[Dict[str, np.ndarray]]:
+        """
+        History prompt en memoria de una voz (formato dict que acepta Bark)
+
+        Raises:
+            ValueError: Si la voz no existe
+        """
+        if voice is None:
+            return None
+        self.load()
+        try:
+            return self._prompts[voice]
+        except KeyError:
+            raise ValueError(f"Voz desconocida: {voice}")
+
+    def grouped(self) -> Dict[str, List[str]]:
+        """Voces agrupadas por idioma para /voices (los presets v2 primero)"""
+        groups: Dict[str, List[str]] = {"english": [], "spanish": [], "other_languages": []}
+        legacy = []
+        for voice in self.names():
+            if not voice.startswith("v2/"):
+                legacy.append(voice)
+                continue
+            language = voice[3:].split("_", 1)[0]
+            groups[_LANGUAGE_GROUPS.get(language, "other_languages")].append(voice)
+        if legacy:
+            groups["legacy"] = legacy
+        return groups
+
+    def stats(self) -> Dict[str, Any]:
+        """Número de voces y memoria ocupada por sus prompts"""
+        self.load()
+        return {
+            "voices": len(self._prompts),
+            "bytes": sum(array.nbytes for prompt in self._prompts.values() for array in prompt.values()),
+        }
+
+# Registro compartido: presets de Bark más los de BARK_VOICE_PROMPTS_DIR (si se define)
+voice_registry = VoiceRegistry([_bark_prompts_dir(), VOICE_PROMPTS_DIR])
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark de perfiles de inferencia de Bark (fp32, int8, bf16)
+
+Para cada perfil y cada texto mide la latencia de síntesis, el factor de tiempo
+real (RTF = segundos de cómputo / segundos de audio, menor es mejor) y la
+similitud del audio con el de fp32 generado con la misma semilla.
+
+Bark muestrea tokens, así que dos perfiles no producen la misma forma de onda;
+la similitud se mide sobre el espectro log-mel medio (timbre y contenido
+espectral, 1.0 = idéntico) y la relación de duraciones.
+
+Uso:
+    python benchmarks/bench_profiles.py
+    python benchmarks/bench_profiles.py --profiles fp32,int8 --repeat 3 --json resultados.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.signal import stft
+
+# Añadir la raíz del repositorio al path (igual que start.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.audio_utils import SAMPLE_RATE
+from app.config import INFERENCE_PROFILES
+
+DEFAULT_TEXTS = [
+    "Hola, esta es una prueba corta.",
+    "Desde el primer latido en tu corazón supe que Dios me hablaba en una canción.",
+    "Fuiste un milagro que bajó del cielo, mi pequeño sol, mi mayor anhelo, la luz de cada mañana.",
+]
+
+def _mel_filterbank(n_mels: int, n_fft: int, sample_rate: int) -> np.ndarray:
+    """Banco de filtros triangulares en escala mel (n_mels x (n_fft // 2 + 1))"""
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10 ** (mel / 2595.0) - 1.0)
+
+    mel_points = np.linspace(hz_to_mel(0), hz_to_mel(sample_rate / 2), n_mels + 2)
+    bins = np.floor((n_fft + 1) * mel_to_hz(mel_points) / sample_rate).astype(int)
+    filters = np.zeros((n_mels, n_fft // 2 + 1))
+    for m in range(1, n_mels + 1):
+        left, center, right = bins[m - 1], bins[m], bins[m + 1]
+        for k in range(left, center):
+            filters[m - 1, k] = (k - left) / max(1, center - left)
+        for k in range(center, right):
+            filters[m - 1, k] = (right - k) / max(1, right - center)
+    return filters
+
+def mean_log_mel(audio: np.ndarray, n_mels: int = 64, n_fft: int = 1024) -> np.ndarray:
+    """Espectro log-mel medio de un audio"""
+    _, _, spectrum = stft(audio, fs=SAMPLE_RATE, nperseg=n_fft)
+    power = np.abs(spectrum) ** 2
+    mel = _mel_filterbank(n_mels, n_fft, SAMPLE_RATE) @ power
+    return np.log(mel + 1e-10).mean(axis=1)
+
+def spectral_similarity(audio: np.ndarray, reference: np.ndarray) -> float:
+    """Similitud coseno entre los espectros log-mel medios (centrados) de dos audios"""
+    a = mean_log_mel(audio)
+    b = mean_log_mel(reference)
+    a = a - a.mean()
+    b = b - b.mean()
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-10))
+
+def run(profiles, texts, voice: str, seed: int, repeat: int):
+    from app import bark_utils, model_loader
+
+    print("⏳ Cargando modelos...")
+    model_loader.ensure_all_stages()
+
+    results = []
+    references = {}
+    for profile in profiles:
+        if profile == "bf16" and not bark_utils.bf16_supported():
+            print("⚠️ La CPU no soporta bfloat16 nativo: bf16 se ejecutará como fp32")
+        bark_utils.prepare_profile(profile)
+        # Calentamiento del perfil (no se mide)
+        bark_utils.synthesize(texts[0], voice, seed=seed, profile=profile)
+
+        for text in texts:
+            latencies = []
+            for _ in range(repeat):
+                started_at = time.perf_counter()
+                audio = bark_utils.synthesize(text, voice, seed=seed, profile=profile)
+                latencies.append(time.perf_counter() - started_at)
+
+            audio_seconds = len(audio) / SAMPLE_RATE
+            latency = float(np.median(latencies))
+            if profile == "fp32":
+                references[text] = audio
+            reference = references.get(text)
+            results.append({
+                "profile": profile,
+                "text": text,
+                "latency_s": latency,
+                "audio_s": audio_seconds,
+                "rtf": latency / audio_seconds if audio_seconds else None,
+                "similarity_vs_fp32": spectral_similarity(audio, reference) if reference is not None else None,
+                "duration_ratio_vs_fp32": audio_seconds / (len(reference) / SAMPLE_RATE) if reference is not None else None,
+            })
+    return results
+
+def print_table(results):
+    print()
+    print(f"{'perfil':<7} {'latencia':>9} {'audio':>7} {'RTF':>6} {'similitud':>10} {'duración':>9}  texto")
+    for row in results:
+        similarity = f"{row['similarity_vs_fp32']:.3f}" if row["similarity_vs_fp32"] is not None else "-"
+        duration = f"{row['duration_ratio_vs_fp32']:.2f}" if row["duration_ratio_vs_fp32"] is not None else "-"
+        rtf = f"{row['rtf']:.2f}" if row["rtf"] is not None else "-"
+        print(f"{row['profile']:<7} {row['latency_s']:>8.2f}s {row['audio_s']:>6.1f}s {rtf:>6} "
+              f"{similarity:>10} {duration:>9}  {row['text'][:40]}")
+
+    print()
+    for profile in dict.fromkeys(row["profile"] for row in results):
+        rows = [row for row in results if row["profile"] == profile]
+        total_latency = sum(row["latency_s"] for row in rows)
+        total_audio = sum(row["audio_s"] for row in rows)
+        print(f"📊 {profile}: RTF global {total_latency / total_audio:.2f} "
+              f"({total_audio / total_latency:.2f} s de audio por segundo)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de perfiles de inferencia de Bark")
+    parser.add_argument("--profiles", default=",".join(INFERENCE_PROFILES),
+                        help="Perfiles separados por comas (fp32 siempre se incluye como referencia)")
+    parser.add_argument("--text", action="append", dest="texts", help="Texto a sintetizar (repetible)")
+    parser.add_argument("--voice", default="v2/es_speaker_0")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--repeat", type=int, default=1, help="Repeticiones por texto (se usa la mediana)")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo JSON")
+    args = parser.parse_args(argv)
+
+    profiles = [profile.strip() for profile in args.profiles.split(",") if profile.strip()]
+    unknown = [profile for profile in profiles if profile not in INFERENCE_PROFILES]
+    if unknown:
+        parser.error(f"Perfiles desconocidos: {', '.join(unknown)}")
+    # fp32 primero: es la referencia de similitud
+    profiles = ["fp32"] + [profile for profile in profiles if profile != "fp32"]
+
+    results = run(profiles, args.texts or DEFAULT_TEXTS, args.voice, args.seed, args.repeat)
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados guardados en {args.json}")
+
+if __name__ == "__main__":
+    main()
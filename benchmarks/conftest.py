@@ -0,0 +1,66 @@
+"""
+Datos compartidos por los microbenchmarks (pytest-benchmark)
+
+El corpus de data/lyrics_bench.json tiene textos cortos y medianos; el texto
+de tamaño libro se construye aquí encadenando los medianos (con las estrofas
+numeradas para que no sean todas idénticas) hasta BOOK_LINES líneas.
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Añadir la raíz del repositorio al path (igual que start.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.audio_utils import SAMPLE_RATE
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "lyrics_bench.json")
+
+# Líneas del texto de tamaño libro (~150 páginas de letras)
+BOOK_LINES = 5000
+
+with open(CORPUS_PATH, encoding="utf-8") as f:
+    _CORPUS = json.load(f)
+
+def _book_text() -> str:
+    stanzas = [entry["text"] for entry in _CORPUS["medium"]]
+    lines = []
+    part = 0
+    while len(lines) < BOOK_LINES:
+        part += 1
+        lines.append(f"Parte {part}")
+        lines.extend(stanzas[part % len(stanzas)].split("\n"))
+        lines.append("")
+    return "\n".join(lines[:BOOK_LINES])
+
+# tamaño -> texto representativo (una canción corta y una mediana del corpus)
+TEXTS = {
+    "short": _CORPUS["short"][1]["text"],
+    "medium": _CORPUS["medium"][0]["text"],
+    "book": _book_text(),
+}
+
+# Duraciones (segundos) de los audios sintéticos
+AUDIO_SECONDS = (5, 60)
+
+def pytest_report_header(config):
+    sizes = ", ".join(f"{name}={len(text)} caracteres" for name, text in TEXTS.items())
+    return f"corpus de benchmarks: {sizes}"
+
+@pytest.fixture(params=list(TEXTS), ids=list(TEXTS))
+def text(request):
+    """Texto del corpus de cada tamaño"""
+    return TEXTS[request.param]
+
+@pytest.fixture(params=AUDIO_SECONDS, ids=[f"{seconds}s" for seconds in AUDIO_SECONDS])
+def audio(request):
+    """Audio sintético float32 como el que devuelve el codec de Bark (pico < 1)"""
+    rng = np.random.default_rng(1234)
+    samples = request.param * SAMPLE_RATE
+    t = np.arange(samples, dtype=np.float32) / SAMPLE_RATE
+    tone = 0.3 * np.sin(2 * np.pi * 220.0 * t)
+    return (tone + 0.05 * rng.standard_normal(samples)).astype(np.float32)
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Generador de carga HTTP para la API (asyncio + httpx)
+
+Reproduce una mezcla configurable de peticiones a /analyze-text/,
+/smart-generate/, /generate/ y /download/{file_id} con una concurrencia fija
+(cada cliente lanza la siguiente petición al terminar la anterior) o con una
+tasa de llegadas (Poisson, sin esperar a las respuestas), y mide por endpoint:
+
+- latencia p50/p95/p99 (hasta recibir el cuerpo completo)
+- tiempo hasta el primer byte del cuerpo (TTFB)
+- tasa de errores (excepciones o respuestas que no son 2xx)
+- segundos de audio generados por segundo de prueba
+
+Los textos salen de benchmarks/data/lyrics_bench.json. Las descargas usan los
+file_id que devuelven las generaciones de la propia prueba. Con el backend
+fake (make fake) se prueba el servidor sin cargar los modelos.
+
+Uso:
+    python benchmarks/loadgen.py --concurrency 8 --duration 30
+    python benchmarks/loadgen.py --rate 20 --mix analyze=6,smart=2,generate=1,download=1
+    python benchmarks/loadgen.py --json nuevo.json --compare anterior.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import struct
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "lyrics_bench.json")
+
+# endpoint -> (método, ruta)
+ENDPOINTS = {
+    "analyze": ("POST", "/analyze-text/"),
+    "smart": ("POST", "/smart-generate/"),
+    "generate": ("POST", "/generate/"),
+    "download": ("GET", "/download/{file_id}"),
+}
+
+DEFAULT_MIX = "analyze=5,smart=2,generate=2,download=1"
+
+# Cabecera de un WAV PCM sin chunks extra (la que escribe scipy)
+WAV_HEADER_BYTES = 44
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """
+    Leer la mezcla de endpoints ("analyze=5,generate=1")
+
+    Raises:
+        ValueError: Si un endpoint no existe o un peso no es válido
+    """
+    weights = {}
+    for part in mix.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Endpoint desconocido: {name}. Opciones: {', '.join(ENDPOINTS)}")
+        try:
+            weights[name] = float(weight) if weight.strip() else 1.0
+        except ValueError:
+            raise ValueError(f"Peso no válido para {name}: {weight}")
+        if weights[name] < 0:
+            raise ValueError(f"Peso negativo para {name}: {weight}")
+    if not weights or sum(weights.values()) <= 0:
+        raise ValueError("La mezcla no tiene ningún endpoint con peso")
+    return weights
+
+def load_texts() -> List[str]:
+    """Textos cortos y medianos del corpus de benchmarks"""
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        corpus = json.load(f)
+    return [entry["text"] for size in ("short", "medium") for entry in corpus[size]]
+
+def wav_seconds(header: bytes, total_bytes: int) -> float:
+    """Duración de un WAV PCM a partir de su cabecera y su tamaño (0 si no es un WAV)"""
+    if len(header) < WAV_HEADER_BYTES or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return 0.0
+    channels, sample_rate = struct.unpack("<HI", header[22:28])
+    bits = struct.unpack("<H", header[34:36])[0]
+    bytes_per_second = sample_rate * channels * bits // 8
+    if not bytes_per_second:
+        return 0.0
+    return max(0, total_bytes - WAV_HEADER_BYTES) / bytes_per_second
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Percentil (interpolación lineal, como numpy) o None si no hay valores"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+class LoadTest:
+    """Una ejecución de la prueba de carga: genera las peticiones y guarda las muestras"""
+
+    def __init__(self, base_url: str, weights: Dict[str, float], texts: List[str],
+                 voice: Optional[str], unique: bool, timeout: float, seed: int):
+        self.base_url = base_url.rstrip("/")
+        self.names = list(weights)
+        self.weights = [weights[name] for name in self.names]
+        self.texts = texts
+        self.voice = voice
+        self.unique = unique
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.file_ids: List[str] = []
+        self.samples: List[Dict[str, Any]] = []
+        self.recording = False
+        self._counter = 0
+
+    def _next_text(self) -> str:
+        text = self.random.choice(self.texts)
+        if self.unique:
+            # Una línea distinta en cada petición: no hay aciertos del cache de resultados
+            self._counter += 1
+            text = f"{text}\nToma número {self._counter}"
+        return text
+
+    def _build(self, name: str) -> Optional[Dict[str, Any]]:
+        method, path = ENDPOINTS[name]
+        if name == "download":
+            if not self.file_ids:
+                return None
+            return {"method": method, "url": path.format(file_id=self.random.choice(self.file_ids))}
+        body = {"text": self._next_text()}
+        if self.voice:
+            body["voice"] = self.voice
+        return {"method": method, "url": path, "json": body}
+
+    async def request(self, client: httpx.AsyncClient, name: Optional[str] = None):
+        """Lanzar una petición (de la mezcla si no se indica el endpoint) y guardar su muestra"""
+        name = name or self.random.choices(self.names, self.weights)[0]
+        spec = self._build(name)
+        if spec is None:
+            # Aún no hay nada que descargar: analizar en su lugar
+            name = "analyze"
+            spec = self._build(name)
+
+        sample = {"endpoint": name, "ok": False, "status": None, "latency": None, "ttfb": None,
+                  "bytes": 0, "audio_seconds": 0.0, "error": None}
+        started_at = time.perf_counter()
+        body = b""
+        try:
+            async with client.stream(spec["method"], spec["url"], json=spec.get("json")) as response:
+                sample["status"] = response.status_code
+                async for chunk in response.aiter_bytes():
+                    if sample["ttfb"] is None:
+                        sample["ttfb"] = time.perf_counter() - started_at
+                    # Del audio basta la cabecera; de las respuestas JSON, todo
+                    if name in ("analyze", "smart") or len(body) < WAV_HEADER_BYTES:
+                        body += chunk
+                    sample["bytes"] += len(chunk)
+                sample["latency"] = time.perf_counter() - started_at
+                if sample["ttfb"] is None:
+                    sample["ttfb"] = sample["latency"]
+                sample["ok"] = 200 <= response.status_code < 300
+                if not sample["ok"]:
+                    sample["error"] = f"HTTP {response.status_code}"
+                elif name == "generate":
+                    sample["audio_seconds"] = wav_seconds(body, sample["bytes"])
+                    self._remember(_file_id_from_disposition(response.headers.get("content-disposition")))
+        except httpx.HTTPError as e:
+            sample["latency"] = time.perf_counter() - started_at
+            sample["error"] = type(e).__name__
+
+        if sample["ok"] and name == "smart":
+            # La respuesta solo trae el file_id: la duración sale de la cabecera y
+            # el tamaño del WAV (petición Range aparte, no cuenta en la latencia)
+            file_id = _json_field(body, "file_id")
+            self._remember(file_id)
+            if file_id:
+                sample["audio_seconds"] = await self._audio_seconds(client, file_id)
+
+        if self.recording:
+            self.samples.append(sample)
+        return sample
+
+    def _remember(self, file_id: Optional[str]):
+        if file_id and file_id not in self.file_ids:
+            self.file_ids.append(file_id)
+
+    async def _audio_seconds(self, client: httpx.AsyncClient, file_id: str) -> float:
+        try:
+            response = await client.get(f"/download/{file_id}", params={"format": "wav"},
+                                        headers={"Range": f"bytes=0-{WAV_HEADER_BYTES - 1}"})
+        except httpx.HTTPError:
+            return 0.0
+        # Content-Range: bytes 0-43/<tamaño total>
+        total = response.headers.get("content-range", "").rpartition("/")[2]
+        if response.status_code != 206 or not total.isdigit():
+            return 0.0
+        return wav_seconds(response.content, int(total))
+
+    def client(self, max_connections: int) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        return httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits)
+
+    async def warmup(self, client: httpx.AsyncClient, requests: int):
+        """Peticiones sin medir (y al menos un file_id si la mezcla descarga)"""
+        for _ in range(requests):
+            await self.request(client)
+        if "download" in self.names and not self.file_ids:
+            await self.request(client, "smart")
+
+    async def run_concurrency(self, client: httpx.AsyncClient, concurrency: int,
+                              duration: Optional[float], total: Optional[int]):
+        """Bucle cerrado: `concurrency` clientes, cada uno lanza otra petición al terminar"""
+        deadline = time.perf_counter() + duration if duration else None
+        remaining = [total]
+
+        async def worker():
+            while True:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                if remaining[0] is not None:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                await self.request(client)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def run_rate(self, client: httpx.AsyncClient, rate: float,
+                       duration: Optional[float], total: Optional[int]):
+        """Bucle abierto: llegadas de Poisson a `rate` peticiones/s sin esperar respuestas"""
+        started_at = time.perf_counter()
+        next_at = started_at
+        tasks = []
+        while True:
+            if total is not None and len(tasks) >= total:
+                break
+            next_at += self.random.expovariate(rate)
+            if duration and next_at - started_at >= duration:
+                break
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            tasks.append(asyncio.ensure_future(self.request(client)))
+        await asyncio.gather(*tasks)
+
+def _file_id_from_disposition(disposition: Optional[str]) -> Optional[str]:
+    """file_id del nombre de archivo de /generate/ (bark_<tipo>_<file_id>.<ext>)"""
+    if not disposition or "filename=" not in disposition:
+        return None
+    filename = disposition.split("filename=", 1)[1].strip('"; ')
+    stem = filename.rsplit(".", 1)[0]
+    return stem.rsplit("_", 1)[-1] or None
+
+def _json_field(body: bytes, field: str) -> Optional[Any]:
+    try:
+        return json.loads(body).get(field)
+    except (ValueError, AttributeError):
+        return None
+
+def summarize(samples: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """Estadísticas de un conjunto de muestras"""
+    latencies = [s["latency"] for s in samples if s["ok"]]
+    ttfbs = [s["ttfb"] for s in samples if s["ok"]]
+    errors = [s for s in samples if not s["ok"]]
+    audio_seconds = sum(s["audio_seconds"] for s in samples)
+    error_kinds: Dict[str, int] = {}
+    for sample in errors:
+        error_kinds[sample["error"]] = error_kinds.get(sample["error"], 0) + 1
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        "requests": len(samples),
+        "errors": len(errors),
+        "error_rate": len(errors) / len(samples) if samples else 0.0,
+        "error_kinds": error_kinds,
+        "requests_per_second": len(samples) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "max": ms(max(latencies)) if latencies else None,
+        },
+        "ttfb_ms": {
+            "p50": ms(percentile(ttfbs, 50)),
+            "p95": ms(percentile(ttfbs, 95)),
+            "p99": ms(percentile(ttfbs, 99)),
+        },
+        "bytes": sum(s["bytes"] for s in samples),
+        "audio_seconds": round(audio_seconds, 3),
+        "audio_seconds_per_second": audio_seconds / elapsed if elapsed else 0.0,
+    }
+
+def report(test: LoadTest, elapsed: float, config: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "config": config,
+        "started_at": config.get("started_at"),
+        "elapsed_seconds": round(elapsed, 3),
+        "overall": summarize(test.samples, elapsed),
+        "endpoints": {
+            name: summarize([s for s in test.samples if s["endpoint"] == name], elapsed)
+            for name in dict.fromkeys(s["endpoint"] for s in test.samples)
+        },
+    }
+
+def _fmt(value, suffix="") -> str:
+    return f"{value:.0f}{suffix}" if value is not None else "-"
+
+def print_report(result: Dict[str, Any]):
+    print()
+    print(f"{'endpoint':<10} {'peticiones':>10} {'errores':>8} {'req/s':>7} "
+          f"{'p50':>8} {'p95':>8} {'p99':>8} {'TTFB p50':>9} {'TTFB p95':>9} {'audio/s':>8}")
+    rows = list(result["endpoints"].items()) + [("total", result["overall"])]
+    for name, stats in rows:
+        latency, ttfb = stats["latency_ms"], stats["ttfb_ms"]
+        print(f"{name:<10} {stats['requests']:>10} {stats['error_rate']:>7.1%} {stats['requests_per_second']:>7.2f} "
+              f"{_fmt(latency['p50'], 'ms'):>8} {_fmt(latency['p95'], 'ms'):>8} {_fmt(latency['p99'], 'ms'):>8} "
+              f"{_fmt(ttfb['p50'], 'ms'):>9} {_fmt(ttfb['p95'], 'ms'):>9} {stats['audio_seconds_per_second']:>8.2f}")
+    overall = result["overall"]
+    print()
+    print(f"📊 {overall['requests']} peticiones en {result['elapsed_seconds']:.1f}s, "
+          f"{overall['audio_seconds']:.1f}s de audio ({overall['audio_seconds_per_second']:.2f} s de audio por segundo)")
+    if overall["error_kinds"]:
+        kinds = ", ".join(f"{kind}: {count}" for kind, count in overall["error_kinds"].items())
+        print(f"⚠️ Errores: {kinds}")
+
+def print_comparison(result: Dict[str, Any], previous: Dict[str, Any]):
+    """Diferencias con una ejecución anterior guardada con --json"""
+    print()
+    print(f"🔁 Comparación con {previous['config'].get('started_at', 'la ejecución anterior')}:")
+    rows = [("total", result["overall"], previous["overall"])] + [
+        (name, stats, previous["endpoints"][name])
+        for name, stats in result["endpoints"].items() if name in previous.get("endpoints", {})
+    ]
+    for name, stats, before in rows:
+        changes = []
+        for label, key, sub in (("p50", "latency_ms", "p50"), ("p95", "latency_ms", "p95"),
+                                ("p99", "latency_ms", "p99"), ("TTFB p50", "ttfb_ms", "p50")):
+            now, then = stats[key][sub], before[key][sub]
+            if now is not None and then:
+                changes.append(f"{label} {(now - then) / then:+.0%}")
+        if before["requests_per_second"]:
+            changes.append(f"req/s {(stats['requests_per_second'] - before['requests_per_second']) / before['requests_per_second']:+.0%}")
+        changes.append(f"errores {stats['error_rate']:.1%} (antes {before['error_rate']:.1%})")
+        print(f"   {name:<10} " + ", ".join(changes))
+
+async def run(args, weights: Dict[str, float]) -> Dict[str, Any]:
+    test = LoadTest(args.url, weights, load_texts(), args.voice, args.unique, args.timeout, args.seed)
+    max_connections = args.concurrency if args.rate is None else max(args.concurrency, 100)
+    async with test.client(max_connections) as client:
+        try:
+            response = await client.get("/ready")
+        except httpx.HTTPError as e:
+            raise SystemExit(f"❌ No se puede conectar con {args.url}: {e}")
+        if response.status_code != 200 and any(name != "analyze" for name in weights):
+            print("⚠️ El servidor aún no está listo para generar audio (GET /ready != 200)")
+
+        if args.warmup:
+            print(f"🔥 Calentamiento: {args.warmup} peticiones...")
+        await test.warmup(client, args.warmup)
+
+        mode = f"tasa {args.rate}/s" if args.rate is not None else f"concurrencia {args.concurrency}"
+        limit = f"{args.requests} peticiones" if args.requests else f"{args.duration:.0f}s"
+        print(f"🚀 Carga contra {args.url}: {mode}, {limit}, mezcla {args.mix}")
+        config = {
+            "url": args.url, "mix": weights, "concurrency": args.concurrency, "rate": args.rate,
+            "duration": args.duration, "requests": args.requests, "unique": args.unique,
+            "voice": args.voice, "seed": args.seed,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        test.recording = True
+        started_at = time.perf_counter()
+        duration = None if args.requests else args.duration
+        if args.rate is not None:
+            await test.run_rate(client, args.rate, duration, args.requests)
+        else:
+            await test.run_concurrency(client, args.concurrency, duration, args.requests)
+        elapsed = time.perf_counter() - started_at
+    return report(test, elapsed, config)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga HTTP de la API de Bark")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help=f"Pesos de cada endpoint ({', '.join(ENDPOINTS)}); por defecto {DEFAULT_MIX}")
+    parser.add_argument("--concurrency", type=int, default=4, help="Clientes simultáneos (bucle cerrado)")
+    parser.add_argument("--rate", type=float, help="Peticiones por segundo (bucle abierto; ignora --concurrency)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Segundos de prueba")
+    parser.add_argument("--requests", type=int, help="Número de peticiones (en lugar de --duration)")
+    parser.add_argument("--warmup", type=int, default=0, help="Peticiones de calentamiento sin medir")
+    parser.add_argument("--unique", action="store_true",
+                        help="Textos distintos en cada petición (sin aciertos del cache de resultados)")
+    parser.add_argument("--voice", help="Voz de las generaciones (por defecto la del servidor)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Timeout por petición (segundos)")
+    parser.add_argument("--seed", type=int, default=1234, help="Semilla de la mezcla y de los textos")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo JSON")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior con el que comparar")
+    args = parser.parse_args(argv)
+
+    try:
+        weights = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.concurrency < 1:
+        parser.error("--concurrency debe ser al menos 1")
+    if args.rate is not None and args.rate <= 0:
+        parser.error("--rate debe ser mayor que 0")
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+
+    result = asyncio.run(run(args, weights))
+    print_report(result)
+    if previous is not None:
+        print_comparison(result, previous)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados guardados en {args.json}")
+
+    # Código de salida distinto de cero si todo falló (útil en scripts)
+    if result["overall"]["requests"] and result["overall"]["errors"] == result["overall"]["requests"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Microbenchmarks del post-procesado de audio (normalización, PCM de 16 bits y WAV)
+
+Es el camino de bark_utils.save_audio (que delega en write_wav_file) sobre
+arrays sintéticos, más la unión de segmentos con crossfade; no necesita los
+modelos de Bark.
+"""
+
+import numpy as np
+
+from app.audio_utils import SAMPLE_RATE, join_segments, normalize_audio, to_int16, write_wav_file
+
+def test_normalize_audio(benchmark, audio):
+    result = benchmark(normalize_audio, audio)
+    assert np.abs(result).max() <= 1.0
+
+def test_to_int16(benchmark, audio):
+    normalized = normalize_audio(audio)
+    assert benchmark(to_int16, normalized).dtype == np.int16
+
+def test_write_wav_file(benchmark, audio, tmp_path):
+    output_file = str(tmp_path / "bench.wav")
+    duration = benchmark(write_wav_file, audio, output_file)
+    assert duration == len(audio) / SAMPLE_RATE
+
+def test_join_segments(benchmark, audio):
+    # Segmentos de ~8 s, como los de un texto largo dividido por frases
+    segments = np.array_split(audio, max(1, len(audio) // (8 * SAMPLE_RATE)))
+    assert len(benchmark(join_segments, segments)) > 0
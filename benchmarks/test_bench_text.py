@@ -0,0 +1,31 @@
+"""
+Microbenchmarks del análisis de texto (detección, procesado y tokens musicales)
+
+Se miden las funciones puras de app, sin la caché de análisis de
+app.text_analysis: cada ronda analiza el texto desde cero.
+
+Uso:
+    make bench             # comparar con la última línea base guardada
+    make bench-baseline    # guardar una nueva línea base
+"""
+
+import pytest
+
+from app import _process_song_text, detect_text_type, smart_text_processing
+from app.main import _prepare_music_text
+
+def test_detect_text_type(benchmark, text):
+    result = benchmark(detect_text_type, text)
+    assert result["type"] in ("song", "poem", "narrative", "text")
+
+def test_smart_text_processing(benchmark, text):
+    result = benchmark(smart_text_processing, text)
+    assert result["processed_text"]
+
+def test_process_song_text(benchmark, text):
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    assert benchmark(_process_song_text, lines, text)
+
+@pytest.mark.parametrize("music_style", ["melody", "upbeat", "background", "calm"])
+def test_prepare_music_text(benchmark, text, music_style):
+    assert benchmark(_prepare_music_text, text, True, music_style)
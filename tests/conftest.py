@@ -0,0 +1,52 @@
+"""
+Entorno de los tests: backend "fake" (audio determinista, sin modelos) y los
+archivos generados en una carpeta temporal
+
+Las variables se fijan aquí porque app.config las lee al importarse (al recoger
+los tests); con la latencia del backend casi a cero la cola se vacía en
+milisegundos.
+"""
+
+import os
+import tempfile
+import uuid
+
+import pytest
+
+os.environ.setdefault("BARK_BACKEND", "fake")
+os.environ.setdefault("BARK_AUDIO_DIR", tempfile.mkdtemp(prefix="bark-tests-"))
+os.environ.setdefault("BARK_FAKE_RTF", "0.001")
+os.environ.setdefault("BARK_FAKE_OVERHEAD_MS", "1")
+os.environ.setdefault("BARK_PRELOAD_MODELS", "0")
+
+from app import backends, inference  # noqa: E402
+
+class CountingBackend(backends.FakeBackend):
+    """FakeBackend que apunta cada texto sintetizado y el tamaño de cada batch"""
+
+    def __init__(self):
+        super().__init__()
+        self.texts = []
+        self.batches = []
+
+    def synthesize_batch(self, items):
+        self.texts.extend(item["text"] for item in items)
+        self.batches.append(len(items))
+        return super().synthesize_batch(items)
+
+@pytest.fixture
+def backend(monkeypatch):
+    """El backend que usará el worker de inferencia en este test"""
+    counting = CountingBackend()
+    monkeypatch.setattr(backends, "_backend", counting)
+    return counting
+
+@pytest.fixture
+def unique():
+    """Sufijo para que los textos de un test no acierten en los caches de otro"""
+    return uuid.uuid4().hex[:8]
+
+@pytest.fixture
+def batch_window(monkeypatch):
+    """Ventana de batching amplia: los jobs enviados seguidos van al mismo micro-batch"""
+    monkeypatch.setattr(inference, "BATCH_MAX_WAIT_MS", 300)
@@ -0,0 +1,62 @@
+"""
+Control de admisión: 429 con Retry-After con la cola llena, sin bloquear los endpoints ligeros
+"""
+
+from collections import OrderedDict
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import inference
+from app.main import app
+
+@pytest.fixture
+def full_queue(monkeypatch):
+    """Cola con dos jobs de 30 s y máximo de dos jobs (sin pasar por el worker)"""
+    monkeypatch.setattr(inference, "_queued", OrderedDict([("a", 30.0), ("b", 30.0)]))
+    monkeypatch.setattr(inference, "_running", {})
+    monkeypatch.setattr(inference, "QUEUE_MAX_JOBS", 2)
+
+def test_check_admission_estimates_retry_after(full_queue):
+    with pytest.raises(inference.QueueFull) as error:
+        inference.check_admission(10.0)
+    # Hay sitio cuando el worker empiece el primer job de la cola
+    assert error.value.retry_after == 30
+    assert error.value.queued_jobs == 2
+
+def test_empty_queue_always_admits(monkeypatch):
+    monkeypatch.setattr(inference, "_queued", OrderedDict())
+    monkeypatch.setattr(inference, "QUEUE_MAX_SECONDS", 1)
+    inference.check_admission(3600.0, jobs=500)
+
+def test_generation_is_rejected_but_light_endpoints_answer(full_queue):
+    client = TestClient(app)
+
+    response = client.post("/jobs", json={"text": "Hola mundo"})
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+    response = client.post("/paste-text-body/", content="Hola mundo", headers={"Content-Type": "text/plain"})
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+    response = client.post("/generate-batch/", json={"items": [{"text": "Uno"}, {"text": "Dos"}]})
+    assert response.status_code == 429
+
+    assert client.get("/health").json()["generation_queue"]["queued_jobs"] == 2
+    assert client.post("/analyze-text/", json={"text": "Hola mundo"}).status_code == 200
+    assert client.get("/voices").status_code == 200
+    assert client.get("/download/no-existe").status_code == 404
+
+def test_generation_checks_admission_once(backend, unique, monkeypatch):
+    checks = []
+    check = inference._check_admission
+
+    def counting_check(cost, jobs):
+        checks.append(cost)
+        return check(cost, jobs)
+
+    monkeypatch.setattr(inference, "_check_admission", counting_check)
+    response = TestClient(app).post("/jobs", json={"text": f"Una sola comprobación {unique}"})
+    assert response.status_code == 202
+    assert len(checks) == 1
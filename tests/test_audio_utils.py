@@ -0,0 +1,39 @@
+"""
+Unión de segmentos y escritura de WAV
+"""
+
+import numpy as np
+import pytest
+
+from app.audio_utils import SAMPLE_RATE, iter_joined_segments, join_segments, wav_duration, write_wav_file
+
+def _tone(seconds, frequency=220.0):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+def test_join_adds_a_gap_between_segments():
+    segments = [_tone(0.5), _tone(0.25, 330.0)]
+    joined = join_segments(segments, gap_ms=200, crossfade_ms=20)
+    assert len(joined) == len(segments[0]) + int(0.2 * SAMPLE_RATE) + len(segments[1])
+    assert np.max(np.abs(joined)) <= 1.0
+
+def test_crossfade_without_gap_overlaps_segments():
+    segments = [_tone(0.5), _tone(0.5, 330.0)]
+    joined = join_segments(segments, gap_ms=0, crossfade_ms=20)
+    assert len(joined) == 2 * len(segments[0]) - int(0.02 * SAMPLE_RATE)
+
+def test_incremental_join_matches_join_segments():
+    segments = [_tone(0.3), _tone(0.4, 330.0), _tone(0.2, 440.0)]
+    incremental = np.concatenate(list(iter_joined_segments(segments)))
+    np.testing.assert_array_equal(incremental, join_segments(segments))
+
+def test_single_and_empty_inputs():
+    segment = _tone(0.3)
+    # Un solo segmento solo se normaliza (y se funde al final): misma duración
+    assert len(join_segments([segment])) == len(segment)
+    assert len(join_segments([])) == 0
+
+def test_wav_duration_reads_the_header(tmp_path):
+    path = str(tmp_path / "tono.wav")
+    assert write_wav_file(_tone(1.5), path) == pytest.approx(1.5)
+    assert wav_duration(path) == pytest.approx(1.5)
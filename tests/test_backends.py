@@ -0,0 +1,30 @@
+"""
+Backend fake: audio determinista con la duración del habla de Bark
+"""
+
+import numpy as np
+import pytest
+
+from app import backends
+from app.audio_utils import SAMPLE_RATE
+from app.tiers import CHARS_PER_AUDIO_SECOND
+
+def test_tests_run_with_the_fake_backend():
+    assert backends.get_backend().name == "fake"
+
+def test_fake_audio_is_deterministic():
+    backend = backends.FakeBackend(rtf=0, overhead_ms=0)
+    first = backend.synthesize("Hola mundo", "v2/es_speaker_0")
+    np.testing.assert_array_equal(first, backend.synthesize("Hola mundo", "v2/es_speaker_0"))
+    assert first.dtype == np.float32
+    assert not np.array_equal(first, backend.synthesize("Hola mundo", "v2/es_speaker_1"))
+    assert not np.array_equal(first, backend.synthesize("Hola mundo", "v2/es_speaker_0", seed=3))
+
+def test_fake_batch_matches_single_calls():
+    backend = backends.FakeBackend(rtf=0, overhead_ms=0)
+    items = [{"text": "Primera frase", "voice": "v2/es_speaker_0"},
+             {"text": "Una frase bastante más larga que la primera", "voice": "v2/es_speaker_6"}]
+    for item, audio in zip(items, backend.synthesize_batch(items)):
+        np.testing.assert_array_equal(audio, backend.synthesize(**item))
+        expected = max(0.5, len(item["text"]) / CHARS_PER_AUDIO_SECOND)
+        assert len(audio) / SAMPLE_RATE == pytest.approx(expected, abs=1 / SAMPLE_RATE)
@@ -0,0 +1,91 @@
+"""
+Etapas batch de Bark frente a las de Bark por separado, con modelos diminutos aleatorios
+
+Las versiones batch deben dar los mismos tokens que generate_coarse y
+generate_fine cuando el muestreo es determinista (temperatura casi cero o
+argmax), aunque las filas tengan longitudes y voces distintas.
+"""
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("bark")
+
+from bark import generation as bark_generation  # noqa: E402
+from bark.model import GPT, GPTConfig  # noqa: E402
+from bark.model_fine import FineGPT, FineGPTConfig  # noqa: E402
+
+from app import bark_utils  # noqa: E402
+from app.voices import voice_registry  # noqa: E402
+
+# Casi greedy: el muestreo de cada fila no depende del generador aleatorio
+GREEDY_TEMP = 1e-6
+
+@pytest.fixture(scope="module")
+def tiny_models():
+    torch.manual_seed(0)
+    models = {
+        "coarse": GPT(GPTConfig(input_vocab_size=20000, output_vocab_size=20000,
+                                n_layer=2, n_head=2, n_embd=32)).eval(),
+        "fine": FineGPT(FineGPTConfig(input_vocab_size=1056, output_vocab_size=1056, n_layer=2, n_head=2,
+                                      n_embd=32, n_codes_total=8, n_codes_given=1)).eval(),
+    }
+    originals = {stage: bark_generation.models.get(stage) for stage in models}
+    bark_generation.models.update(models)
+    yield models
+    for stage, original in originals.items():
+        if original is None:
+            bark_generation.models.pop(stage, None)
+        else:
+            bark_generation.models[stage] = original
+
+@pytest.fixture(scope="module")
+def voices():
+    return [voice_registry.get(voice) for voice in ("v2/es_speaker_0", "v2/es_speaker_6", "v2/en_speaker_0")]
+
+def _semantic(lengths):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, bark_generation.SEMANTIC_VOCAB_SIZE, length) for length in lengths]
+
+@pytest.mark.parametrize("use_kv_caching", [True, False])
+def test_coarse_batch_matches_generate_coarse(tiny_models, voices, use_kv_caching):
+    semantic = _semantic([40, 130, 75] if use_kv_caching else [20, 50, 30])
+    expected = [
+        bark_generation.generate_coarse(tokens, history_prompt=voice, temp=GREEDY_TEMP, silent=True,
+                                        use_kv_caching=use_kv_caching)
+        for tokens, voice in zip(semantic, voices)
+    ]
+    batch = bark_utils._generate_coarse_batch(semantic, voices, [GREEDY_TEMP] * 3, use_kv_caching=use_kv_caching)
+    for got, want in zip(batch, expected):
+        np.testing.assert_array_equal(got, want)
+
+def test_coarse_batch_without_voice(tiny_models):
+    semantic = _semantic([20, 50])
+    expected = [bark_generation.generate_coarse(tokens, temp=GREEDY_TEMP, silent=True) for tokens in semantic]
+    batch = bark_utils._generate_coarse_batch(semantic, [None, None], [GREEDY_TEMP] * 2, use_kv_caching=False)
+    for got, want in zip(batch, expected):
+        np.testing.assert_array_equal(got, want)
+
+def test_fine_batch_matches_generate_fine(tiny_models, voices):
+    coarse = bark_utils._generate_coarse_batch(_semantic([40, 130]), voices[:2], [0.7] * 2)
+    # Más de 1024 pasos: varias ventanas del modelo fine
+    coarse.append(np.tile(coarse[1], (1, 8)))
+    rows = [voices[0], voices[0], voices[0]]
+    batch = bark_utils._generate_fine_batch(coarse, rows, temp=None)
+    for tokens, got in zip(coarse, batch):
+        assert got.shape == (bark_generation.N_FINE_CODEBOOKS, tokens.shape[1])
+        np.testing.assert_array_equal(got[:2], tokens)
+    # Cada fila sola coincide con Bark
+    for tokens in coarse:
+        np.testing.assert_array_equal(
+            bark_utils._generate_fine_batch([tokens], [voices[0]], temp=None)[0],
+            bark_generation.generate_fine(tokens, history_prompt=voices[0], temp=None),
+        )
+
+def test_fine_batch_trims_histories_to_the_shortest(tiny_models, voices):
+    coarse = bark_utils._generate_coarse_batch(_semantic([40, 75]), [voices[0], voices[2]], [0.7] * 2)
+    shortest = voices[0]["fine_prompt"].shape[1]
+    trimmed = {**voices[2], "fine_prompt": voices[2]["fine_prompt"][:, -shortest:]}
+    batch = bark_utils._generate_fine_batch(coarse, [voices[0], voices[2]], temp=None)
+    np.testing.assert_array_equal(batch[1], bark_generation.generate_fine(coarse[1], history_prompt=trimmed, temp=None))
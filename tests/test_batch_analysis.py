@@ -0,0 +1,56 @@
+"""
+Análisis en lote: lectura de JSON/NDJSON y resultados en orden con el resumen
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app import batch_analysis, smart_text_processing
+from app.text_analysis import normalize_for_analysis
+
+def test_parse_json_array_and_objects():
+    body = json.dumps(["hola", {"text": "adiós"}, 3]).encode()
+    assert batch_analysis.parse_texts(body, "application/json") == ["hola", "adiós", 3]
+    assert batch_analysis.parse_texts(b'{"texts": ["a", "b"]}') == ["a", "b"]
+
+def test_parse_ndjson():
+    body = b'{"text": "uno"}\n\n"dos"\n{"text": "tres"}\n'
+    assert batch_analysis.parse_texts(body, "application/x-ndjson") == ["uno", "dos", "tres"]
+    # Sin cabecera: varios objetos seguidos también son NDJSON
+    assert batch_analysis.parse_texts(b'{"text": "uno"}\n{"text": "dos"}') == ["uno", "dos"]
+
+def test_parse_invalid():
+    with pytest.raises(ValueError):
+        batch_analysis.parse_texts(b'[1,', "application/json")
+    with pytest.raises(ValueError):
+        batch_analysis.parse_texts(b'no es json')
+
+async def _collect(texts, chunk_size):
+    return [json.loads(line) async for chunk in batch_analysis.stream_analysis(texts, chunk_size)
+            for line in chunk.splitlines()]
+
+@pytest.mark.parametrize("chunk_size", [1000, 3])
+def test_stream_in_order_with_summary(chunk_size):
+    texts = ["La la la, canta conmigo\nEsta es una canción feliz\nLa la la, todo está bien",
+             "Había una vez un viajero",
+             "",
+             "En tus ojos veo el cielo\nen tu sonrisa la luz\nEn tu alma encuentro consuelo\nen tu amor mi juventud"] * 5
+    try:
+        rows = asyncio.run(_collect(texts, chunk_size))
+    finally:
+        batch_analysis.shutdown()
+
+    summary = rows.pop()["summary"]
+    assert [row["index"] for row in rows] == list(range(len(texts)))
+    for row, text in zip(rows, texts):
+        if not text:
+            assert "error" in row
+            continue
+        expected = smart_text_processing(normalize_for_analysis(text))
+        assert row["analysis"] == expected["analysis"]
+        assert row["processed_text"] == expected["processed_text"]
+    assert summary["total"] == len(texts)
+    assert summary["errors"] == 5
+    assert summary["types"] == {"song": 5, "narrative": 5, "poem": 5}
@@ -0,0 +1,83 @@
+"""
+Descarga de audio: ETag/304, Range, HEAD, formatos negociados y acceso al índice fuera del event loop
+"""
+
+import asyncio
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import inference
+from app.main import app
+from app.storage import storage
+
+@pytest.fixture
+def audio_file(backend, unique):
+    """file_id de un WAV ya generado con el backend fake"""
+    file_id = os.urandom(8).hex()
+    job = inference.submit_job([f"Audio para descargar {unique}"], "v2/es_speaker_0",
+                               storage.path_for(file_id), file_id, {"tier": "standard"})
+    job["future"].result(timeout=10)
+    storage.register(file_id)
+    return file_id
+
+def test_download_touches_storage_off_the_event_loop(audio_file, monkeypatch):
+    loops = []
+
+    def touch(file_id):
+        try:
+            loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            loops.append(None)
+
+    monkeypatch.setattr(storage, "touch", touch)
+    response = TestClient(app).get(f"/download/{audio_file}")
+    assert response.status_code == 200
+    assert loops == [None]
+
+def test_download_is_cacheable(audio_file):
+    client = TestClient(app)
+    response = client.get(f"/download/{audio_file}")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "audio/wav"
+    assert "immutable" in response.headers["cache-control"]
+    etag = response.headers["etag"]
+    body = response.content
+    with open(storage.locate(audio_file), "rb") as f:
+        assert body == f.read()
+
+    response = client.get(f"/download/{audio_file}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag and not response.content
+    assert client.get(f"/download/{audio_file}", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+    assert client.get(f"/download/{audio_file}", headers={"If-None-Match": '"otro"'}).status_code == 200
+
+def test_download_range_and_head(audio_file):
+    client = TestClient(app)
+    body = client.get(f"/download/{audio_file}").content
+
+    response = client.get(f"/download/{audio_file}", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == body[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(body)}"
+
+    response = client.head(f"/download/{audio_file}")
+    assert response.status_code == 200
+    assert int(response.headers["content-length"]) == len(body)
+    assert not response.content
+
+def test_download_negotiates_format(audio_file):
+    pytest.importorskip("soundfile")
+    client = TestClient(app)
+    response = client.get(f"/download/{audio_file}", headers={"Accept": "audio/flac, audio/wav;q=0.5"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "audio/flac"
+    assert response.headers["vary"] == "Accept"
+    assert response.content[:4] == b"fLaC"
+
+    response = client.get(f"/download/{audio_file}?format=wav&sample_rate=8000")
+    assert response.status_code == 200
+    assert int.from_bytes(response.content[24:28], "little") == 8000
+
+    assert client.get(f"/download/{audio_file}?format=aac").status_code == 400
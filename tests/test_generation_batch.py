@@ -0,0 +1,54 @@
+"""
+Lotes de generación: manifiesto por elemento y descarga en ZIP
+"""
+
+import io
+import json
+import time
+import zipfile
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.storage import storage
+
+def _wait_for_batch(client, batch_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        manifest = client.get(f"/generate-batch/{batch_id}").json()
+        if manifest["status"] not in ("queued", "running") or time.monotonic() > deadline:
+            return manifest
+        time.sleep(0.05)
+
+def test_batch_manifest_and_zip(backend, unique):
+    client = TestClient(app)
+    response = client.post("/generate-batch/", json={"items": [
+        {"name": "Canción uno", "text": f"Hola mundo {unique}"},
+        {"name": "Canción dos", "text": f"Adiós mundo {unique}"},
+    ]})
+    assert response.status_code == 202
+    batch_id = response.json()["batch_id"]
+
+    manifest = _wait_for_batch(client, batch_id)
+    assert manifest["status"] == "done"
+    assert manifest["counts"]["done"] == 2
+    assert all(item["audio_seconds"] > 0 for item in manifest["items"])
+    assert manifest["audio_seconds"] == sum(item["audio_seconds"] for item in manifest["items"])
+
+    response = client.get(f"/generate-batch/{batch_id}/zip")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    names = archive.namelist()
+    assert names[0] == "manifest.json"
+    assert json.loads(archive.read("manifest.json"))["batch_id"] == batch_id
+    for position, item in enumerate(manifest["items"], start=1):
+        name = f"{position:03d}_Canción_{'uno' if position == 1 else 'dos'}_{item['file_id'][:8]}.wav"
+        assert name in names
+        with open(storage.locate(item["file_id"]), "rb") as f:
+            assert archive.read(name) == f.read()
+
+def test_unknown_batch_is_404():
+    client = TestClient(app)
+    assert client.get("/generate-batch/no-existe").status_code == 404
+    assert client.get("/generate-batch/no-existe/zip").status_code == 404
@@ -0,0 +1,121 @@
+"""
+Worker de inferencia con el backend fake: micro-batching, deduplicación, caches y errores
+"""
+
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import inference, smart_text_processing
+from app.main import app
+from app.segmentation import segment_for_synthesis
+from app.storage import storage
+
+def _submit(text, **kwargs):
+    file_id = os.urandom(8).hex()
+    return inference.submit_job([text] if isinstance(text, str) else text, "v2/es_speaker_0",
+                                storage.path_for(file_id), file_id, {"tier": "standard"}, **kwargs)
+
+def test_unexpected_worker_error_fails_the_batch_and_keeps_the_worker(backend, unique, monkeypatch):
+    def broken_batch(batch):
+        raise RuntimeError("fallo inesperado")
+
+    monkeypatch.setattr(inference, "_run_batch", broken_batch)
+    job = _submit(f"Primera prueba {unique}")
+    with pytest.raises(RuntimeError, match="fallo inesperado"):
+        job["future"].result(timeout=10)
+    assert job["status"] == "error"
+    assert job["job_id"] not in inference._queued
+
+    monkeypatch.undo()
+    job = _submit(f"Segunda prueba {unique}")
+    assert job["future"].result(timeout=10) == job["output_file"]
+    assert job["status"] == "done"
+
+def test_song_chorus_is_synthesized_once(backend, unique):
+    chorus = f"Canta conmigo {unique}\nBaila la noche {unique}"
+    song = (f"Primera estrofa {unique}\nLa luna sale\n\n{chorus}\n\n{chorus}\n\n"
+            f"Segunda estrofa {unique}\nEl sol se esconde\n\n{chorus}\n{chorus}")
+    result = smart_text_processing(song)
+    segments = segment_for_synthesis(song, result["analysis"], result["recommendations"]["split_strategy"])
+    # Las dos copias seguidas de la última estrofa también van en segmentos propios
+    assert len(segments) == 6
+    assert len(set(segments)) == 3
+
+    job = _submit(segments)
+    assert job["future"].result(timeout=10) == job["output_file"]
+    assert sorted(backend.texts) == sorted(set(segments))
+    assert job["phrases_reused"] == 3
+
+def test_result_cache_hit_reports_audio_duration(backend, unique):
+    first = _submit(f"Texto repetido {unique}")
+    first["future"].result(timeout=10)
+    second = _submit(f"Texto repetido {unique}")
+    assert second["cache_hit"]
+    assert second["audio_seconds"] == pytest.approx(first["audio_seconds"])
+    assert inference.lookup_job(second["job_id"])["audio_seconds"] > 0
+    assert len(backend.texts) == 1
+
+def test_micro_batch_charges_each_job_its_share(backend, unique, batch_window):
+    jobs = [_submit(f"Trabajo {number} {unique}") for number in range(4)]
+    for job in jobs:
+        job["future"].result(timeout=10)
+    assert backend.batches == [4]
+
+    wall = max(job["finished_at"] for job in jobs) - jobs[0]["started_at"]
+    assert all(job["started_at"] == jobs[0]["started_at"] for job in jobs)
+    assert all(job["compute_seconds"] > 0 for job in jobs)
+    # Entre todos suman como mucho el tiempo del grupo, no cuatro veces
+    assert sum(job["compute_seconds"] for job in jobs) <= wall + 1e-3
+
+@pytest.mark.parametrize("tier, profile, expected", [("high", None, "fp32"), ("high", "int8", "int8"), ("draft", "bf16", "bf16")])
+def test_tier_sets_inference_profile(backend, unique, monkeypatch, tier, profile, expected):
+    monkeypatch.setitem(inference.DEFAULT_GENERATION_PARAMS, "profile", "int8")
+    response = TestClient(app).post("/jobs", json={"text": f"Hola {unique}", "tier": tier, "profile": profile})
+    assert response.status_code == 202
+    job = inference._jobs[response.json()["job_id"]]
+    assert job["params"]["profile"] == expected
+    job["future"].result(timeout=10)
+
+def test_duplicate_jobs_are_synthesized_once(backend, unique, batch_window):
+    leader = _submit(f"Petición duplicada {unique}")
+    follower = _submit(f"Petición duplicada {unique}")
+    assert follower["future"].result(timeout=10) == follower["output_file"]
+    assert leader["status"] == follower["status"] == "done"
+    assert follower["cache_hit"] and not leader["cache_hit"]
+    assert backend.texts == [f"Petición duplicada {unique}"]
+    with open(leader["output_file"], "rb") as a, open(follower["output_file"], "rb") as b:
+        assert a.read() == b.read()
+
+def test_seeded_jobs_are_not_batched(backend, unique, batch_window):
+    jobs = [_submit(f"Con semilla {number} {unique}", params={"seed": 7}) for number in range(2)]
+    jobs += [_submit(f"Sin semilla {number} {unique}") for number in range(2)]
+    for job in jobs:
+        job["future"].result(timeout=10)
+    # Los dos sin semilla comparten batch; los de semilla van cada uno solo
+    assert sorted(backend.batches) == [1, 1, 2]
+    assert all(job["status"] == "done" for job in jobs)
+
+def test_phrase_cache_is_shared_between_jobs(backend, unique):
+    first = _submit([f"Estribillo {unique}", f"Primera estrofa {unique}"])
+    first["future"].result(timeout=10)
+    second = _submit([f"Estribillo {unique}", f"Segunda estrofa {unique}"])
+    second["future"].result(timeout=10)
+    assert not second["cache_hit"]
+    assert second["phrases_reused"] == 1
+    assert backend.texts.count(f"Estribillo {unique}") == 1
+
+def test_duplicate_job_fails_if_leader_audio_cannot_be_copied(backend, unique, batch_window, monkeypatch):
+    def missing_file(src, dst):
+        raise FileNotFoundError(src)
+
+    monkeypatch.setattr(inference.result_cache, "fetch", lambda key, output_file: False)
+    monkeypatch.setattr(inference.shutil, "copyfile", missing_file)
+    leader = _submit(f"Original borrado {unique}")
+    follower = _submit(f"Original borrado {unique}")
+    leader["future"].result(timeout=10)
+    with pytest.raises(FileNotFoundError):
+        follower["future"].result(timeout=10)
+    assert follower["status"] == "error"
+    assert inference.lookup_job(follower["job_id"])["status"] == "error"
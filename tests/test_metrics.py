@@ -0,0 +1,33 @@
+"""
+Métricas de Prometheus: peticiones por plantilla de ruta y textos analizados
+"""
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+def _sample(body: str, prefix: str) -> float:
+    for line in body.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+def test_requests_and_text_types_are_counted():
+    # Sin "with": no se ejecutan los eventos de arranque (carga de modelos)
+    client = TestClient(app)
+    requests_prefix = 'bark_http_requests_total{endpoint="/analyze-text/",method="POST",status="200"}'
+    song_prefix = 'bark_detected_text_type_total{source="request",type="song"}'
+    before = client.get("/metrics").text
+
+    song = "La la la, canta conmigo\nEsta es una canción feliz\nLa la la, canta conmigo"
+    assert client.post("/analyze-text/", json={"text": song}).json()["analysis"]["type"] == "song"
+    assert client.get("/download/no-existe").status_code == 404
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    after = response.text
+    assert _sample(after, requests_prefix) == _sample(before, requests_prefix) + 1
+    assert _sample(after, song_prefix) == _sample(before, song_prefix) + 1
+    # La ruta con parámetros aparece como plantilla, no con cada file_id
+    assert 'endpoint="/download/{file_id}",method="GET",status="404"' in after
+    assert "no-existe" not in after
@@ -0,0 +1,52 @@
+"""
+Perfilado bajo demanda: resumen por etapas y traza de un job (modo cProfile, sin torch)
+"""
+
+import asyncio
+import gzip
+import json
+import time
+
+from app import metrics, profiling
+
+def test_job_profile_records_stages_and_trace(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+
+    with profiling.JobProfile("job-de-prueba", "cprofile") as profile:
+        with metrics.stage("semantic"):
+            time.sleep(0.01)
+        with metrics.postprocess("join"):
+            sum(range(10000))
+    assert profile.info["status"] == "done"
+
+    with open(profiling.summary_path("job-de-prueba"), encoding="utf-8") as f:
+        summary = json.load(f)
+    assert set(summary["stages"]) == {"semantic", "join"}
+    assert summary["stages"]["semantic"]["wall_seconds"] >= 0.01
+    assert summary["memory"]["python_peak_bytes"] > 0
+    assert summary["top_functions"]
+
+    with gzip.open(profiling.trace_path("job-de-prueba"), "rt", encoding="utf-8") as f:
+        trace = json.load(f)
+    assert [event["name"] for event in trace["traceEvents"]] == ["semantic", "join"]
+
+def test_spans_are_ignored_without_active_profile():
+    with profiling.span("semantic"):
+        pass
+    assert getattr(profiling._active, "profile", None) is None
+
+def _mode_seen_by(app_middleware, headers):
+    """Modo de perfilado que vería un endpoint detrás del middleware con estas cabeceras"""
+    seen = {}
+
+    async def endpoint(scope, receive, send):
+        seen["mode"] = profiling.requested_mode()
+
+    scope = {"type": "http", "headers": [(name.encode(), value.encode()) for name, value in headers.items()]}
+    asyncio.run(app_middleware(endpoint)(scope, None, None))
+    return seen["mode"]
+
+def test_profile_header_is_ignored_unless_enabled(monkeypatch):
+    assert _mode_seen_by(profiling.ProfilingMiddleware, {"x-bark-profile": "torch"}) is None
+    monkeypatch.setattr(profiling, "PROFILE_HEADER_ENABLED", True)
+    assert _mode_seen_by(profiling.ProfilingMiddleware, {"x-bark-profile": "torch"}) == "torch"
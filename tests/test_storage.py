@@ -0,0 +1,69 @@
+"""
+Almacenamiento del audio: índice SQLite, TTL, presupuesto de espacio (LRU) y barrido en segundo plano
+"""
+
+import os
+import time
+
+import pytest
+
+from app.storage import AudioStorage
+
+@pytest.fixture
+def make_storage(tmp_path):
+    def make(ttl_seconds=0, max_bytes=0, sweep_interval=0):
+        return AudioStorage(str(tmp_path / "audio"), str(tmp_path / "audio" / "index.db"),
+                            ttl_seconds=ttl_seconds, max_bytes=max_bytes, sweep_interval=sweep_interval)
+    return make
+
+def _add(storage, file_id, size=1000, last_access=None, variants=()):
+    path = storage.path_for(file_id)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    for extension in variants:
+        with open(path[:-len(".wav")] + f".{extension}", "wb") as f:
+            f.write(b"\0" * (size // 2))
+    storage.register(file_id)
+    if last_access is not None:
+        storage._db().execute("UPDATE files SET last_access = ? WHERE file_id = ?", (last_access, file_id))
+    return path
+
+def test_files_are_sharded_and_indexed_with_variants(make_storage):
+    storage = make_storage()
+    path = _add(storage, "abcdef01", variants=("opus",))
+    assert path == os.path.join(storage.directory, "ab", "cd", "abcdef01.wav")
+    assert storage.locate("abcdef01") == path
+    assert storage.locate("no-existe") is None
+    assert storage.usage()["bytes"] == 1500
+
+def test_sweep_deletes_expired_files(make_storage):
+    storage = make_storage(ttl_seconds=3600)
+    old = _add(storage, "aa000001", last_access=time.time() - 7200, variants=("mp3",))
+    recent = _add(storage, "aa000002")
+    result = storage.sweep()
+    assert result["expired"] == 1 and result["freed_bytes"] == 1500
+    assert not os.path.exists(old) and not os.path.exists(old[:-len(".wav")] + ".mp3")
+    assert os.path.exists(recent)
+    assert storage.usage()["files"] == 1
+
+def test_sweep_evicts_least_recently_used_over_budget(make_storage):
+    storage = make_storage(max_bytes=2500)
+    now = time.time()
+    paths = {file_id: _add(storage, file_id, last_access=now - age)
+             for file_id, age in (("bb000001", 300), ("bb000002", 200), ("bb000003", 100))}
+    # Descargar el más antiguo lo convierte en el más reciente
+    storage.locate("bb000001")
+    result = storage.sweep()
+    assert result["evicted"] == 1
+    assert not os.path.exists(paths["bb000002"])
+    assert os.path.exists(paths["bb000001"]) and os.path.exists(paths["bb000003"])
+
+def test_background_sweeper(make_storage):
+    storage = make_storage(ttl_seconds=3600, sweep_interval=0.05)
+    path = _add(storage, "cc000001", last_access=time.time() - 7200)
+    storage.start_sweeper()
+    deadline = time.monotonic() + 5
+    while os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert not os.path.exists(path)
+    assert storage.last_sweep["expired"] == 1
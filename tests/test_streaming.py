@@ -0,0 +1,62 @@
+"""
+Streaming: el audio emitido por /generate-stream/ (y por WebSocket) es el mismo que el archivo guardado
+"""
+
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from scipy.io import wavfile
+
+from app.main import app
+from app.storage import storage
+
+def _song(unique):
+    return (f"Primera estrofa {unique}\nla luna sale\n\n"
+            f"Canta conmigo {unique}\nbaila la noche\n\n"
+            f"Segunda estrofa {unique}\nel sol se esconde\n\n"
+            f"Canta conmigo {unique}\nbaila la noche")
+
+def test_streamed_audio_matches_final_file(backend, unique):
+    client = TestClient(app)
+    response = client.post("/generate-stream/", json={"text": _song(unique)})
+    assert response.status_code == 200
+    assert response.headers["x-cache"] == "MISS"
+    body = response.content
+    assert body[:4] == b"RIFF"
+
+    rate, saved = wavfile.read(storage.locate(response.headers["x-file-id"]))
+    streamed = np.frombuffer(body[44:], dtype=np.int16)
+    assert rate == 24000
+    np.testing.assert_array_equal(streamed, saved)
+
+    # Repetida: acierto de cache, se emite el archivo tal cual
+    response = client.post("/generate-stream/", json={"text": _song(unique)})
+    assert response.headers["x-cache"] == "HIT"
+    np.testing.assert_array_equal(np.frombuffer(response.content[44:], dtype=np.int16), saved)
+
+def test_websocket_stream(backend, unique):
+    with TestClient(app).websocket_connect("/ws/generate-stream") as websocket:
+        websocket.send_json({"text": _song(unique)})
+        job = websocket.receive_json()
+        assert job["type"] == "job"
+        body = b""
+        while True:
+            message = websocket.receive()
+            if message.get("bytes") is not None:
+                body += message["bytes"]
+                continue
+            done = json.loads(message["text"])
+            break
+    assert done["type"] == "done"
+    _, saved = wavfile.read(storage.locate(job["file_id"]))
+    np.testing.assert_array_equal(np.frombuffer(body[44:], dtype=np.int16), saved)
+
+@pytest.mark.parametrize("payload", [[], "hola", 3, {"text": ""}])
+def test_websocket_rejects_invalid_requests(payload):
+    with TestClient(app).websocket_connect("/ws/generate-stream") as websocket:
+        websocket.send_json(payload)
+        message = websocket.receive_json()
+    assert message["type"] == "error"
+    assert message["detail"]
@@ -0,0 +1,50 @@
+"""
+Regresión del análisis de texto (detección de canción/poema/narrativa)
+
+Los resultados esperados de data/lyrics_corpus.json se generaron con la
+implementación anterior, que comparaba cada par de líneas (O(n²)); el análisis
+en una sola pasada debe clasificar y procesar el corpus exactamente igual.
+"""
+
+import json
+import os
+import time
+
+import pytest
+
+from app import (
+    _count_repeated_lines,
+    _detect_strong_rhyme_pattern,
+    _detect_verse_chorus_structure,
+    smart_text_processing,
+)
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "lyrics_corpus.json")
+
+with open(CORPUS_PATH, encoding="utf-8") as f:
+    CORPUS = json.load(f)
+
+@pytest.mark.parametrize("entry", CORPUS, ids=[entry["name"] for entry in CORPUS])
+def test_corpus_classification_unchanged(entry):
+    result = smart_text_processing(entry["text"])
+    analysis = result["analysis"]
+    lines = [line.strip() for line in analysis["text"].split("\n") if line.strip()]
+    expected = entry["expected"]
+
+    assert analysis["type"] == expected["type"]
+    assert analysis["has_rhyme_pattern"] == expected["has_rhyme_pattern"]
+    assert _count_repeated_lines(lines) == expected["repeated_lines"]
+    assert _detect_strong_rhyme_pattern(lines) == expected["strong_rhyme_pattern"]
+    assert _detect_verse_chorus_structure(lines) == expected["verse_chorus_structure"]
+    assert result["processed_text"] == expected["processed_text"]
+
+def test_large_input_is_linear():
+    """Un libro de miles de líneas se analiza en mucho menos de un segundo"""
+    book = "\n".join(f"Línea {i} del capítulo con la palabra{i % 977} al final" for i in range(20000))
+    started_at = time.perf_counter()
+    result = smart_text_processing(book)
+    elapsed = time.perf_counter() - started_at
+
+    assert result["analysis"]["line_count"] == 20000
+    # Comparando cada par de líneas tardaba decenas de segundos
+    assert elapsed < 5
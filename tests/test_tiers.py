@@ -0,0 +1,23 @@
+"""
+Niveles de calidad: segmentación y parámetros de generación de cada nivel
+"""
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.main import app
+from app.tiers import TIERS
+
+def test_paste_text_segments_with_the_tier_length(backend, unique, monkeypatch):
+    seen = []
+    original = main.segment_for_synthesis
+
+    def spy(text, analysis, split_strategy, max_chars):
+        seen.append(max_chars)
+        return original(text, analysis, split_strategy, max_chars)
+
+    monkeypatch.setattr(main, "segment_for_synthesis", spy)
+    monkeypatch.setitem(TIERS["standard"], "segment_max_chars", 40)
+    response = TestClient(app).post("/paste-text/", params={"text_data": f"Hola mundo {unique}"})
+    assert response.status_code == 200
+    assert seen == [40]
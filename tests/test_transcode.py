@@ -0,0 +1,58 @@
+"""
+Negociación de formato (Accept) y codificación de variantes
+"""
+
+import numpy as np
+import pytest
+from scipy.io import wavfile
+
+from app import transcode
+from app.audio_utils import SAMPLE_RATE
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, "wav"),
+    ("*/*", "wav"),
+    ("audio/mpeg", "mp3"),
+    ("audio/ogg;q=0.5, audio/flac;q=0.9", "flac"),
+    ("audio/flac;q=0, audio/x-wav", "wav"),
+    ("text/html, audio/opus", "opus"),
+])
+def test_negotiate_accept_header(accept, expected):
+    assert transcode.negotiate(accept) == expected
+
+def test_validate_rejects_unknown_format_and_rate():
+    transcode.validate("opus", 16000)
+    with pytest.raises(ValueError, match="Formato desconocido"):
+        transcode.validate("ogg")
+    with pytest.raises(ValueError, match="Frecuencia no soportada"):
+        transcode.validate("wav", 44100)
+
+def test_variant_path_sits_next_to_the_wav():
+    assert transcode.variant_path("/audio/ab/cd/abcd.wav", "opus") == "/audio/ab/cd/abcd.opus"
+    assert transcode.variant_path("/audio/ab/cd/abcd.wav", "mp3", 8000) == "/audio/ab/cd/abcd.8000.mp3"
+    assert transcode.variant_path("/audio/ab/cd/abcd.wav", "wav", SAMPLE_RATE) == "/audio/ab/cd/abcd.wav"
+
+@pytest.fixture
+def wav_path(tmp_path):
+    path = str(tmp_path / "voz.wav")
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    wavfile.write(path, SAMPLE_RATE, (0.5 * np.sin(2 * np.pi * 220 * t) * 32767).astype(np.int16))
+    return path
+
+def test_wav_variant_is_resampled(wav_path):
+    path = transcode.ensure_variant(wav_path, "wav", 8000).result(timeout=10)
+    assert path.endswith(".8000.wav")
+    rate, pcm = wavfile.read(path)
+    assert rate == 8000 and len(pcm) == 8000
+    # La segunda vez ya existe y no se vuelve a codificar
+    assert transcode.ensure_variant(wav_path, "wav", 8000).result(timeout=0) == path
+
+@pytest.mark.parametrize("output_format", ["flac", "opus", "mp3"])
+def test_compressed_variants(wav_path, output_format):
+    soundfile = pytest.importorskip("soundfile")
+    if transcode.FORMATS[output_format][2] not in soundfile.available_formats():
+        pytest.skip(f"libsndfile sin soporte para {output_format}")
+    path = transcode.ensure_variant(wav_path, output_format, 16000).result(timeout=30)
+    info = soundfile.info(path)
+    assert info.samplerate == 16000
+    assert info.duration == pytest.approx(1.0, abs=0.1)